@@ -0,0 +1,355 @@
+"""
+Spatial / temporal issue analytics
+
+Issues are rolled up into (geohash cell, day, category) counts when they are
+created, moved or deleted, so heatmap and trend queries read a small table
+instead of scanning every issue. Coarser grids are obtained from geohash
+prefixes. Heavy lifting (geohash encoding, time series, anomaly scores) is
+vectorized with NumPy.
+
+Rebuild the rollups from the issues and archived issues (e.g. after a bulk
+import):
+    python -m app.analytics rebuild
+"""
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+from app.database import dialect_insert
+from app.models import Issue, IssueArchive, IssueCategory, IssueRollup
+
+# Precision of stored cells (6 chars ~ 1.2km x 0.6km); queries use prefixes
+ROLLUP_PRECISION = 6
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_BASE32_INDEX = {char: index for index, char in enumerate(_BASE32)}
+_CATEGORIES = list(IssueCategory)
+
+RollupKey = Tuple[str, date, IssueCategory]
+
+
+# --- Geohash -----------------------------------------------------------------
+
+def _bit_counts(precision: int) -> Tuple[int, int]:
+    bits = 5 * precision
+    return (bits + 1) // 2, bits // 2  # (longitude bits, latitude bits)
+
+
+def geohash_codes(latitudes, longitudes, precision: int = ROLLUP_PRECISION) -> np.ndarray:
+    """Integer geohash codes (5 bits per character) for arrays of coordinates"""
+    lon_bits, lat_bits = _bit_counts(precision)
+    lat = np.asarray(latitudes, dtype=np.float64)
+    lon = np.asarray(longitudes, dtype=np.float64)
+    lat_index = np.clip(((lat + 90.0) / 180.0 * (1 << lat_bits)).astype(np.int64), 0, (1 << lat_bits) - 1)
+    lon_index = np.clip(((lon + 180.0) / 360.0 * (1 << lon_bits)).astype(np.int64), 0, (1 << lon_bits) - 1)
+
+    # Interleave bits, longitude first
+    codes = np.zeros(lat.shape, dtype=np.int64)
+    for bit in range(5 * precision):
+        if bit % 2 == 0:
+            value = (lon_index >> (lon_bits - 1 - bit // 2)) & 1
+        else:
+            value = (lat_index >> (lat_bits - 1 - bit // 2)) & 1
+        codes = (codes << 1) | value
+    return codes
+
+
+def code_to_geohash(code: int, precision: int = ROLLUP_PRECISION) -> str:
+    return "".join(
+        _BASE32[(int(code) >> (5 * (precision - 1 - i))) & 31] for i in range(precision)
+    )
+
+
+def encode_geohash(latitude: float, longitude: float, precision: int = ROLLUP_PRECISION) -> str:
+    """Geohash string for a single point"""
+    return code_to_geohash(geohash_codes([latitude], [longitude], precision)[0], precision)
+
+
+def decode_geohash(geohash: str) -> Tuple[float, float]:
+    """Center (latitude, longitude) of a geohash cell"""
+    precision = len(geohash)
+    lon_bits, lat_bits = _bit_counts(precision)
+    code = 0
+    for char in geohash:
+        code = (code << 5) | _BASE32_INDEX[char]
+    lat_index = lon_index = 0
+    for bit in range(5 * precision):
+        value = (code >> (5 * precision - 1 - bit)) & 1
+        if bit % 2 == 0:
+            lon_index = (lon_index << 1) | value
+        else:
+            lat_index = (lat_index << 1) | value
+    latitude = (lat_index + 0.5) / (1 << lat_bits) * 180.0 - 90.0
+    longitude = (lon_index + 0.5) / (1 << lon_bits) * 360.0 - 180.0
+    return latitude, longitude
+
+
+def geohash_bounds(geohash: str) -> Tuple[float, float, float, float]:
+    """(min_lat, min_lon, max_lat, max_lon) of a geohash cell"""
+    lon_bits, lat_bits = _bit_counts(len(geohash))
+    latitude, longitude = decode_geohash(geohash)
+    half_lat = 90.0 / (1 << lat_bits)
+    half_lon = 180.0 / (1 << lon_bits)
+    return latitude - half_lat, longitude - half_lon, latitude + half_lat, longitude + half_lon
+
+
+# --- Incremental rollup maintenance ---------------------------------------------
+
+def _utc_day(value: Optional[datetime]) -> date:
+    if value is None:
+        return datetime.now(timezone.utc).date()
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.date()
+
+
+def issue_cell(issue: Issue) -> RollupKey:
+    """Rollup key of an issue in its current state"""
+    return (
+        encode_geohash(issue.latitude, issue.longitude),
+        _utc_day(issue.created_at),
+        IssueCategory(issue.category)
+    )
+
+
+def apply_cell_deltas(db: Session, deltas: Dict[RollupKey, int]) -> None:
+    """
+    Add deltas to rollup counts with a single upsert (part of the caller's
+    transaction)
+    """
+    rows = [
+        dict(geohash=geohash, day=day, category=category, count=delta)
+        for (geohash, day, category), delta in deltas.items() if delta
+    ]
+    if not rows:
+        return
+
+    table = IssueRollup.__table__
+    upsert = dialect_insert(db)
+    if upsert is not None:
+        stmt = upsert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["geohash", "day", "category"],
+            set_={"count": table.c.count + stmt.excluded.count}
+        )
+        db.execute(stmt, rows)
+        return
+
+    # Generic fallback: read-modify-write per cell
+    for row in rows:
+        rollup = db.query(IssueRollup).filter(
+            IssueRollup.geohash == row["geohash"],
+            IssueRollup.day == row["day"],
+            IssueRollup.category == row["category"]
+        ).with_for_update().first()
+        if rollup:
+            rollup.count += row["count"]
+        else:
+            db.add(IssueRollup(**row))
+
+
+def record_issues(db: Session, issues: Iterable[Issue], delta: int = 1) -> None:
+    """Count issues into (delta=1) or out of (delta=-1) the rollups"""
+    counts = Counter(issue_cell(issue) for issue in issues)
+    apply_cell_deltas(db, {key: count * delta for key, count in counts.items()})
+
+
+def rebuild_rollups(db: Session, chunk_size: int = 50000) -> int:
+    """
+    Recompute all rollups from the issues and issues_archive tables
+    (vectorized, chunked) and replace the current ones in one transaction
+
+    Returns:
+        Number of rollup cells written
+    """
+    totals: Counter = Counter()
+    category_index = {category: index for index, category in enumerate(_CATEGORIES)}
+    # Archived issues still count in the heatmap and trends
+    for model in (Issue, IssueArchive):
+        query = select(model.latitude, model.longitude, model.created_at, model.category)
+        result = db.execute(query.execution_options(stream_results=True, yield_per=chunk_size))
+        for partition in result.partitions():
+            latitudes, longitudes, created, categories = zip(*partition)
+            codes = geohash_codes(latitudes, longitudes)
+            days = np.fromiter((_utc_day(value).toordinal() for value in created), dtype=np.int64, count=len(created))
+            cats = np.fromiter((category_index[IssueCategory(c)] for c in categories), dtype=np.int64, count=len(categories))
+            keys, counts = np.unique(np.stack([codes, days, cats], axis=1), axis=0, return_counts=True)
+            for (code, day, cat), count in zip(keys.tolist(), counts.tolist()):
+                totals[(code, day, cat)] += count
+
+    db.query(IssueRollup).delete(synchronize_session=False)
+    rows = [
+        dict(
+            geohash=code_to_geohash(code),
+            day=date.fromordinal(day),
+            category=_CATEGORIES[cat],
+            count=count
+        )
+        for (code, day, cat), count in totals.items()
+    ]
+    if rows:
+        db.execute(insert(IssueRollup.__table__), rows)
+    db.commit()
+    return len(rows)
+
+
+# --- Queries ------------------------------------------------------------------------
+
+def _filtered(query, since: Optional[date], until: Optional[date], category: Optional[IssueCategory]):
+    if since:
+        query = query.where(IssueRollup.day >= since)
+    if until:
+        query = query.where(IssueRollup.day < until)
+    if category:
+        query = query.where(IssueRollup.category == category)
+    return query
+
+
+def heatmap(
+    db: Session,
+    precision: int = 5,
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    category: Optional[IssueCategory] = None,
+    bbox: Optional[tuple] = None
+) -> List[dict]:
+    """Issue counts per geohash cell, densest first"""
+    cell = func.substr(IssueRollup.geohash, 1, precision)
+    query = _filtered(
+        select(cell, func.sum(IssueRollup.count)).group_by(cell),
+        since, until, category
+    )
+    cells = []
+    for geohash, count in db.execute(query):
+        if not count:
+            continue
+        latitude, longitude = decode_geohash(geohash)
+        if bbox:
+            min_lon, min_lat, max_lon, max_lat = bbox
+            if not (min_lon <= longitude <= max_lon and min_lat <= latitude <= max_lat):
+                continue
+        cells.append({
+            "geohash": geohash,
+            "latitude": latitude,
+            "longitude": longitude,
+            "count": int(count)
+        })
+    cells.sort(key=lambda c: c["count"], reverse=True)
+    return cells
+
+
+def coarsen_cells(cells: Iterable[dict], precision: int) -> List[dict]:
+    """
+    heatmap() output at `precision` from cells of that precision or finer
+    (also merges the heatmaps of several databases)
+    """
+    counts: Dict[str, int] = Counter()
+    for cell in cells:
+        counts[cell["geohash"][:precision]] += cell["count"]
+    coarse = []
+    for geohash in sorted(counts):
+        latitude, longitude = decode_geohash(geohash)
+        coarse.append({"geohash": geohash, "latitude": latitude, "longitude": longitude, "count": counts[geohash]})
+    coarse.sort(key=lambda c: c["count"], reverse=True)
+    return coarse
+
+
+def trend_range(days: int, window: int, as_of: Optional[date] = None) -> Tuple[date, date]:
+    """(first day of the baseline, last day of the series) of a trends() query"""
+    end = as_of or datetime.now(timezone.utc).date()
+    return end - timedelta(days=days + window - 1), end
+
+
+def trend_counts(
+    db: Session,
+    precision: int,
+    start: date,
+    end: date,
+    category: Optional[IssueCategory] = None
+) -> List[tuple]:
+    """(cell, day, count) rows feeding rank_trends()"""
+    cell = func.substr(IssueRollup.geohash, 1, precision)
+    query = _filtered(
+        select(cell, IssueRollup.day, func.sum(IssueRollup.count)).group_by(cell, IssueRollup.day),
+        start, end + timedelta(days=1), category
+    )
+    return [tuple(row) for row in db.execute(query)]
+
+
+def rank_trends(rows: List[tuple], start: date, days: int, window: int, limit: int) -> List[dict]:
+    """
+    trends() from (cell, day, count) rows; a cell/day may appear in several
+    rows (counts from several databases), they are summed
+    """
+    if not rows:
+        return []
+    total_days = days + window
+
+    cells, cell_index = np.unique(np.array([row[0] for row in rows]), return_inverse=True)
+    day_index = np.array([(row[1] - start).days for row in rows], dtype=np.int64)
+    counts = np.array([row[2] for row in rows], dtype=np.float64)
+
+    matrix = np.zeros((len(cells), total_days), dtype=np.float64)
+    np.add.at(matrix, (cell_index, day_index), counts)
+
+    # Rolling mean/std over the previous `window` days via cumulative sums
+    zero = np.zeros((len(cells), 1))
+    cumsum = np.concatenate([zero, np.cumsum(matrix, axis=1)], axis=1)
+    cumsum_sq = np.concatenate([zero, np.cumsum(matrix ** 2, axis=1)], axis=1)
+    base = cumsum[:, window:total_days] - cumsum[:, 0:total_days - window]
+    base_sq = cumsum_sq[:, window:total_days] - cumsum_sq[:, 0:total_days - window]
+    mean = base / window
+    std = np.sqrt(np.maximum(base_sq / window - mean ** 2, 0.0))
+    series = matrix[:, window:]
+    scores = (series - mean) / (std + 1.0)
+
+    top = np.argsort(-scores[:, -1], kind="stable")[:limit]
+    series_days = [start + timedelta(days=window + i) for i in range(days)]
+    results = []
+    for i in top:
+        latitude, longitude = decode_geohash(str(cells[i]))
+        results.append({
+            "geohash": str(cells[i]),
+            "latitude": latitude,
+            "longitude": longitude,
+            "total": int(series[i].sum()),
+            "score": round(float(scores[i, -1]), 3),
+            "series": [
+                {"day": day.isoformat(), "count": int(count), "score": round(float(score), 3)}
+                for day, count, score in zip(series_days, series[i], scores[i])
+            ]
+        })
+    return results
+
+
+def trends(
+    db: Session,
+    precision: int = 5,
+    days: int = 30,
+    window: int = 7,
+    category: Optional[IssueCategory] = None,
+    limit: int = 20,
+    as_of: Optional[date] = None
+) -> List[dict]:
+    """
+    Daily series per cell with a moving-window anomaly score
+
+    The score for a day is (count - mean) / (std + 1) where mean/std are taken
+    over the preceding `window` days. Cells are ranked by today's score.
+    """
+    start, end = trend_range(days, window, as_of)
+    return rank_trends(trend_counts(db, precision, start, end, category), start, days, window, limit)
+
+
+if __name__ == "__main__":
+    import sys
+    from app.database import Base, init_engine
+    from app.sharding import for_each_shard
+
+    if sys.argv[1:] != ["rebuild"]:
+        print("Usage: python -m app.analytics rebuild")
+        sys.exit(1)
+    Base.metadata.create_all(bind=init_engine())
+    print(f"Rebuilt {sum(for_each_shard(rebuild_rollups))} rollup cells")
@@ -0,0 +1,264 @@
+"""
+Cold storage for long-closed issues
+
+Resolved and closed issues untouched for ISSUE_ARCHIVE_AFTER_DAYS are moved
+in batches from issues to issues_archive, so the hot table and its indexes
+only hold what the listing and map queries actually read. With them go:
+
+- their issue_events rows (kept on the archive row, timelines still work)
+- their images, to ISSUE_ARCHIVE_IMAGE_PREFIX under UPLOAD_DIR (mount
+  cheaper storage there); hard-linked or copied before the commit, the
+  original removed after it, so a crash never leaves a row without its file
+
+Subscriptions and triage entries of the issue are dropped, notifications
+keep their text but lose the link. Heatmap rollups and SLA metrics are
+aggregates and stay as they are (their rebuild CLIs read the archive too).
+
+Archived issues are read-only: GET /api/issues/{id}, its timeline and the
+export fall through to the archive, everything else treats them as gone:
+the change feed gets a tombstone for them and their list slices are touched,
+so replicas drop them and cached listings revalidate.
+
+Archive everything eligible now (e.g. before enabling the periodic job):
+    python -m app.archive run
+"""
+import os
+import shutil
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import List, Optional, Tuple
+from dotenv import load_dotenv
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.database import SessionLocal, init_engine
+from app.file_utils import UPLOAD_DIR, delete_image_file
+from app.issue_events import timeline
+from app.sharding import for_each_shard
+from app.sync import track_issue_changes
+from app.models import (
+    Issue,
+    IssueArchive,
+    IssueEvent,
+    IssueEventType,
+    IssueStatus,
+    Notification,
+    Subscription,
+    TriageQueueEntry
+)
+
+load_dotenv()
+
+# Days since the last change before a resolved/closed issue is archived (0 disables)
+ISSUE_ARCHIVE_AFTER_DAYS = int(os.getenv("ISSUE_ARCHIVE_AFTER_DAYS", "90"))
+ISSUE_ARCHIVE_BATCH_SIZE = int(os.getenv("ISSUE_ARCHIVE_BATCH_SIZE", "500"))
+ISSUE_ARCHIVE_INTERVAL_SECONDS = int(os.getenv("ISSUE_ARCHIVE_INTERVAL_SECONDS", "3600"))
+# Pause between batches so archiving doesn't compete with request traffic
+ISSUE_ARCHIVE_PAUSE_SECONDS = float(os.getenv("ISSUE_ARCHIVE_PAUSE_SECONDS", "0.05"))
+# Directory under UPLOAD_DIR receiving archived images
+ISSUE_ARCHIVE_IMAGE_PREFIX = os.getenv("ISSUE_ARCHIVE_IMAGE_PREFIX", "archive").strip("/")
+
+ARCHIVED_STATUSES = (IssueStatus.RESOLVED, IssueStatus.CLOSED)
+# Statuses that never occur in the archive (exports skip it)
+HOT_ONLY_STATUSES = (IssueStatus.PENDING, IssueStatus.IN_PROGRESS)
+
+_EVENT_FIELDS = ("id", "actor_id", "event_type", "from_status", "to_status", "changes", "created_at")
+
+
+def _event_row(event: IssueEvent) -> dict:
+    row = {}
+    for field in _EVENT_FIELDS:
+        value = getattr(event, field)
+        row[field] = value.value if hasattr(value, "value") else value
+    row["created_at"] = event.created_at.isoformat()
+    return row
+
+
+def _archive_image(image_path: str) -> Tuple[str, bool]:
+    """
+    Make the image available under the archive prefix
+
+    Returns:
+        (archived image path, whether this call created the file)
+    """
+    archived_path = f"{ISSUE_ARCHIVE_IMAGE_PREFIX}/{image_path}"
+    source = Path(UPLOAD_DIR) / image_path
+    target = Path(UPLOAD_DIR) / archived_path
+    target.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.link(source, target)
+    except FileExistsError:
+        return archived_path, False  # left by an earlier attempt
+    except FileNotFoundError:
+        return archived_path, False  # image already gone; archive the row anyway
+    except OSError:
+        # Different filesystem: copy
+        shutil.copy2(source, target)
+    return archived_path, True
+
+
+def archive_issues(
+    db: Session,
+    after_days: int = ISSUE_ARCHIVE_AFTER_DAYS,
+    batch_size: int = ISSUE_ARCHIVE_BATCH_SIZE,
+    max_batches: Optional[int] = None,
+    links_db: Optional[Session] = None
+) -> int:
+    """
+    Move resolved/closed issues unchanged for after_days to the archive
+
+    Works in batches, each in its own short transaction. With sharding, db is
+    a shard and links_db the primary holding notifications and subscriptions
+    (updated right after each batch is committed on the shard).
+
+    Returns:
+        Number of issues archived
+    """
+    if after_days <= 0:
+        return 0
+    cutoff = datetime.now(timezone.utc) - timedelta(days=after_days)
+    total = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        issues = db.scalars(
+            select(Issue)
+            .where(
+                Issue.status.in_(ARCHIVED_STATUSES),
+                func.coalesce(Issue.updated_at, Issue.created_at) < cutoff
+            )
+            .order_by(Issue.id)
+            .limit(batch_size)
+            # Concurrent workers take different batches (PostgreSQL)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if not issues:
+            db.rollback()
+            break
+        ids = [issue.id for issue in issues]
+
+        events = defaultdict(list)
+        for event in db.scalars(
+            select(IssueEvent)
+            .where(IssueEvent.issue_id.in_(ids))
+            .order_by(IssueEvent.created_at, IssueEvent.id)
+        ):
+            events[event.issue_id].append(_event_row(event))
+
+        created: List[str] = []
+        try:
+            rows = []
+            for issue in issues:
+                image_url = issue.image_url
+                if image_url:
+                    image_url, is_new = _archive_image(image_url)
+                    if is_new:
+                        created.append(image_url)
+                rows.append({
+                    "id": issue.id,
+                    "title": issue.title,
+                    "description": issue.description,
+                    "category": issue.category,
+                    "status": issue.status,
+                    "latitude": issue.latitude,
+                    "longitude": issue.longitude,
+                    "image_url": image_url,
+                    "created_at": issue.created_at,
+                    "updated_at": issue.updated_at,
+                    "reporter_id": issue.reporter_id,
+                    "zone_id": issue.zone_id,
+                    "events": events[issue.id]
+                })
+            hot_images = [issue.image_url for issue in issues if issue.image_url]
+
+            db.execute(insert(IssueArchive), rows)
+            track_issue_changes(db, issues, deleted=True)
+            if links_db is None or links_db is db:
+                _unlink_issues(db, ids)
+            db.execute(delete(TriageQueueEntry).where(TriageQueueEntry.issue_id.in_(ids)))
+            db.execute(delete(IssueEvent).where(IssueEvent.issue_id.in_(ids)))
+            db.execute(delete(Issue).where(Issue.id.in_(ids)))
+            db.commit()
+        except IntegrityError:
+            # Another worker archived this batch concurrently: keep the files
+            # its rows point to and leave the rest to it
+            db.rollback()
+            _undo_images(db, created)
+            break
+        except Exception:
+            db.rollback()
+            _undo_images(db, created)
+            raise
+        if links_db is not None and links_db is not db:
+            _unlink_issues(links_db, ids)
+            links_db.commit()
+
+        for image_path in hot_images:
+            delete_image_file(image_path)
+        total += len(ids)
+        batches += 1
+        if len(ids) < batch_size:
+            break
+        if ISSUE_ARCHIVE_PAUSE_SECONDS:
+            time.sleep(ISSUE_ARCHIVE_PAUSE_SECONDS)
+    return total
+
+
+def _unlink_issues(db: Session, ids: List[int]) -> None:
+    db.execute(update(Notification).where(Notification.issue_id.in_(ids)).values(issue_id=None))
+    db.execute(delete(Subscription).where(Subscription.issue_id.in_(ids)))
+
+
+def _undo_images(db: Session, created: List[str]) -> None:
+    """Remove archive copies made for a rolled back batch (unless archived meanwhile)"""
+    if not created:
+        return
+    archived = set(db.scalars(select(IssueArchive.image_url).where(IssueArchive.image_url.in_(created))))
+    for image_path in created:
+        if image_path not in archived:
+            delete_image_file(image_path)
+
+
+def get_archived_issue(db: Session, issue_id: int) -> Optional[IssueArchive]:
+    return db.get(IssueArchive, issue_id)
+
+
+def archived_timeline(db: Session, archived: IssueArchive) -> dict:
+    """timeline() of an archived issue from the events stored with it"""
+    events = [
+        IssueEvent(
+            issue_id=archived.id,
+            id=row["id"],
+            actor_id=row["actor_id"],
+            event_type=IssueEventType(row["event_type"]),
+            from_status=IssueStatus(row["from_status"]) if row["from_status"] else None,
+            to_status=IssueStatus(row["to_status"]) if row["to_status"] else None,
+            changes=row["changes"],
+            created_at=datetime.fromisoformat(row["created_at"])
+        )
+        for row in archived.events
+    ]
+    return timeline(db, archived, events)
+
+
+def run_issue_archival() -> int:
+    """Background job entry point: archive eligible issues of every shard"""
+    init_engine()
+    db = SessionLocal()
+    try:
+        return sum(for_each_shard(lambda shard_db: archive_issues(shard_db, links_db=db), primary=db))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    import sys
+    from app import models  # noqa: F401
+    from app.database import Base
+
+    if sys.argv[1:] != ["run"]:
+        print("Usage: python -m app.archive run")
+        sys.exit(2)
+    Base.metadata.create_all(bind=init_engine())
+    print(f"Archived {run_issue_archival()} issues")
@@ -0,0 +1,92 @@
+"""
+Periodic background jobs run inside each worker's event loop
+
+Jobs are plain synchronous functions executed in the threadpool so they
+never block request handling. They are started from the app's startup hook
+(i.e. per worker, after fork) and cancelled on shutdown.
+
+Maintenance jobs that rewrite many rows are started with exclusive=True:
+each run first takes JOB_LOCK_DIR/<name>.lock, so only one worker of a host
+runs the job at a time, and a run is skipped if another worker finished one
+less than half an interval ago.
+"""
+import asyncio
+import logging
+import os
+import time
+from functools import partial
+from pathlib import Path
+from typing import Callable, Dict, Optional
+from starlette.concurrency import run_in_threadpool
+from dotenv import load_dotenv
+from app.file_lock import try_lock
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Shared by the workers of a host
+JOB_LOCK_DIR = Path(os.getenv("JOB_LOCK_DIR", "./locks"))
+
+_tasks: Dict[str, asyncio.Task] = {}
+
+
+async def _run_periodically(name: str, interval: float, func: Callable[[], object], delay: float) -> None:
+    while True:
+        await asyncio.sleep(delay)
+        delay = interval
+        try:
+            await run_in_threadpool(func)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Background job %s failed", name)
+
+
+def _run_exclusive(name: str, interval: float, func: Callable[[], object]) -> None:
+    """Run func unless another worker is running it or just did"""
+    JOB_LOCK_DIR.mkdir(parents=True, exist_ok=True)
+    with open(JOB_LOCK_DIR / f"{name}.lock", "a+") as lock:
+        if not try_lock(lock.fileno()):
+            return
+        # The file holds the time the last run finished
+        lock.seek(0)
+        finished_at = lock.read().strip()
+        if finished_at and time.time() - float(finished_at) < interval / 2:
+            return
+        func()
+        lock.seek(0)
+        lock.truncate()
+        lock.write(str(time.time()))
+
+
+def start_periodic(
+    name: str,
+    interval: float,
+    func: Callable[[], object],
+    initial_delay: Optional[float] = None,
+    exclusive: bool = False
+) -> None:
+    """
+    Run func every interval seconds (no-op if a job with this name is running)
+
+    The first run happens after initial_delay seconds (defaults to interval).
+    With exclusive=True one worker of the host runs it per interval.
+    """
+    if interval <= 0 or name in _tasks:
+        return
+    delay = interval if initial_delay is None else initial_delay
+    if exclusive:
+        func = partial(_run_exclusive, name, interval, func)
+    _tasks[name] = asyncio.get_running_loop().create_task(
+        _run_periodically(name, interval, func, delay)
+    )
+
+
+async def stop_all() -> None:
+    """Cancel all periodic jobs of this process"""
+    tasks = list(_tasks.values())
+    _tasks.clear()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
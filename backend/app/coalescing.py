@@ -0,0 +1,217 @@
+"""
+Single-flight coalescing of identical concurrent reads
+
+During a spike thousands of clients ask for the same issue list or issue
+within the same second. The first request for a key (the leader) runs
+normally; identical requests arriving while it is in flight (followers) wait
+for its response and get a copy of it, so the database query and the JSON
+serialization run once per key instead of once per request.
+
+The key is the route plus everything the response depends on: path, sorted
+query parameters, host and scheme (image URLs are absolute), the negotiated
+content encoding (compression runs inside this middleware, so followers
+share it too) and conditional request headers. Only public routes whose
+response does not depend on the caller are coalesced.
+
+Followers wait at most COALESCE_MAX_WAIT_SECONDS and then run their own
+request. Responses are shared only while in flight, never cached: a write
+handled by this worker starts a new flight for requests arriving after it,
+so a client always sees its own writes.
+"""
+import asyncio
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+from dotenv import load_dotenv
+from app.compression import COMPRESSION_ENABLED, available_encoders, choose_encoding
+
+load_dotenv()
+
+COALESCING_ENABLED = os.getenv("COALESCING_ENABLED", "true").lower() == "true"
+# Bounded waiting: followers run the request themselves after this long
+COALESCE_MAX_WAIT_SECONDS = float(os.getenv("COALESCE_MAX_WAIT_SECONDS", "2.0"))
+# Requests beyond this many waiting on one key go through admission control
+COALESCE_MAX_FOLLOWERS = int(os.getenv("COALESCE_MAX_FOLLOWERS", "5000"))
+# Larger responses are not shared (followers run their own request)
+COALESCE_MAX_BODY_BYTES = int(os.getenv("COALESCE_MAX_BODY_BYTES", str(4 * 1024 * 1024)))
+
+# Public reads whose response is the same for every caller
+COALESCED_ROUTES = (
+    re.compile(r"^/api/issues/$"),
+    re.compile(r"^/api/issues/\d+$"),
+    re.compile(r"^/api/issues/analytics/(heatmap|trends|sla)$"),
+    re.compile(r"^/api/zones/(stats)?$"),
+    re.compile(r"^/api/zones/\d+$"),
+)
+
+_SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+_KEY_HEADERS = (b"host", b"if-none-match", b"if-modified-since")
+
+
+class CoalescingStats:
+    """Per-process counters (GET /health/coalescing)"""
+
+    def __init__(self):
+        self.leaders = 0
+        self.followers = 0
+        self.timeouts = 0
+        self.fallbacks = 0
+        self.in_flight = 0
+
+    def snapshot(self) -> dict:
+        served = self.leaders + self.followers
+        return {
+            "enabled": COALESCING_ENABLED,
+            "leaders": self.leaders,
+            "followers": self.followers,
+            "timeouts": self.timeouts,
+            "fallbacks": self.fallbacks,
+            "in_flight": self.in_flight,
+            # Share of coalescable requests that did not run their own query
+            "coalescing_ratio": round(self.followers / served, 4) if served else 0.0,
+        }
+
+
+coalescing_stats = CoalescingStats()
+
+
+class _Flight:
+    def __init__(self):
+        self.response: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.followers = 0
+
+
+class _Unshareable(Exception):
+    """The leader's response can't be replayed (too large, failed or aborted)"""
+
+
+class CoalescingMiddleware:
+    """ASGI middleware sharing one in-flight response between identical reads"""
+
+    def __init__(
+        self,
+        app,
+        routes: Tuple[re.Pattern, ...] = COALESCED_ROUTES,
+        max_wait: float = COALESCE_MAX_WAIT_SECONDS,
+        max_followers: int = COALESCE_MAX_FOLLOWERS,
+        max_body_bytes: int = COALESCE_MAX_BODY_BYTES,
+    ):
+        self.app = app
+        self.routes = routes
+        self.max_wait = max_wait
+        self.max_followers = max_followers
+        self.max_body_bytes = max_body_bytes
+        self.encodings = list(available_encoders()) if COMPRESSION_ENABLED else []
+        self._flights: Dict[tuple, _Flight] = {}
+        # Bumped by every write this worker handles
+        self._generation = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if scope["method"] not in _SAFE_METHODS:
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                self._generation += 1
+            return
+        if (
+            not COALESCING_ENABLED
+            or scope["method"] != "GET"
+            or not any(route.match(scope["path"]) for route in self.routes)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        key = self._key(scope)
+        flight = self._flights.get(key)
+        if flight is None:
+            await self._lead(key, scope, receive, send)
+            return
+        if flight.followers >= self.max_followers:
+            await self.app(scope, receive, send)
+            return
+
+        flight.followers += 1
+        try:
+            start, body = await asyncio.wait_for(asyncio.shield(flight.response), self.max_wait)
+        except asyncio.TimeoutError:
+            coalescing_stats.timeouts += 1
+            await self.app(scope, receive, send)
+            return
+        except _Unshareable:
+            coalescing_stats.fallbacks += 1
+            await self.app(scope, receive, send)
+            return
+        finally:
+            flight.followers -= 1
+
+        coalescing_stats.followers += 1
+        await send({**start, "headers": list(start["headers"]) + [(b"x-coalesced", b"1")]})
+        await send({"type": "http.response.body", "body": body})
+
+    def _key(self, scope) -> tuple:
+        headers = {}
+        accept_encoding = ""
+        for name, value in scope["headers"]:
+            if name in _KEY_HEADERS:
+                headers[name] = value
+            elif name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+        query = tuple(sorted(parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True)))
+        return (
+            scope["path"],
+            query,
+            scope.get("scheme", "http"),
+            headers.get(b"host"),
+            choose_encoding(accept_encoding, self.encodings) if self.encodings else None,
+            headers.get(b"if-none-match"),
+            headers.get(b"if-modified-since"),
+            self._generation,
+        )
+
+    async def _lead(self, key: tuple, scope, receive, send) -> None:
+        flight = self._flights[key] = _Flight()
+        coalescing_stats.leaders += 1
+        coalescing_stats.in_flight += 1
+        start: Optional[dict] = None
+        chunks: List[bytes] = []
+        size = 0
+        shareable = True
+
+        async def capture(message):
+            nonlocal start, size, shareable
+            if message["type"] == "http.response.start":
+                start = message
+            elif message["type"] == "http.response.body" and shareable:
+                body = message.get("body", b"")
+                size += len(body)
+                if size > self.max_body_bytes:
+                    shareable = False
+                    self._settle(key, flight, None)
+                else:
+                    chunks.append(body)
+                    if not message.get("more_body", False):
+                        self._settle(key, flight, (start, b"".join(chunks)))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            coalescing_stats.in_flight -= 1
+            # Failed or cancelled before the last body chunk
+            self._settle(key, flight, None)
+
+    def _settle(self, key: tuple, flight: _Flight, response: Optional[tuple]) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if flight.response.done():
+            return
+        if response is None:
+            flight.response.set_exception(_Unshareable())
+            # Retrieved by followers if any; don't warn about it otherwise
+            flight.response.exception()
+        else:
+            flight.response.set_result(response)
@@ -0,0 +1,244 @@
+"""
+Negotiated response compression (zstd, brotli, gzip)
+
+The encoding is picked from the client's Accept-Encoding (q-values honoured)
+in server preference order zstd > br > gzip. zstd and brotli are used only
+when the optional `zstandard` / `brotli` packages are installed.
+
+Only compressible content types are compressed, and only if the body is at
+least COMPRESSION_MIN_SIZE bytes. Streaming responses (e.g. exports) are
+compressed chunk by chunk and flushed, so they keep streaming. Images
+(already compressed) are never touched.
+"""
+import os
+import zlib
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional
+    zstandard = None
+
+load_dotenv()
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+# Smaller bodies are sent as is (compression would not pay for its CPU)
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+# Levels tuned for dynamic content: most of the ratio at a fraction of the CPU
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+ZSTD_LEVEL = int(os.getenv("ZSTD_LEVEL", "3"))
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+)
+
+# Paths serving already compressed content
+EXCLUDED_PATH_PREFIXES = ("/api/images/",)
+
+
+class _GzipEncoder:
+    def __init__(self):
+        self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # 31 = gzip container
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+class _BrotliEncoder:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.process(data) + self._compressor.finish()
+
+
+class _ZstdEncoder:
+    def __init__(self):
+        self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+def available_encoders() -> Dict[str, type]:
+    """Supported encodings in server preference order"""
+    encoders = {}
+    if zstandard is not None:
+        encoders["zstd"] = _ZstdEncoder
+    if brotli is not None:
+        encoders["br"] = _BrotliEncoder
+    encoders["gzip"] = _GzipEncoder
+    return encoders
+
+
+def choose_encoding(accept_encoding: str, supported: List[str]) -> Optional[str]:
+    """Best encoding from `supported` acceptable to the client, if any"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in supported:
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing eligible responses with the negotiated encoding"""
+
+    def __init__(
+        self,
+        app,
+        minimum_size: int = COMPRESSION_MIN_SIZE,
+        excluded_paths: Tuple[str, ...] = EXCLUDED_PATH_PREFIXES,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.excluded_paths = excluded_paths
+        self.encoders = available_encoders()
+
+    async def __call__(self, scope, receive, send):
+        if (
+            not COMPRESSION_ENABLED
+            or scope["type"] != "http"
+            or scope["method"] == "HEAD"
+            or scope["path"].startswith(self.excluded_paths)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+                break
+        encoding = choose_encoding(accept_encoding, list(self.encoders))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        await _CompressingResponder(self.app, encoding, self.encoders[encoding], self.minimum_size)(
+            scope, receive, send
+        )
+
+
+class _CompressingResponder:
+    def __init__(self, app, encoding: str, encoder_class: type, minimum_size: int):
+        self.app = app
+        self.encoding = encoding
+        self.encoder_class = encoder_class
+        self.minimum_size = minimum_size
+        self.start_message = None
+        self.encoder = None
+        self.passthrough = False
+
+    async def __call__(self, scope, receive, send):
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    def _eligible(self, headers: List[Tuple[bytes, bytes]]) -> bool:
+        if self.start_message["status"] in (204, 304) or self.start_message["status"] < 200:
+            return False
+        content_type = b""
+        for name, value in headers:
+            if name == b"content-encoding":
+                return False
+            if name == b"content-type":
+                content_type = value
+        return content_type.decode("latin-1").lower().startswith(COMPRESSIBLE_TYPES)
+
+    def _headers(self, content_length: Optional[int]) -> List[Tuple[bytes, bytes]]:
+        headers = []
+        vary = None
+        for name, value in self.start_message["headers"]:
+            if name == b"content-length":
+                continue
+            if name == b"vary":
+                vary = value
+                continue
+            if name == b"etag" and not value.startswith(b"W/"):
+                # The representation changed: a strong validator must too
+                value = b"W/" + value
+            headers.append((name, value))
+        headers.append((b"content-encoding", self.encoding.encode()))
+        headers.append((b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding"))
+        if content_length is not None:
+            headers.append((b"content-length", str(content_length).encode()))
+        return headers
+
+    async def send_compressed(self, message):
+        if message["type"] == "http.response.start":
+            # Held back until the first body chunk tells whether to compress
+            self.start_message = message
+            self.passthrough = not self._eligible(message.get("headers", []))
+            return
+
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        if self.passthrough:
+            if self.start_message is not None:
+                await self.send(self.start_message)
+                self.start_message = None
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.encoder is None:
+            if not more_body:
+                # Whole body in one message
+                if len(body) < self.minimum_size:
+                    await self.send(self.start_message)
+                    await self.send(message)
+                    return
+                compressed = self.encoder_class().finish(body)
+                await self.send({**self.start_message, "headers": self._headers(len(compressed))})
+                await self.send({"type": "http.response.body", "body": compressed})
+                return
+            # Streaming response: compress and flush every chunk
+            self.encoder = self.encoder_class()
+            await self.send({**self.start_message, "headers": self._headers(None)})
+            self.start_message = None
+
+        if more_body:
+            chunk = self.encoder.compress(body) if body else b""
+            if chunk:
+                await self.send({"type": "http.response.body", "body": chunk, "more_body": True})
+        else:
+            await self.send({"type": "http.response.body", "body": self.encoder.finish(body)})
@@ -1,6 +1,11 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.exc import OperationalError, ProgrammingError, TimeoutError as PoolTimeoutError
 from sqlalchemy.orm import DeclarativeBase, sessionmaker
+from sqlalchemy.schema import CreateColumn
+from typing import Callable, Optional
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -8,26 +13,253 @@ load_dotenv()
 # Database URL from environment variable
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./crisis_platform.db")
 
-# Create engine
-if DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(
-        DATABASE_URL, connect_args={"check_same_thread": False}
-    )
-else:
-    engine = create_engine(DATABASE_URL)
+# Connection pool sizing (per worker process, ignored for SQLite)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+
+# Circuit breaker around get_db (per worker process): after this many
+# consecutive connection failures the database is left alone for
+# DB_BREAKER_RESET_SECONDS; read routes answer from snapshots meanwhile
+DB_BREAKER_FAILURE_THRESHOLD = int(os.getenv("DB_BREAKER_FAILURE_THRESHOLD", "5"))
+DB_BREAKER_RESET_SECONDS = float(os.getenv("DB_BREAKER_RESET_SECONDS", "10"))
+
+# Errors meaning the database can't be reached or doesn't answer in time
+# (connection refused/lost, server shutting down, pool checkout timeout)
+DB_UNAVAILABLE_ERRORS = (OperationalError, PoolTimeoutError)
 
-# Create SessionLocal class
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# The engine is created lazily so that every worker process gets its own
+# connection pool after fork instead of inheriting sockets from the parent.
+engine = None
+
+# Create SessionLocal class (bound to the engine in init_engine)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
 
 # Create Base class for models (SQLAlchemy 2.0 style)
 class Base(DeclarativeBase):
     pass
 
-# Dependency to get database session
-def get_db():
+
+def create_db_engine(url: str):
+    """Engine with the pool settings used for every database of the app"""
+    if url.startswith("sqlite"):
+        return create_engine(url, connect_args={"check_same_thread": False})
+    return create_engine(
+        url,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_pre_ping=True
+    )
+
+
+def init_engine():
+    """Create the engine for the current process if it doesn't exist yet"""
+    global engine
+    if engine is None:
+        engine = create_db_engine(DATABASE_URL)
+        SessionLocal.configure(bind=engine)
+    return engine
+
+
+def dispose_engine() -> None:
+    """Close all pooled connections of the current process"""
+    global engine
+    if engine is not None:
+        engine.dispose()
+        engine = None
+
+
+def _reset_engine_after_fork() -> None:
+    # Connections inherited from the parent must not be used (or closed) by
+    # the child; drop the references and let the child build its own pool.
+    global engine
+    if engine is not None:
+        engine.dispose(close=False)
+        engine = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_engine_after_fork)
+
+
+def dialect_insert(db):
+    """
+    Dialect-specific insert() supporting ON CONFLICT upserts, or None when the
+    current database has no such construct
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+        return insert
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+        return insert
+    return None
+
+
+def _add_column(bind, column) -> None:
+    """ALTER TABLE ... ADD COLUMN for a nullable column (with its foreign key)"""
+    if not column.nullable and column.server_default is None:
+        raise RuntimeError(
+            f"{column.table.name}.{column.name} is missing and NOT NULL without a server default: "
+            "add it by hand before starting the app"
+        )
+    preparer = bind.dialect.identifier_preparer
+    ddl = f"ALTER TABLE {preparer.format_table(column.table)} ADD COLUMN {CreateColumn(column).compile(dialect=bind.dialect)}"
+    for foreign_key in column.foreign_keys:
+        target = foreign_key.column
+        ddl += f" REFERENCES {preparer.format_table(target.table)} ({preparer.quote(target.name)})"
+        if foreign_key.ondelete:
+            ddl += f" ON DELETE {foreign_key.ondelete}"
+    with bind.begin() as connection:
+        connection.execute(text(ddl))
+
+
+def upgrade_schema(bind) -> None:
+    """
+    Add the columns and indexes that models gained after their table was created
+
+    create_all() only creates missing tables, so databases created by an
+    earlier version would never get them. Only nullable columns (or ones with
+    a server default) can be added this way. Runs in every worker: a column
+    or index another worker added meanwhile is not an error.
+    """
+    existing_tables = set(inspect(bind).get_table_names())
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing_columns = {column["name"] for column in inspect(bind).get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            try:
+                _add_column(bind, column)
+            except (OperationalError, ProgrammingError):
+                if column.name not in {found["name"] for found in inspect(bind).get_columns(table.name)}:
+                    raise
+        existing_indexes = {index["name"] for index in inspect(bind).get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing_indexes:
+                continue
+            try:
+                index.create(bind)
+            except (OperationalError, ProgrammingError):
+                if index.name not in {found["name"] for found in inspect(bind).get_indexes(table.name)}:
+                    raise
+
+
+class DatabaseUnavailable(Exception):
+    """Raised by get_db while the circuit breaker is open"""
+
+    def __init__(self, retry_after: float):
+        super().__init__("Database unavailable")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker
+
+    closed: calls go through; failure_threshold failures in a row open it.
+    open: calls are refused for reset_seconds. Then the next call runs
+    probe() (half-open): success closes the breaker, failure re-opens it.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int,
+        reset_seconds: float,
+        probe: Optional[Callable[[], None]] = None
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.probe = probe
+        self.failures = 0
+        self.trips = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        return "half_open" if self._probing else "open"
+
+    def retry_after(self) -> float:
+        """Seconds until the next probe (0 when closed)"""
+        if self._opened_at is None:
+            return 0.0
+        return max(0.0, self._opened_at + self.reset_seconds - time.monotonic())
+
+    def allow(self) -> bool:
+        """Whether a call may use the database now"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._probing or time.monotonic() - self._opened_at < self.reset_seconds:
+                return False
+            self._probing = True
+        if self.probe is None:
+            return True
+        try:
+            self.probe()
+        except Exception:
+            self.record_failure()
+            return False
+        self.record_success()
+        return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    self.trips += 1
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+
+def _ping() -> None:
+    with init_engine().connect() as connection:
+        connection.execute(text("SELECT 1"))
+
+
+db_breaker = CircuitBreaker(DB_BREAKER_FAILURE_THRESHOLD, DB_BREAKER_RESET_SECONDS, probe=_ping)
+
+
+def _session_scope():
+    init_engine()
     db = SessionLocal()
     try:
         yield db
+    except DB_UNAVAILABLE_ERRORS:
+        db_breaker.record_failure()
+        raise
+    else:
+        db_breaker.record_success()
     finally:
         db.close()
 
+
+# Dependency to get database session
+def get_db():
+    if not db_breaker.allow():
+        raise DatabaseUnavailable(db_breaker.retry_after())
+    yield from _session_scope()
+
+
+def get_read_db():
+    """
+    get_db for read routes that can answer from snapshots: yields None
+    instead of failing while the circuit breaker is open
+    """
+    if not db_breaker.allow():
+        yield None
+        return
+    yield from _session_scope()
@@ -0,0 +1,290 @@
+"""
+Streaming export of issues for analytics
+
+Rows are read with a server-side cursor (yield_per) and encoded chunk by
+chunk, so memory stays flat no matter how many rows are exported.
+Arrow and Parquet output require the optional `pyarrow` package.
+"""
+import csv
+import io
+import json
+import os
+from datetime import datetime
+from typing import Iterator, List, Optional, Sequence
+from sqlalchemy import select, union_all
+from dotenv import load_dotenv
+from app.database import SessionLocal, init_engine
+from app.archive import HOT_ONLY_STATUSES
+from app.models import Issue, IssueArchive, IssueCategory, IssueStatus
+from app.file_utils import get_image_url
+
+load_dotenv()
+
+# Rows fetched from the cursor per round trip
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "5000"))
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+EXPORT_COLUMNS = (
+    "id",
+    "title",
+    "description",
+    "category",
+    "status",
+    "latitude",
+    "longitude",
+    "image_url",
+    "created_at",
+    "updated_at",
+    "reporter_id",
+    "zone_id",
+)
+
+
+def require_pyarrow():
+    """Import pyarrow or raise ImportError with an actionable message"""
+    try:
+        import pyarrow
+        return pyarrow
+    except ImportError:
+        raise ImportError("Arrow/Parquet export requires the 'pyarrow' package")
+
+
+def parse_bbox(bbox: str) -> tuple:
+    """Parse "min_lon,min_lat,max_lon,max_lat" into floats"""
+    parts = [float(part) for part in bbox.split(",")]
+    if len(parts) != 4:
+        raise ValueError("bbox must be min_lon,min_lat,max_lon,max_lat")
+    min_lon, min_lat, max_lon, max_lat = parts
+    if min_lon > max_lon or min_lat > max_lat:
+        raise ValueError("bbox minimums must not exceed maximums")
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def _filtered_select(
+    model,
+    since: Optional[datetime],
+    until: Optional[datetime],
+    category: Optional[IssueCategory],
+    status: Optional[IssueStatus],
+    bbox: Optional[tuple],
+    zone_id: Optional[int]
+):
+    query = select(*(getattr(model, column) for column in EXPORT_COLUMNS))
+    if since:
+        query = query.where(model.created_at >= since)
+    if until:
+        query = query.where(model.created_at < until)
+    if category:
+        query = query.where(model.category == category)
+    if status:
+        query = query.where(model.status == status)
+    if bbox:
+        min_lon, min_lat, max_lon, max_lat = bbox
+        query = query.where(
+            model.longitude.between(min_lon, max_lon),
+            model.latitude.between(min_lat, max_lat)
+        )
+    if zone_id is not None:
+        query = query.where(model.zone_id == zone_id)
+    return query
+
+
+def build_export_query(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    category: Optional[IssueCategory] = None,
+    status: Optional[IssueStatus] = None,
+    bbox: Optional[tuple] = None,
+    zone_id: Optional[int] = None
+):
+    """
+    Column-only SELECT (no ORM objects) ordered by id for stable output
+
+    Archived issues are included (UNION ALL with issues_archive, merged on
+    the primary keys) unless the status filter excludes them.
+    """
+    filters = (since, until, category, status, bbox, zone_id)
+    query = _filtered_select(Issue, *filters)
+    if status in HOT_ONLY_STATUSES:
+        return query.order_by(Issue.id)
+    return union_all(query, _filtered_select(IssueArchive, *filters)).order_by("id")
+
+
+def iter_row_chunks(
+    query,
+    base_url: str,
+    chunk_size: int = EXPORT_CHUNK_SIZE,
+    session_factories: Optional[Sequence] = None
+) -> Iterator[List[tuple]]:
+    """
+    Yield lists of plain tuples (enums as values, image paths as URLs)
+
+    Uses its own session so the cursor stays valid while the response streams.
+    With several session factories (shards) their rows follow one another,
+    each database's rows ordered by id.
+    """
+    if session_factories is None:
+        init_engine()
+        session_factories = [SessionLocal]
+    for session_factory in session_factories:
+        db = session_factory()
+        try:
+            result = db.execute(
+                query.execution_options(stream_results=True, yield_per=chunk_size)
+            )
+            for partition in result.partitions():
+                yield [
+                    (
+                        row.id,
+                        row.title,
+                        row.description,
+                        row.category.value,
+                        row.status.value,
+                        row.latitude,
+                        row.longitude,
+                        get_image_url(row.image_url, base_url) if row.image_url else None,
+                        row.created_at,
+                        row.updated_at,
+                        row.reporter_id,
+                        row.zone_id,
+                    )
+                    for row in partition
+                ]
+        finally:
+            db.close()
+
+
+def _text_row(row: tuple) -> tuple:
+    """Row with timestamps rendered as ISO 8601 strings"""
+    created_at, updated_at = row[8], row[9]
+    return row[:8] + (
+        created_at.isoformat() if created_at is not None else None,
+        updated_at.isoformat() if updated_at is not None else None,
+    ) + row[10:]
+
+
+def encode_ndjson(chunks: Iterator[List[tuple]]) -> Iterator[bytes]:
+    for rows in chunks:
+        yield "".join(
+            json.dumps(dict(zip(EXPORT_COLUMNS, _text_row(row)))) + "\n" for row in rows
+        ).encode()
+
+
+def encode_csv(chunks: Iterator[List[tuple]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for rows in chunks:
+        writer.writerows(_text_row(row) for row in rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def _arrow_schema(pa):
+    return pa.schema([
+        ("id", pa.int64()),
+        ("title", pa.string()),
+        ("description", pa.string()),
+        ("category", pa.dictionary(pa.int8(), pa.string())),
+        ("status", pa.dictionary(pa.int8(), pa.string())),
+        ("latitude", pa.float64()),
+        ("longitude", pa.float64()),
+        ("image_url", pa.string()),
+        ("created_at", pa.timestamp("us", tz="UTC")),
+        ("updated_at", pa.timestamp("us", tz="UTC")),
+        ("reporter_id", pa.int64()),
+        ("zone_id", pa.int64()),
+    ])
+
+
+def _record_batch(pa, schema, rows: Sequence[tuple]):
+    columns = list(zip(*rows))
+    arrays = []
+    for field, values in zip(schema, columns):
+        if pa.types.is_dictionary(field.type):
+            arrays.append(pa.array(values, type=pa.string()).dictionary_encode())
+        else:
+            arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object collecting bytes until drained"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def encode_arrow(chunks: Iterator[List[tuple]]) -> Iterator[bytes]:
+    pa = require_pyarrow()
+    import pyarrow.ipc
+
+    schema = _arrow_schema(pa)
+    sink = _ChunkSink()
+    with pyarrow.ipc.new_stream(sink, schema) as writer:
+        for rows in chunks:
+            if rows:
+                writer.write_batch(_record_batch(pa, schema, rows))
+                yield sink.drain()
+    yield sink.drain()
+
+
+def encode_parquet(chunks: Iterator[List[tuple]]) -> Iterator[bytes]:
+    pa = require_pyarrow()
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema(pa)
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema, compression="zstd") as writer:
+        for rows in chunks:
+            if rows:
+                # One row group per chunk, flushed to the client right away
+                writer.write_batch(_record_batch(pa, schema, rows))
+                yield sink.drain()
+    yield sink.drain()
+
+
+ENCODERS = {
+    "ndjson": encode_ndjson,
+    "csv": encode_csv,
+    "arrow": encode_arrow,
+    "parquet": encode_parquet,
+}
+
+
+def stream_export(
+    query,
+    export_format: str,
+    base_url: str,
+    session_factories: Optional[Sequence] = None
+) -> Iterator[bytes]:
+    """Encoded byte chunks for the given query and format (of each shard in turn)"""
+    chunks = iter_row_chunks(query, base_url, session_factories=session_factories)
+    for data in ENCODERS[export_format](chunks):
+        if data:
+            yield data
@@ -0,0 +1,31 @@
+"""
+Advisory file locks shared by the worker processes of a host
+
+fcntl.flock on POSIX, msvcrt.locking on the first byte of the file on
+Windows. Either way the lock belongs to the open file and is released when
+the file is closed, also when the process dies.
+"""
+import os
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def try_lock(fd: int) -> bool:
+    """Exclusive lock on an open file without waiting; False if someone else holds it"""
+    if fcntl is not None:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        return True
+    # msvcrt locks bytes from the current position (also past the end)
+    os.lseek(fd, 0, os.SEEK_SET)
+    try:
+        msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
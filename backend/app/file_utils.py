@@ -2,11 +2,13 @@
 File upload utilities for handling images
 """
 import os
+import time
 import uuid
 from pathlib import Path
+from typing import NamedTuple, Optional
 from fastapi import UploadFile, HTTPException, status
 from PIL import Image
-import shutil
+from starlette.concurrency import run_in_threadpool
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -16,6 +18,11 @@ UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./uploads")
 MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", "5242880"))  # 5MB default
 ALLOWED_EXTENSIONS = {"jpg", "jpeg", "png", "gif"}
 ALLOWED_MIME_TYPES = {"image/jpeg", "image/png", "image/gif"}
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Uploads are staged here before the issue row exists
+STAGING_DIR = Path(UPLOAD_DIR) / "tmp"
+STAGING_MAX_AGE_SECONDS = int(os.getenv("STAGING_MAX_AGE_SECONDS", "3600"))
 
 # Create upload directory if it doesn't exist
 Path(UPLOAD_DIR).mkdir(parents=True, exist_ok=True)
@@ -39,68 +46,140 @@ def validate_image_file(file: UploadFile) -> None:
         )
 
 
-async def save_uploaded_image(file: UploadFile, issue_id: int) -> str:
+def verify_image(path: Path) -> None:
+    """Raise 400 unless the file is a valid image (blocking: run in the threadpool)"""
+    try:
+        with Image.open(path) as image:
+            image.verify()  # Verify it's a valid image
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Error processing image: file is not a valid image"
+        )
+
+
+class StagedImage(NamedTuple):
+    """A validated upload waiting in the staging directory"""
+    path: Path
+    file_ext: str
+
+
+async def stage_uploaded_image(file: UploadFile) -> StagedImage:
     """
-    Save uploaded image and return the file path relative to upload directory
-    
+    Stream an uploaded image to the staging directory and validate it
+
+    Nothing is kept in memory and no database connection is needed, so this
+    runs before the issue row is inserted.
+
     Args:
         file: Uploaded file
-        issue_id: ID of the issue this image belongs to
-    
+
     Returns:
-        Relative file path (e.g., "issues/1/uuid-filename.jpg")
+        StagedImage to pass to promote_staged_image() once the issue id is known
     """
     # Validate file
     validate_image_file(file)
-    
-    # Generate unique filename
+
     file_ext = file.filename.split(".")[-1].lower() if file.filename else "jpg"
-    unique_filename = f"{uuid.uuid4()}.{file_ext}"
-    
-    # Create issue-specific directory
-    issue_dir = Path(UPLOAD_DIR) / "issues" / str(issue_id)
-    issue_dir.mkdir(parents=True, exist_ok=True)
-    
-    # Full file path
-    file_path = issue_dir / unique_filename
-    
-    # Read and validate image
+    STAGING_DIR.mkdir(parents=True, exist_ok=True)
+    staged_path = STAGING_DIR / f"{uuid.uuid4()}.{file_ext}"
+
     try:
-        # Read file content
-        contents = await file.read()
-        
-        # Check file size
-        if len(contents) > MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"File too large. Maximum size: {MAX_FILE_SIZE / 1024 / 1024:.1f}MB"
-            )
-        
-        # Validate image with PIL
-        from io import BytesIO
-        image = Image.open(BytesIO(contents))
-        image.verify()  # Verify it's a valid image
-        
-        # Save file
-        with open(file_path, "wb") as buffer:
-            buffer.write(contents)
-        
-        # Return relative path for database storage
-        return f"issues/{issue_id}/{unique_filename}"
-        
+        size = 0
+        with open(staged_path, "wb") as buffer:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                # Check file size
+                if size > MAX_FILE_SIZE:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail=f"File too large. Maximum size: {MAX_FILE_SIZE / 1024 / 1024:.1f}MB"
+                    )
+                # Disk writes off the event loop
+                await run_in_threadpool(buffer.write, chunk)
+
+        # Validate image with PIL (reads and decodes the file)
+        await run_in_threadpool(verify_image, staged_path)
+
+        return StagedImage(staged_path, file_ext)
+
     except HTTPException:
+        staged_path.unlink(missing_ok=True)
         # Re-raise HTTP exceptions
         raise
     except Exception as e:
         # Clean up on error
-        if file_path.exists():
-            file_path.unlink()
+        staged_path.unlink(missing_ok=True)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Error processing image: {str(e)}"
         )
 
 
+def promote_staged_image(staged: StagedImage, issue_id: int) -> str:
+    """
+    Move a staged image into the issue's directory (a rename, no copy)
+
+    Returns:
+        Relative file path (e.g., "issues/1/uuid-filename.jpg")
+    """
+    # Create issue-specific directory
+    issue_dir = Path(UPLOAD_DIR) / "issues" / str(issue_id)
+    issue_dir.mkdir(parents=True, exist_ok=True)
+
+    os.replace(staged.path, issue_dir / staged.path.name)
+
+    # Return relative path for database storage
+    return f"issues/{issue_id}/{staged.path.name}"
+
+
+def discard_staged_image(staged: Optional[StagedImage]) -> None:
+    """Remove a staged image that won't be attached to an issue"""
+    if staged is not None:
+        staged.path.unlink(missing_ok=True)
+
+
+def cleanup_staged_images(max_age_seconds: int = STAGING_MAX_AGE_SECONDS) -> int:
+    """
+    Delete staged files older than max_age_seconds (left over by crashed or
+    aborted requests)
+
+    Returns:
+        Number of files removed
+    """
+    if not STAGING_DIR.exists():
+        return 0
+    cutoff = time.time() - max_age_seconds
+    removed = 0
+    for path in STAGING_DIR.iterdir():
+        try:
+            if path.is_file() and path.stat().st_mtime < cutoff:
+                path.unlink()
+                removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+async def save_uploaded_image(file: UploadFile, issue_id: int) -> str:
+    """
+    Save uploaded image and return the file path relative to upload directory
+    
+    Args:
+        file: Uploaded file
+        issue_id: ID of the issue this image belongs to
+    
+    Returns:
+        Relative file path (e.g., "issues/1/uuid-filename.jpg")
+    """
+    staged = await stage_uploaded_image(file)
+    try:
+        return promote_staged_image(staged, issue_id)
+    except Exception:
+        discard_staged_image(staged)
+        raise
+
+
 def get_image_url(image_path: str, base_url: str = "") -> str:
     """
     Get the full URL for an image
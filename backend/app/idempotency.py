@@ -0,0 +1,119 @@
+"""
+Idempotency-Key support: store responses of write requests so that client
+retries replay the original response instead of creating duplicates
+"""
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+from app.models import IdempotencyKey
+
+load_dotenv()
+
+# How long stored responses are replayed
+IDEMPOTENCY_KEY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_KEY_TTL_HOURS", "48"))
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+
+def request_fingerprint(**params: Any) -> str:
+    """Stable hash of the request parameters a key was first used with"""
+    payload = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _cutoff() -> datetime:
+    return datetime.now(timezone.utc) - timedelta(hours=IDEMPOTENCY_KEY_TTL_HOURS)
+
+
+def validate_key(key: str) -> None:
+    if not key or len(key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Idempotency-Key must be 1-{MAX_IDEMPOTENCY_KEY_LENGTH} characters"
+        )
+
+
+def _is_expired(record: IdempotencyKey) -> bool:
+    created_at = record.created_at
+    if created_at is None:
+        return False
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return created_at < _cutoff()
+
+
+def get_stored_response(db: Session, user_id: int, key: str) -> Optional[IdempotencyKey]:
+    """Return the stored response for (user, key) if it hasn't expired"""
+    return get_stored_responses(db, user_id, [key]).get(key)
+
+
+def get_stored_responses(db: Session, user_id: int, keys: List[str]) -> Dict[str, IdempotencyKey]:
+    """
+    Return unexpired stored responses for many keys in one query
+
+    Expired records are deleted so the key can be reused.
+    """
+    if not keys:
+        return {}
+    records = {}
+    expired = False
+    for record in db.query(IdempotencyKey).filter(
+        IdempotencyKey.user_id == user_id,
+        IdempotencyKey.key.in_(keys)
+    ):
+        if _is_expired(record):
+            db.delete(record)
+            expired = True
+        else:
+            records[record.key] = record
+    if expired:
+        db.flush()
+    return records
+
+
+def replay(record: IdempotencyKey, fingerprint: str) -> JSONResponse:
+    """Build the replayed response, rejecting reuse of a key for another request"""
+    if record.request_hash != fingerprint:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key was already used with different request parameters"
+        )
+    return JSONResponse(
+        status_code=record.status_code,
+        content=record.response_body,
+        headers={"Idempotent-Replayed": "true"}
+    )
+
+
+def store_response(
+    db: Session,
+    user_id: int,
+    key: str,
+    fingerprint: str,
+    status_code: int,
+    body: Any
+) -> IdempotencyKey:
+    """Add the response record to the session (committed with the caller's transaction)"""
+    record = IdempotencyKey(
+        user_id=user_id,
+        key=key,
+        request_hash=fingerprint,
+        status_code=status_code,
+        response_body=body
+    )
+    db.add(record)
+    return record
+
+
+def purge_expired_keys(db: Session) -> int:
+    """Delete expired records, returns the number removed"""
+    deleted = db.query(IdempotencyKey).filter(
+        IdempotencyKey.created_at < _cutoff()
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
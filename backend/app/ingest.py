@@ -0,0 +1,547 @@
+"""
+Write-ahead ingest buffer for report bursts (INGEST_MODE=buffered)
+
+POST /api/issues/ appends the validated report to a local append-only log
+and answers 202 with a provisional id as soon as the record is on disk.
+Concurrent appends are group-committed: one write + fsync per batch of
+records instead of one database commit per report. A background job
+(INGEST_FLUSH_INTERVAL_SECONDS) turns logged reports into issues with bulk
+inserts of up to INGEST_FLUSH_BATCH_SIZE rows and links their images;
+GET /api/issues/provisional/{id} tells the client the final issue id.
+
+Layout: INGEST_DIR/slot-N/segment-<seq>.log, one slot per worker process
+(held with an exclusive file lock). Records are framed as
+<length:u32><crc32:u32><json>; a torn tail left by a crash is ignored
+(those records were never acknowledged). The flusher rotates the active
+segment, inserts the closed ones and deletes them once committed. Every
+report's outcome is written to ingest_receipts in the same transaction as
+its issue, so replaying a segment after a crash never creates an issue
+twice. Slots whose worker died are adopted by any running worker (or by
+the next one to start), so nothing is left behind on restart.
+
+With sharding, reports are inserted on the shard of their location and the
+receipts written on the primary after the shard committed. The shard also
+keeps an "ingest:<provisional id>" idempotency record of every report, so a
+crash between the two commits is repaired by the replay instead of
+inserting the report again.
+
+Images are held in UPLOAD_DIR/ingest until the issue exists.
+"""
+import asyncio
+import logging
+import os
+import re
+import secrets
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import orjson
+from fastapi import status
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import insert, select
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from dotenv import load_dotenv
+from app.analytics import record_issues
+from app.database import SessionLocal
+from app.file_lock import try_lock
+from app.file_utils import UPLOAD_DIR, StagedImage, discard_staged_image, get_image_url, promote_staged_image
+from app.idempotency import store_response
+from app.issue_events import record_created
+from app.models import IdempotencyKey, IngestReceipt, Issue, User
+from app.schemas import IssueResponse
+from app.sharding import SHARD_REGION, SHARDING_ENABLED, shard_for_location, shard_session, with_issue_ids
+from app.sync import track_issue_changes
+from app.triage import update_triage_queue
+from app.zones import locate_zones
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# direct: insert on every request; buffered: acknowledge from the log
+INGEST_MODE = os.getenv("INGEST_MODE", "direct")
+INGEST_DIR = Path(os.getenv("INGEST_DIR", "./ingest"))
+INGEST_FLUSH_INTERVAL_SECONDS = float(os.getenv("INGEST_FLUSH_INTERVAL_SECONDS", "0.5"))
+INGEST_FLUSH_BATCH_SIZE = int(os.getenv("INGEST_FLUSH_BATCH_SIZE", "2000"))
+# Provisional ids unknown this long after their report are reported missing
+INGEST_PENDING_WINDOW_SECONDS = int(os.getenv("INGEST_PENDING_WINDOW_SECONDS", "86400"))
+INGEST_RECEIPT_TTL_DAYS = int(os.getenv("INGEST_RECEIPT_TTL_DAYS", "7"))
+
+# Images of reports waiting in the log (same filesystem as the uploads: renames)
+HELD_IMAGE_DIR = Path(UPLOAD_DIR) / "ingest"
+
+_HEADER = struct.Struct("<II")
+# macOS has no fdatasync
+_fdatasync = getattr(os, "fdatasync", os.fsync)
+_PROVISIONAL_ID = re.compile(r"^[0-9a-f]{24}$")
+
+
+def new_provisional_id() -> str:
+    """Milliseconds since the epoch (11 hex digits) + 13 random hex digits"""
+    return f"{int(time.time() * 1000):011x}{secrets.token_hex(7)[:13]}"
+
+
+def is_pending(provisional_id: str) -> bool:
+    """Whether an id without receipt can still be in some worker's log"""
+    if not _PROVISIONAL_ID.match(provisional_id):
+        return False
+    age = time.time() - int(provisional_id[:11], 16) / 1000
+    return -60 < age < INGEST_PENDING_WINDOW_SECONDS
+
+
+def _frame(payload: bytes) -> bytes:
+    return _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def read_segment(path: Path) -> List[dict]:
+    """Records of a segment, up to a torn or corrupt tail"""
+    data = path.read_bytes()
+    records = []
+    offset = 0
+    while offset + _HEADER.size <= len(data):
+        length, checksum = _HEADER.unpack_from(data, offset)
+        payload = data[offset + _HEADER.size:offset + _HEADER.size + length]
+        if len(payload) < length or zlib.crc32(payload) != checksum:
+            break
+        records.append(orjson.loads(payload))
+        offset += _HEADER.size + length
+    if offset < len(data):
+        logger.warning("Ignoring %d bytes of incomplete records at the end of %s", len(data) - offset, path)
+    return records
+
+
+def _fsync_directory(path: Path) -> None:
+    if os.name == "nt":
+        return  # directories can't be opened (NTFS journals their entries)
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _segments(slot_dir: Path) -> List[Path]:
+    return sorted(slot_dir.glob("segment-*.log"))
+
+
+def _try_lock(slot_dir: Path) -> Optional[int]:
+    """Exclusive lock on a slot (released when the fd is closed)"""
+    fd = os.open(slot_dir / "lock", os.O_RDWR | os.O_CREAT, 0o644)
+    if not try_lock(fd):
+        os.close(fd)
+        return None
+    return fd
+
+
+class IngestLog:
+    """This worker's slot of the write-ahead log"""
+
+    def __init__(self, directory: Path = INGEST_DIR):
+        self.directory = directory
+        self.slot_dir: Optional[Path] = None
+        self._lock_fd: Optional[int] = None
+        self._file = None
+        self._size = 0
+        self._seq = 0
+        # File writes, fsync and rotation (threadpool) vs each other
+        self._mutex = threading.Lock()
+        # A periodic flush still running when shutdown flushes
+        self._flushing = threading.Lock()
+        # Group commit state (event loop only)
+        self._queue: List[Tuple[bytes, asyncio.Future]] = []
+        self._writer: Optional[asyncio.Task] = None
+        self.appended = 0
+        self.fsyncs = 0
+
+    @property
+    def is_open(self) -> bool:
+        return self._file is not None
+
+    def open(self) -> None:
+        """Claim a free slot; segments a previous owner left there are flushed later"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        HELD_IMAGE_DIR.mkdir(parents=True, exist_ok=True)
+        number = 0
+        while True:
+            slot_dir = self.directory / f"slot-{number}"
+            slot_dir.mkdir(exist_ok=True)
+            fd = _try_lock(slot_dir)
+            if fd is not None:
+                break
+            number += 1
+        self.slot_dir, self._lock_fd = slot_dir, fd
+        existing = _segments(slot_dir)
+        self._seq = int(existing[-1].stem.split("-")[1]) if existing else 0
+        self._open_segment()
+
+    def _open_segment(self) -> None:
+        self._seq += 1
+        self._file = open(self.slot_dir / f"segment-{self._seq:012d}.log", "ab")
+        self._size = 0
+        # Make the new file's directory entry durable too
+        _fsync_directory(self.slot_dir)
+
+    def close(self) -> None:
+        with self._mutex:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                if self._size == 0:
+                    (self.slot_dir / f"segment-{self._seq:012d}.log").unlink(missing_ok=True)
+            if self._lock_fd is not None:
+                os.close(self._lock_fd)
+                self._lock_fd = None
+
+    async def append(self, record: dict) -> None:
+        """Return once the record is durable (fsync shared with concurrent appends)"""
+        future = asyncio.get_running_loop().create_future()
+        self._queue.append((_frame(orjson.dumps(record)), future))
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.get_running_loop().create_task(self._write_groups())
+        await future
+
+    async def _write_groups(self) -> None:
+        # Appends arriving during a write + fsync form the next group
+        while self._queue:
+            group, self._queue = self._queue, []
+            try:
+                await run_in_threadpool(self._write, [frame for frame, _ in group])
+            except Exception as e:
+                for _, future in group:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for _, future in group:
+                    if not future.done():
+                        future.set_result(None)
+
+    def _write(self, frames: List[bytes]) -> None:
+        data = b"".join(frames)
+        with self._mutex:
+            if self._file is None:
+                raise RuntimeError("The ingest log is not open")
+            self._file.write(data)
+            self._file.flush()
+            _fdatasync(self._file.fileno())
+            self._size += len(data)
+            self.appended += len(frames)
+            self.fsyncs += 1
+
+    def _rotate(self) -> Path:
+        """Close the active segment if it holds records, returns the active one"""
+        with self._mutex:
+            if self._file is not None and self._size:
+                self._file.close()
+                self._open_segment()
+            return self.slot_dir / f"segment-{self._seq:012d}.log"
+
+    def flush(self, db: Session, batch_size: int = INGEST_FLUSH_BATCH_SIZE) -> int:
+        """
+        Insert every closed segment of this slot and of abandoned slots
+
+        Returns:
+            Number of records processed
+        """
+        if not self.directory.exists():
+            return 0
+        processed = 0
+        with self._flushing:
+            if self.slot_dir is not None:
+                active = self._rotate()
+                processed += _flush_segments(db, [p for p in _segments(self.slot_dir) if p != active], batch_size)
+            for slot_dir in sorted(self.directory.glob("slot-*")):
+                if slot_dir == self.slot_dir or not _segments(slot_dir):
+                    continue
+                fd = _try_lock(slot_dir)
+                if fd is None:
+                    continue  # owned by a live worker
+                try:
+                    processed += _flush_segments(db, _segments(slot_dir), batch_size)
+                finally:
+                    os.close(fd)
+        return processed
+
+    def has_backlog(self) -> bool:
+        return self.directory.exists() and any(_segments(slot) for slot in self.directory.glob("slot-*"))
+
+
+ingest_log = IngestLog()
+
+
+def _flush_segments(db: Session, segments: List[Path], batch_size: int) -> int:
+    processed = 0
+    for path in segments:
+        records = read_segment(path)
+        for start in range(0, len(records), batch_size):
+            insert_reports(db, records[start:start + batch_size])
+        processed += len(records)
+        # Every record has a receipt now
+        path.unlink()
+    return processed
+
+
+def _held_image(record: dict) -> Optional[StagedImage]:
+    if not record.get("image_ext"):
+        return None
+    return StagedImage(HELD_IMAGE_DIR / f"{record['provisional_id']}.{record['image_ext']}", record["image_ext"])
+
+
+def _link_images(pairs: List[Tuple[dict, int]]) -> None:
+    """Move held images next to their committed issues (idempotent)"""
+    for record, issue_id in pairs:
+        held = _held_image(record)
+        if held is not None and held.path.exists():
+            promote_staged_image(held, issue_id)
+
+
+def insert_reports(db: Session, records: List[dict]) -> None:
+    """
+    Turn logged reports into issues with one transaction (commits)
+
+    Reports that already have a receipt (replayed after a crash) are
+    skipped; retries under an Idempotency-Key resolve to the first issue.
+    If the batch fails for anything but a connection problem, reports are
+    retried one by one and those failing again get an error receipt.
+    """
+    if not records:
+        return
+    done = dict(db.execute(
+        select(IngestReceipt.provisional_id, IngestReceipt.issue_id)
+        .where(IngestReceipt.provisional_id.in_([record["provisional_id"] for record in records]))
+    ).all())
+    # A crash between commit and image rename
+    _link_images([(record, done[record["provisional_id"]]) for record in records
+                  if done.get(record["provisional_id"]) is not None])
+    records = [record for record in records if record["provisional_id"] not in done]
+    for shard, group in _by_shard(db, records):
+        with shard_session(db, shard) as issue_db:
+            try:
+                links = _insert_batch(db, issue_db, group)
+                # The shard first: its ingest records make a replay find the
+                # issues if the primary's commit is lost
+                issue_db.commit()
+                db.commit()
+            except OperationalError:
+                # Database unreachable: the segment stays and is retried
+                issue_db.rollback()
+                db.rollback()
+                raise
+            except SQLAlchemyError:
+                issue_db.rollback()
+                db.rollback()
+                if len(group) == 1:
+                    _record_failure(db, group[0])
+                    continue
+                for record in group:
+                    insert_reports(db, [record])
+                continue
+        _link_images(links)
+
+
+def _by_shard(db: Session, records: List[dict]) -> List[Tuple[int, List[dict]]]:
+    """Reports grouped by the shard of their location (all on 0 without sharding)"""
+    if not records:
+        return []
+    if not SHARDING_ENABLED:
+        return [(0, records)]
+    zone_ids = [None] * len(records)
+    if SHARD_REGION == "zone":
+        zone_ids = locate_zones(db, [record["latitude"] for record in records], [record["longitude"] for record in records])
+    groups: Dict[int, List[dict]] = {}
+    for record, zone_id in zip(records, zone_ids):
+        shard = shard_for_location(db, record["latitude"], record["longitude"], zone_id)
+        groups.setdefault(shard, []).append(record)
+    return sorted(groups.items())
+
+
+def _ingest_key(record: dict) -> str:
+    return f"ingest:{record['provisional_id']}"
+
+
+def _insert_batch(db: Session, issue_db: Session, records: List[dict]) -> List[Tuple[dict, int]]:
+    """Insert reports on issue_db (db itself or a shard), their receipts on db"""
+    reporters = set(db.scalars(select(User.id).where(User.id.in_({record["reporter_id"] for record in records}))))
+    receipts = []
+    links = []
+    if issue_db is not db:
+        # Inserted on the shard by an earlier flush whose receipts were lost
+        inserted = dict(issue_db.execute(
+            select(IdempotencyKey.key, IdempotencyKey.response_body)
+            .where(IdempotencyKey.key.in_([_ingest_key(record) for record in records]))
+        ).all())
+        for record in records:
+            body = inserted.get(_ingest_key(record))
+            if body is not None:
+                receipts.append(dict(
+                    provisional_id=record["provisional_id"], reporter_id=record["reporter_id"],
+                    issue_id=body["id"], error=None
+                ))
+                if _held_image(record) is not None:
+                    links.append((record, body["id"]))
+        records = [record for record in records if _ingest_key(record) not in inserted]
+
+    keyed = [(record["reporter_id"], record["idempotency_key"]) for record in records if record.get("idempotency_key")]
+    stored: Dict[Tuple[int, str], IdempotencyKey] = {}
+    if keyed:
+        for row in issue_db.scalars(select(IdempotencyKey).where(
+            IdempotencyKey.user_id.in_({user_id for user_id, _ in keyed}),
+            IdempotencyKey.key.in_({key for _, key in keyed})
+        )):
+            stored[(row.user_id, row.key)] = row
+
+    new = []
+    first_by_key: Dict[Tuple[int, str], dict] = {}
+    retries = []  # (record, first record with the same key in this batch)
+    for record in records:
+        if record["reporter_id"] not in reporters:
+            # Account deleted in the meantime (its receipts would be deleted too)
+            logger.warning("Dropping report %s of deleted user %s", record["provisional_id"], record["reporter_id"])
+            discard_staged_image(_held_image(record))
+            continue
+        key = (record["reporter_id"], record["idempotency_key"]) if record.get("idempotency_key") else None
+        if key in stored:
+            receipts.append(_retry_receipt(record, stored[key].request_hash, stored[key].response_body.get("id")))
+            discard_staged_image(_held_image(record))
+        elif key in first_by_key:
+            retries.append((record, first_by_key[key]))
+            discard_staged_image(_held_image(record))
+        else:
+            if key:
+                first_by_key[key] = record
+            new.append(record)
+
+    if new:
+        zone_ids = locate_zones(db, [record["latitude"] for record in new], [record["longitude"] for record in new])
+        issues = issue_db.scalars(
+            insert(Issue).returning(Issue, sort_by_parameter_order=True),
+            with_issue_ids(issue_db, [
+                dict(
+                    title=record["title"],
+                    description=record["description"],
+                    category=record["category"],
+                    latitude=record["latitude"],
+                    longitude=record["longitude"],
+                    reporter_id=record["reporter_id"],
+                    zone_id=zone_id,
+                    created_at=datetime.fromisoformat(record["received_at"])
+                )
+                for record, zone_id in zip(new, zone_ids)
+            ])
+        ).all()
+        issue_ids = {}
+        for record, issue in zip(new, issues):
+            held = _held_image(record)
+            if held is not None:
+                # Renamed after the commit (see _link_images)
+                issue.image_url = f"issues/{issue.id}/{held.path.name}"
+                links.append((record, issue.id))
+            issue_ids[record["provisional_id"]] = issue.id
+            receipts.append(dict(
+                provisional_id=record["provisional_id"], reporter_id=record["reporter_id"], issue_id=issue.id, error=None
+            ))
+            if record.get("idempotency_key"):
+                # Later retries with the key replay the created issue
+                body = jsonable_encoder(IssueResponse.model_validate(issue))
+                if body.get("image_url"):
+                    body["image_url"] = get_image_url(body["image_url"], record["base_url"])
+                store_response(
+                    issue_db, record["reporter_id"], record["idempotency_key"], record["fingerprint"],
+                    status.HTTP_201_CREATED, body
+                )
+            if issue_db is not db:
+                store_response(
+                    issue_db, record["reporter_id"], _ingest_key(record), record.get("fingerprint") or "",
+                    status.HTTP_201_CREATED, {"id": issue.id}
+                )
+        record_issues(issue_db, issues)
+        update_triage_queue(issue_db, issues)
+        record_created(issue_db, issues)
+        track_issue_changes(issue_db, issues)
+        for record, first in retries:
+            receipts.append(_retry_receipt(record, first["fingerprint"], issue_ids[first["provisional_id"]]))
+
+    if receipts:
+        db.execute(insert(IngestReceipt), receipts)
+    return links
+
+
+def _retry_receipt(record: dict, request_hash: str, issue_id: Optional[int]) -> dict:
+    """Receipt of a report repeating an earlier one under the same Idempotency-Key"""
+    receipt = dict(provisional_id=record["provisional_id"], reporter_id=record["reporter_id"], issue_id=issue_id, error=None)
+    if record["fingerprint"] != request_hash:
+        receipt.update(issue_id=None, error="Idempotency-Key was already used with different request parameters")
+    return receipt
+
+
+def _record_failure(db: Session, record: dict) -> None:
+    """A report that can't be inserted on its own: keep the outcome, drop the image"""
+    logger.exception("Report %s could not be stored", record["provisional_id"])
+    if db.get(User, record["reporter_id"]) is not None:
+        db.add(IngestReceipt(
+            provisional_id=record["provisional_id"],
+            reporter_id=record["reporter_id"],
+            error="The report could not be stored"
+        ))
+        db.commit()
+    discard_staged_image(_held_image(record))
+
+
+async def submit_report(
+    reporter_id: int,
+    report: dict,
+    staged: Optional[StagedImage],
+    base_url: str,
+    idempotency_key: Optional[str] = None,
+    fingerprint: Optional[str] = None
+) -> str:
+    """
+    Append a validated report to the log (returns once it is durable)
+
+    Returns:
+        Provisional id of the report
+    """
+    provisional_id = new_provisional_id()
+    held = None
+    if staged is not None:
+        held = StagedImage(HELD_IMAGE_DIR / f"{provisional_id}.{staged.file_ext}", staged.file_ext)
+        os.replace(staged.path, held.path)
+    try:
+        await ingest_log.append(dict(
+            report,
+            provisional_id=provisional_id,
+            reporter_id=reporter_id,
+            received_at=datetime.now(timezone.utc).isoformat(),
+            image_ext=held.file_ext if held else None,
+            base_url=base_url,
+            idempotency_key=idempotency_key,
+            fingerprint=fingerprint
+        ))
+    except Exception:
+        discard_staged_image(held)
+        raise
+    return provisional_id
+
+
+def run_ingest_flush() -> int:
+    """Periodic job: insert logged reports with its own session"""
+    db = SessionLocal()
+    try:
+        return ingest_log.flush(db)
+    finally:
+        db.close()
+
+
+def purge_ingest_receipts(db: Session) -> int:
+    """Delete receipts older than INGEST_RECEIPT_TTL_DAYS, returns the number removed"""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=INGEST_RECEIPT_TTL_DAYS)
+    deleted = db.query(IngestReceipt).filter(
+        IngestReceipt.created_at < cutoff
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
@@ -0,0 +1,322 @@
+"""
+Issue event log and SLA metrics
+
+Every change to an issue appends a row to issue_events in the same
+transaction as the change itself. Status transitions also fold their
+durations into issue_sla_metrics, so reporting reads one small table
+instead of replaying the log:
+
+- time_in_status: seconds an issue spent in a status before leaving it
+- time_to_status: seconds from creation until an issue first reached a status
+
+Recompute the metrics from the event log, including the events kept with
+archived issues (e.g. after a bulk import):
+    python -m app.issue_events rebuild
+"""
+from collections import defaultdict
+from datetime import datetime, timezone
+from itertools import chain
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import case, insert, select
+from sqlalchemy.orm import Session
+from app.database import dialect_insert
+from app.models import (
+    Issue,
+    IssueArchive,
+    IssueCategory,
+    IssueEvent,
+    IssueEventType,
+    IssueSlaMetric,
+    IssueStatus
+)
+
+TIME_IN_STATUS = "time_in_status"
+TIME_TO_STATUS = "time_to_status"
+
+# Fields whose changes are recorded in the event log
+TRACKED_FIELDS = ("title", "description", "category", "status", "latitude", "longitude")
+
+# (category, status, metric) -> [samples, total seconds, max seconds]
+MetricKey = Tuple[IssueCategory, IssueStatus, str]
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite returns naive datetimes; everything is stored in UTC
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _json_value(value):
+    return value.value if hasattr(value, "value") else value
+
+
+def issue_snapshot(issue: Issue) -> dict:
+    """Values of the tracked fields, to be passed to record_changes"""
+    return {field: getattr(issue, field) for field in TRACKED_FIELDS}
+
+
+def record_created(db: Session, issues: Iterable[Issue], actor_id: Optional[int] = None) -> None:
+    """Append a created event for each new issue (one bulk insert; actor defaults to the reporter)"""
+    now = _utcnow()
+    rows = [
+        dict(
+            issue_id=issue.id,
+            actor_id=issue.reporter_id if actor_id is None else actor_id,
+            event_type=IssueEventType.CREATED,
+            to_status=issue.status or IssueStatus.PENDING,
+            created_at=now
+        )
+        for issue in issues
+    ]
+    if rows:
+        db.execute(insert(IssueEvent), rows)
+
+
+def _status_entered_at(db: Session, issue: Issue) -> datetime:
+    """When the issue entered its current status"""
+    entered = db.scalar(
+        select(IssueEvent.created_at)
+        .where(IssueEvent.issue_id == issue.id, IssueEvent.to_status.is_not(None))
+        .order_by(IssueEvent.created_at.desc(), IssueEvent.id.desc())
+        .limit(1)
+    )
+    # Issues created before the event log existed
+    return _as_utc(entered or issue.created_at or _utcnow())
+
+
+def _reached_before(db: Session, issue_id: int, status: IssueStatus) -> bool:
+    return db.scalar(
+        select(IssueEvent.id)
+        .where(IssueEvent.issue_id == issue_id, IssueEvent.to_status == status)
+        .limit(1)
+    ) is not None
+
+
+def record_changes(
+    db: Session,
+    issue: Issue,
+    before: dict,
+    actor_id: Optional[int]
+) -> Optional[IssueEvent]:
+    """
+    Append an event for the difference between `before` (issue_snapshot taken
+    before the change) and the issue's current values, and update the SLA
+    metrics on status transitions. Call before committing the change.
+    """
+    after = issue_snapshot(issue)
+    changes = {
+        field: [_json_value(before[field]), _json_value(after[field])]
+        for field in TRACKED_FIELDS if before[field] != after[field]
+    }
+    if not changes:
+        return None
+
+    now = _utcnow()
+    old_status, new_status = before["status"], after["status"]
+    event = IssueEvent(
+        issue_id=issue.id,
+        actor_id=actor_id,
+        event_type=IssueEventType.UPDATED,
+        changes=changes,
+        created_at=now
+    )
+
+    if old_status != new_status:
+        event.event_type = IssueEventType.STATUS_CHANGED
+        event.from_status = old_status
+        event.to_status = new_status
+
+        category = before["category"]
+        samples = [
+            ((category, old_status, TIME_IN_STATUS), (now - _status_entered_at(db, issue)).total_seconds())
+        ]
+        if not _reached_before(db, issue.id, new_status):
+            created_at = _as_utc(issue.created_at or now)
+            samples.append(((category, new_status, TIME_TO_STATUS), (now - created_at).total_seconds()))
+        apply_metric_samples(db, samples)
+
+    db.add(event)
+    return event
+
+
+def apply_metric_samples(db: Session, samples: List[Tuple[MetricKey, float]]) -> None:
+    """Fold duration samples into the SLA metrics (part of the caller's transaction)"""
+    totals: Dict[MetricKey, list] = {}
+    for key, seconds in samples:
+        seconds = max(seconds, 0.0)
+        entry = totals.setdefault(key, [0, 0.0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] = max(entry[2], seconds)
+    rows = [
+        dict(category=category, status=status, metric=metric,
+             samples=count, total_seconds=total, max_seconds=longest)
+        for (category, status, metric), (count, total, longest) in totals.items()
+    ]
+    if not rows:
+        return
+
+    table = IssueSlaMetric.__table__
+    upsert = dialect_insert(db)
+    if upsert is not None:
+        stmt = upsert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["category", "status", "metric"],
+            set_={
+                "samples": table.c.samples + stmt.excluded.samples,
+                "total_seconds": table.c.total_seconds + stmt.excluded.total_seconds,
+                "max_seconds": case(
+                    (stmt.excluded.max_seconds > table.c.max_seconds, stmt.excluded.max_seconds),
+                    else_=table.c.max_seconds
+                )
+            }
+        )
+        db.execute(stmt, rows)
+        return
+
+    # Generic fallback: read-modify-write per metric
+    for row in rows:
+        metric = db.query(IssueSlaMetric).filter(
+            IssueSlaMetric.category == row["category"],
+            IssueSlaMetric.status == row["status"],
+            IssueSlaMetric.metric == row["metric"]
+        ).with_for_update().first()
+        if metric:
+            metric.samples += row["samples"]
+            metric.total_seconds += row["total_seconds"]
+            metric.max_seconds = max(metric.max_seconds, row["max_seconds"])
+        else:
+            db.add(IssueSlaMetric(**row))
+
+
+def timeline(db: Session, issue: Issue, events: Optional[List[IssueEvent]] = None) -> dict:
+    """
+    Events of an issue (oldest first) and the time spent in each status
+
+    events: the issue's events if already loaded (archived issues)
+    """
+    if events is None:
+        events = db.scalars(
+            select(IssueEvent)
+            .where(IssueEvent.issue_id == issue.id)
+            .order_by(IssueEvent.created_at, IssueEvent.id)
+        ).all()
+
+    time_in_status: Dict[str, float] = defaultdict(float)
+    status, entered = None, None
+    for event in events:
+        if event.to_status is None:
+            continue
+        at = _as_utc(event.created_at)
+        if status is not None:
+            time_in_status[status.value] += (at - entered).total_seconds()
+        status, entered = event.to_status, at
+    if status is None:
+        status, entered = issue.status, _as_utc(issue.created_at or _utcnow())
+    # The current status is still running
+    time_in_status[status.value] += max((_utcnow() - entered).total_seconds(), 0.0)
+
+    return {
+        "issue_id": issue.id,
+        "status": issue.status,
+        "events": events,
+        "time_in_status": dict(time_in_status)
+    }
+
+
+def sla_metrics(db: Session, category: Optional[IssueCategory] = None) -> List[IssueSlaMetric]:
+    """Metric rows ordered by category, metric and status"""
+    query = select(IssueSlaMetric).order_by(
+        IssueSlaMetric.category, IssueSlaMetric.metric, IssueSlaMetric.status
+    )
+    if category:
+        query = query.where(IssueSlaMetric.category == category)
+    return list(db.scalars(query))
+
+
+def sla_report(db: Session, category: Optional[IssueCategory] = None) -> List[dict]:
+    """Average / max durations per category, status and metric"""
+    return sla_summary(sla_metrics(db, category))
+
+
+def sla_summary(metrics: Iterable[IssueSlaMetric]) -> List[dict]:
+    return [
+        {
+            "category": metric.category,
+            "status": metric.status,
+            "metric": metric.metric,
+            "samples": metric.samples,
+            "average_seconds": metric.total_seconds / metric.samples if metric.samples else 0.0,
+            "max_seconds": metric.max_seconds
+        }
+        for metric in metrics
+    ]
+
+
+def _archived_transitions(db: Session, chunk_size: int):
+    """(issue id, to_status, at, category, issue created_at) of archived issues, in issue order"""
+    query = (
+        select(IssueArchive.id, IssueArchive.category, IssueArchive.created_at, IssueArchive.events)
+        .order_by(IssueArchive.id)
+    )
+    for issue_id, category, issue_created, events in db.execute(
+        query.execution_options(stream_results=True, yield_per=chunk_size)
+    ):
+        # Stored in the order of the log (created_at, id)
+        for row in events:
+            if row["to_status"]:
+                yield issue_id, IssueStatus(row["to_status"]), datetime.fromisoformat(row["created_at"]), category, issue_created
+
+
+def rebuild_sla_metrics(db: Session, chunk_size: int = 50000) -> int:
+    """
+    Recompute the SLA metrics by replaying the event log (streamed in issue
+    order), then the events stored with archived issues, and replace the
+    current ones in one transaction
+
+    Returns:
+        Number of metric rows written
+    """
+    query = (
+        select(IssueEvent.issue_id, IssueEvent.to_status, IssueEvent.created_at, Issue.category, Issue.created_at)
+        .join(Issue, Issue.id == IssueEvent.issue_id)
+        .where(IssueEvent.to_status.is_not(None))
+        .order_by(IssueEvent.issue_id, IssueEvent.created_at, IssueEvent.id)
+    )
+    samples = []
+    current_issue, status, entered, reached = None, None, None, set()
+    result = db.execute(query.execution_options(stream_results=True, yield_per=chunk_size))
+    # An issue is either in issues or in issues_archive, never both
+    for issue_id, to_status, at, category, issue_created in chain(result, _archived_transitions(db, chunk_size)):
+        at = _as_utc(at)
+        if issue_id != current_issue:
+            current_issue, status, reached = issue_id, None, set()
+            created = _as_utc(issue_created or at)
+        if status is not None:
+            samples.append(((category, status, TIME_IN_STATUS), (at - entered).total_seconds()))
+            if to_status not in reached:
+                samples.append(((category, to_status, TIME_TO_STATUS), (at - created).total_seconds()))
+        reached.add(to_status)
+        status, entered = to_status, at
+
+    db.query(IssueSlaMetric).delete(synchronize_session=False)
+    apply_metric_samples(db, samples)
+    db.commit()
+    return db.query(IssueSlaMetric).count()
+
+
+if __name__ == "__main__":
+    import sys
+    from app.database import Base, init_engine
+    from app.sharding import for_each_shard
+
+    if sys.argv[1:] != ["rebuild"]:
+        print("Usage: python -m app.issue_events rebuild")
+        sys.exit(1)
+    Base.metadata.create_all(bind=init_engine())
+    print(f"Rebuilt {sum(for_each_shard(rebuild_sla_metrics))} SLA metrics")
@@ -0,0 +1,266 @@
+"""
+Access token keys, rotation and verification cache
+
+Algorithms (ALGORITHM):
+- HS256/384/512 (default): SECRET_KEY signs; PREVIOUS_SECRET_KEYS (comma
+  separated) still verify tokens issued before a rotation.
+- RS256 or EdDSA (Ed25519): every PEM private key in JWT_KEYS_DIR is a key,
+  its kid is the file name without ".pem". JWT_ACTIVE_KID signs (default:
+  the newest file), the others only verify. Public keys are published as a
+  JWKS at /.well-known/jwks.json so other services can verify tokens
+  without the secret and without calling the API.
+
+Rotation: add a key (python -m app.jwt_keys generate), point JWT_ACTIVE_KID
+at it, remove the old key once the longest-lived token signed with it has
+expired.
+
+Verified tokens are cached (keyed by SHA-256 of the token, bounded LRU,
+never past the token's exp) so repeated requests skip signature checks.
+"""
+import glob
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey, Ed25519PublicKey
+from jose import JWTError, jwk, jwt
+from jose.backends.base import Key
+from jose.exceptions import JWKError
+from jose.utils import base64url_decode, base64url_encode
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ALGORITHM = os.getenv("ALGORITHM", "HS256")
+SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this-in-production")
+PREVIOUS_SECRET_KEYS = [key for key in os.getenv("PREVIOUS_SECRET_KEYS", "").split(",") if key]
+JWT_KEYS_DIR = os.getenv("JWT_KEYS_DIR", "./keys")
+JWT_ACTIVE_KID = os.getenv("JWT_ACTIVE_KID", "")
+
+# Verified token cache (per worker process)
+JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "10000"))
+# Upper bound on how long a cached verification is trusted (e.g. after a key
+# was removed), independent of the token's own exp
+JWT_CACHE_TTL_SECONDS = int(os.getenv("JWT_CACHE_TTL_SECONDS", "300"))
+
+HMAC_ALGORITHMS = ("HS256", "HS384", "HS512")
+ASYMMETRIC_ALGORITHMS = ("RS256", "EdDSA")
+
+
+class Ed25519Key(Key):
+    """EdDSA (Ed25519) support for python-jose, which has none built in"""
+
+    def __init__(self, key, algorithm):
+        if algorithm != "EdDSA":
+            raise JWKError(f"Algorithm {algorithm} is not supported by Ed25519Key")
+        self._algorithm = algorithm
+        if isinstance(key, (Ed25519PrivateKey, Ed25519PublicKey)):
+            self._key = key
+        elif isinstance(key, dict):
+            if key.get("kty") != "OKP" or key.get("crv") != "Ed25519":
+                raise JWKError("Not an Ed25519 JWK")
+            if "d" in key:
+                self._key = Ed25519PrivateKey.from_private_bytes(base64url_decode(key["d"].encode()))
+            else:
+                self._key = Ed25519PublicKey.from_public_bytes(base64url_decode(key["x"].encode()))
+        else:
+            data = key.encode() if isinstance(key, str) else key
+            try:
+                self._key = serialization.load_pem_private_key(data, password=None)
+            except ValueError:
+                self._key = serialization.load_pem_public_key(data)
+            if not isinstance(self._key, (Ed25519PrivateKey, Ed25519PublicKey)):
+                raise JWKError("Not an Ed25519 key")
+
+    def sign(self, msg):
+        return self._key.sign(msg)
+
+    def verify(self, msg, sig):
+        try:
+            self.public_key()._key.verify(sig, msg)
+            return True
+        except InvalidSignature:
+            return False
+
+    def public_key(self):
+        if isinstance(self._key, Ed25519PublicKey):
+            return self
+        return Ed25519Key(self._key.public_key(), self._algorithm)
+
+    def to_pem(self):
+        return self.public_key()._key.public_bytes(
+            serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+        )
+
+    def to_dict(self):
+        raw = self.public_key()._key.public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+        return {"alg": self._algorithm, "kty": "OKP", "crv": "Ed25519", "x": base64url_encode(raw).decode()}
+
+
+jwk.register_key("EdDSA", Ed25519Key)
+
+
+class KeySet:
+    """The signing key and all keys accepted for verification"""
+
+    def __init__(self, algorithm: str, signing_kid: str, keys: Dict[str, object]):
+        self.algorithm = algorithm
+        self.signing_kid = signing_kid
+        self.keys = keys  # kid -> secret (HMAC) or jose Key (asymmetric)
+        if algorithm in HMAC_ALGORITHMS:
+            self._verifiers = dict(keys)
+        else:
+            self._verifiers = {kid: key.public_key() for kid, key in keys.items()}
+
+    @property
+    def signing_key(self):
+        return self.keys[self.signing_kid]
+
+    def verification_keys(self, kid: Optional[str]) -> List[object]:
+        if kid is not None:
+            return [self._verifiers[kid]] if kid in self._verifiers else []
+        # Tokens issued before kids were added: try every key
+        return list(self._verifiers.values())
+
+    def jwks(self) -> dict:
+        """Public keys as a JSON Web Key Set (empty for HMAC)"""
+        if self.algorithm in HMAC_ALGORITHMS:
+            return {"keys": []}
+        keys = []
+        for kid, key in self._verifiers.items():
+            public = key.to_dict()
+            public.update({"kid": kid, "use": "sig", "alg": self.algorithm})
+            keys.append(public)
+        return {"keys": keys}
+
+
+def _hmac_kid(secret: str) -> str:
+    return "hs-" + hashlib.sha256(secret.encode()).hexdigest()[:12]
+
+
+@lru_cache(maxsize=1)
+def get_key_set() -> KeySet:
+    """Load the configured keys (once per process)"""
+    if ALGORITHM in HMAC_ALGORITHMS:
+        keys = {_hmac_kid(secret): secret for secret in [SECRET_KEY] + PREVIOUS_SECRET_KEYS}
+        return KeySet(ALGORITHM, _hmac_kid(SECRET_KEY), keys)
+
+    if ALGORITHM not in ASYMMETRIC_ALGORITHMS:
+        raise RuntimeError(f"Unsupported ALGORITHM {ALGORITHM}")
+    paths = sorted(glob.glob(os.path.join(JWT_KEYS_DIR, "*.pem")), key=os.path.getmtime)
+    if not paths:
+        raise RuntimeError(f"ALGORITHM={ALGORITHM} needs PEM private keys in JWT_KEYS_DIR ({JWT_KEYS_DIR})")
+    keys = {}
+    for path in paths:
+        with open(path, "rb") as f:
+            keys[os.path.basename(path)[:-len(".pem")]] = jwk.construct(f.read(), ALGORITHM)
+    signing_kid = JWT_ACTIVE_KID or list(keys)[-1]
+    if signing_kid not in keys:
+        raise RuntimeError(f"JWT_ACTIVE_KID {signing_kid} not found in {JWT_KEYS_DIR}")
+    return KeySet(ALGORITHM, signing_kid, keys)
+
+
+def sign_claims(claims: dict) -> str:
+    """Encode and sign claims with the active key"""
+    key_set = get_key_set()
+    return jwt.encode(claims, key_set.signing_key, algorithm=key_set.algorithm, headers={"kid": key_set.signing_kid})
+
+
+class TokenCache:
+    """Bounded LRU of token hash -> (claims, expires at)"""
+
+    def __init__(self, max_size: int = JWT_CACHE_SIZE, ttl: int = JWT_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[bytes, Tuple[dict, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token_hash: bytes) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(token_hash)
+            if entry is None:
+                return None
+            claims, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[token_hash]
+                return None
+            self._entries.move_to_end(token_hash)
+            return claims
+
+    def put(self, token_hash: bytes, claims: dict) -> None:
+        expires_at = time.time() + self.ttl
+        if isinstance(claims.get("exp"), (int, float)):
+            expires_at = min(expires_at, claims["exp"])
+        with self._lock:
+            self._entries[token_hash] = (claims, expires_at)
+            self._entries.move_to_end(token_hash)
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache()
+
+
+def verify_token(token: str) -> Optional[dict]:
+    """Claims of a valid token (signature, kid and exp checked), else None"""
+    if not token:
+        return None
+    token_hash = hashlib.sha256(token.encode()).digest()
+    claims = token_cache.get(token_hash)
+    if claims is not None:
+        return claims
+
+    key_set = get_key_set()
+    try:
+        kid = jwt.get_unverified_header(token).get("kid")
+    except JWTError:
+        return None
+    for key in key_set.verification_keys(kid):
+        try:
+            # Only the configured algorithm: never let the token pick it
+            claims = jwt.decode(token, key, algorithms=[key_set.algorithm])
+        except JWTError:
+            continue
+        if JWT_CACHE_SIZE > 0:
+            token_cache.put(token_hash, claims)
+        return claims
+    return None
+
+
+def generate_key(algorithm: str, keys_dir: str) -> str:
+    """Write a new private key to keys_dir and return its kid"""
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    if algorithm == "RS256":
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    elif algorithm == "EdDSA":
+        private_key = Ed25519PrivateKey.generate()
+    else:
+        raise ValueError(f"Cannot generate keys for {algorithm}")
+    pem = private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    kid = time.strftime("%Y%m%d") + "-" + hashlib.sha256(pem).hexdigest()[:8]
+    os.makedirs(keys_dir, exist_ok=True)
+    path = os.path.join(keys_dir, f"{kid}.pem")
+    with open(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), "wb") as f:
+        f.write(pem)
+    return kid
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 3 or sys.argv[1] != "generate" or sys.argv[2] not in ASYMMETRIC_ALGORITHMS:
+        print("Usage: python -m app.jwt_keys generate RS256|EdDSA")
+        sys.exit(1)
+    print(f"Created {JWT_KEYS_DIR}/{generate_key(sys.argv[2], JWT_KEYS_DIR)}.pem")
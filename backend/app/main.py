@@ -1,16 +1,64 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from app.database import engine, Base
+from fastapi.responses import ORJSONResponse
+from app.database import (
+    DB_UNAVAILABLE_ERRORS,
+    Base,
+    DatabaseUnavailable,
+    SessionLocal,
+    db_breaker,
+    dispose_engine,
+    init_engine,
+    upgrade_schema
+)
+from app.rate_limit import AdmissionControlMiddleware
+from app.compression import CompressionMiddleware
+from app.coalescing import CoalescingMiddleware, coalescing_stats
+from app.jwt_keys import get_key_set
+from app.background import start_periodic, stop_all
+from app.file_utils import cleanup_staged_images
+from app.uploads import UPLOAD_SESSION_SWEEP_INTERVAL_SECONDS, cleanup_expired_uploads
+from app.notification_service import (
+    backfill_unread_counters,
+    run_notification_retention,
+    run_unread_count_reconciliation
+)
+from app.revocation import SESSION_PURGE_INTERVAL_SECONDS, purge_expired_sessions
+from app.triage import TRIAGE_REFRESH_INTERVAL_SECONDS, run_triage_refresh
+from app.snapshots import SNAPSHOT_INTERVAL_SECONDS, run_snapshot_writer, snapshot_store
+from app.archive import ISSUE_ARCHIVE_INTERVAL_SECONDS, run_issue_archival
+from app.sharding import SHARDING_ENABLED, dispose_shard_engines, for_each_shard, init_shard_schemas, shard_count
+from starlette.concurrency import run_in_threadpool
+from pathlib import Path
+import os
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+STAGING_SWEEP_INTERVAL_SECONDS = int(os.getenv("STAGING_SWEEP_INTERVAL_SECONDS", "600"))
+# 0 disables the job in this process (e.g. when run from cron instead)
+NOTIFICATION_COMPACTION_INTERVAL_SECONDS = int(os.getenv("NOTIFICATION_COMPACTION_INTERVAL_SECONDS", "3600"))
+UNREAD_RECONCILE_INTERVAL_SECONDS = int(os.getenv("UNREAD_RECONCILE_INTERVAL_SECONDS", "21600"))
+# Same settings as app.ingest, which is only imported if the buffer is used
+INGEST_MODE = os.getenv("INGEST_MODE", "direct")
+INGEST_DIR = Path(os.getenv("INGEST_DIR", "./ingest"))
 
 app = FastAPI(
     title="Community Crisis Reporting & Response Platform API",
     description="Backend API for reporting and managing community issues",
-    version="1.0.0"
+    version="1.0.0",
+    # orjson encodes responses several times faster than the stdlib json
+    default_response_class=ORJSONResponse
 )
 
+# Shed load with 503 + Retry-After before latency explodes
+# (added first so CORS headers are still applied to rejected requests)
+app.add_middleware(AdmissionControlMiddleware)
+
+# gzip / brotli / zstd depending on Accept-Encoding (images excluded)
+app.add_middleware(CompressionMiddleware)
+
+# Identical concurrent public reads share one query + serialization
+# (outside admission control: followers don't take a slot)
+app.add_middleware(CoalescingMiddleware)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -20,6 +68,119 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+async def database_unavailable(request: Request, exc: Exception):
+    """Database down or circuit breaker open: read-only mode until it recovers"""
+    return ORJSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Database temporarily unavailable: the service is read-only. Please try again later."},
+        headers={"Retry-After": str(max(1, round(db_breaker.retry_after() or db_breaker.reset_seconds)))}
+    )
+
+# Raised by get_db while the circuit breaker is open, or by the query itself
+for exc_class in (DatabaseUnavailable, *DB_UNAVAILABLE_ERRORS):
+    app.add_exception_handler(exc_class, database_unavailable)
+
+
+@app.on_event("startup")
+async def startup():
+    """Per-process initialisation (runs in every worker after fork)"""
+    # Make sure all models are registered before creating tables
+    from app import models  # noqa: F401
+    engine = init_engine()
+    # Create database tables, and the indexes added to existing ones
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+    # Fail fast on a broken token key configuration
+    get_key_set()
+    if SHARDING_ENABLED:
+        # ... and the tables and issue id ranges of the other shards
+        init_shard_schemas()
+
+    # Drop replay records older than IDEMPOTENCY_KEY_TTL_HOURS
+    from app.idempotency import purge_expired_keys
+    from app.sync import backfill_issue_changes
+    db = SessionLocal()
+    try:
+        for_each_shard(purge_expired_keys, primary=db)
+        # Issues created before change tracking existed
+        for_each_shard(backfill_issue_changes, primary=db)
+        # ... and unread counters of users that predate them
+        backfill_unread_counters(db)
+    finally:
+        db.close()
+
+    # Insert reports acknowledged from the ingest buffer, including any a
+    # crashed or stopped worker left behind (also in direct mode)
+    if INGEST_MODE == "buffered" or INGEST_DIR.exists():
+        from app.ingest import INGEST_FLUSH_INTERVAL_SECONDS, ingest_log, purge_ingest_receipts, run_ingest_flush
+        db = SessionLocal()
+        try:
+            purge_ingest_receipts(db)
+        finally:
+            db.close()
+        if INGEST_MODE == "buffered":
+            ingest_log.open()
+        if ingest_log.is_open or ingest_log.has_backlog():
+            start_periodic("ingest-flush", INGEST_FLUSH_INTERVAL_SECONDS, run_ingest_flush, initial_delay=0)
+
+    # Precompute the public views served while the database is unavailable
+    start_periodic("snapshot-writer", SNAPSHOT_INTERVAL_SECONDS, run_snapshot_writer, initial_delay=0)
+
+    # Remove staged uploads orphaned by aborted or crashed requests
+    start_periodic("staged-image-cleanup", STAGING_SWEEP_INTERVAL_SECONDS, cleanup_staged_images)
+    # ... and resumable uploads abandoned by their clients
+    start_periodic("upload-session-cleanup", UPLOAD_SESSION_SWEEP_INTERVAL_SECONDS, cleanup_expired_uploads)
+
+    # Move old read notifications out of the hot table
+    start_periodic(
+        "notification-retention",
+        NOTIFICATION_COMPACTION_INTERVAL_SECONDS,
+        run_notification_retention,
+        exclusive=True
+    )
+    # ... and long-closed issues
+    start_periodic("issue-archival", ISSUE_ARCHIVE_INTERVAL_SECONDS, run_issue_archival, exclusive=True)
+
+    # Queue pending issues that predate the triage queue, then keep
+    # priorities current as density windows slide
+    start_periodic(
+        "triage-refresh",
+        TRIAGE_REFRESH_INTERVAL_SECONDS,
+        run_triage_refresh,
+        initial_delay=0,
+        exclusive=True
+    )
+
+    # Drop expired refresh tokens and revocations
+    start_periodic("session-purge", SESSION_PURGE_INTERVAL_SECONDS, purge_expired_sessions, exclusive=True)
+
+    # Repair unread counter drift (first run shortly after startup)
+    start_periodic(
+        "unread-count-reconciliation",
+        UNREAD_RECONCILE_INTERVAL_SECONDS,
+        run_unread_count_reconciliation,
+        initial_delay=60,
+        exclusive=True
+    )
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await stop_all()
+    if INGEST_MODE == "buffered":
+        from app.ingest import ingest_log, run_ingest_flush
+        if ingest_log.is_open:
+            try:
+                # Leave nothing behind for the next worker if the database is up
+                await run_in_threadpool(run_ingest_flush)
+            except Exception:
+                pass  # the segments stay on disk and are adopted later
+            ingest_log.close()
+    dispose_shard_engines()
+    dispose_engine()
+
+
 @app.get("/")
 async def root():
     return {
@@ -32,12 +193,36 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/health/coalescing")
+async def coalescing_health():
+    """Request coalescing counters of this worker process"""
+    return coalescing_stats.snapshot()
+
+@app.get("/health/database")
+async def database_health():
+    """Circuit breaker state of this worker process and snapshot age"""
+    return {
+        "breaker": db_breaker.state,
+        "consecutive_failures": db_breaker.failures,
+        "trips": db_breaker.trips,
+        "snapshot": snapshot_store.info(),
+        "shards": shard_count()
+    }
+
+@app.get("/.well-known/jwks.json")
+async def jwks():
+    """Public keys for verifying access tokens offline (empty for HS256)"""
+    return ORJSONResponse(get_key_set().jwks(), headers={"Cache-Control": "public, max-age=300"})
+
 # Import routers
-from app.routers import auth, issues, images, notifications
+from app.routers import auth, issues, images, notifications, subscriptions, uploads, zones
 app.include_router(auth.router, prefix="/api/auth", tags=["authentication"])
 app.include_router(issues.router, prefix="/api/issues", tags=["issues"])
 app.include_router(images.router, prefix="/api/images", tags=["images"])
+app.include_router(uploads.router, prefix="/api/uploads", tags=["uploads"])
 app.include_router(notifications.router, prefix="/api/notifications", tags=["notifications"])
+app.include_router(subscriptions.router, prefix="/api/subscriptions", tags=["subscriptions"])
+app.include_router(zones.router, prefix="/api/zones", tags=["zones"])
 
 # Will be created in next steps
 # from app.routers import users
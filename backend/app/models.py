@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, Integer, String, Text, Float, DateTime, ForeignKey, Enum
+from sqlalchemy import BigInteger, Boolean, Column, Integer, String, Text, Float, Date, DateTime, ForeignKey, Enum, JSON, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -15,12 +15,22 @@ class IssueCategory(str, enum.Enum):
     HEALTH = "health"
     OTHER = "other"
 
+class SubscriptionKind(str, enum.Enum):
+    ISSUE = "issue"
+    CATEGORY = "category"
+    AREA = "area"
+
 class IssueStatus(str, enum.Enum):
     PENDING = "pending"
     IN_PROGRESS = "in_progress"
     RESOLVED = "resolved"
     CLOSED = "closed"
 
+class IssueEventType(str, enum.Enum):
+    CREATED = "created"
+    UPDATED = "updated"
+    STATUS_CHANGED = "status_changed"
+
 class User(Base):
     __tablename__ = "users"
 
@@ -39,6 +49,8 @@ class User(Base):
 
 class Issue(Base):
     __tablename__ = "issues"
+    # Zone listings: newest first within a zone
+    __table_args__ = (Index("ix_issues_zone_created", "zone_id", "created_at"),)
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(200), nullable=False)
@@ -51,6 +63,8 @@ class Issue(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     reporter_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    # Administrative zone containing the location (app/zones.py)
+    zone_id = Column(Integer, ForeignKey("zones.id", ondelete="SET NULL"), nullable=True)
 
     # Relationship to user
     reporter = relationship("User", back_populates="issues")
@@ -58,8 +72,48 @@ class Issue(Base):
     notifications = relationship("Notification", back_populates="issue", cascade="all, delete-orphan")
 
 
+class IssueArchive(Base):
+    """Cold storage for long-closed issues (moved by the archival job, app/archive.py)"""
+    __tablename__ = "issues_archive"
+
+    id = Column(Integer, primary_key=True)  # same id as in issues
+    title = Column(String(200), nullable=False)
+    description = Column(Text, nullable=False)
+    category = Column(Enum(IssueCategory), nullable=False)
+    status = Column(Enum(IssueStatus), nullable=False)
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
+    image_url = Column(String(500), nullable=True)  # under ISSUE_ARCHIVE_IMAGE_PREFIX
+    created_at = Column(DateTime(timezone=True), index=True)
+    updated_at = Column(DateTime(timezone=True))
+    reporter_id = Column(Integer, nullable=False)
+    zone_id = Column(Integer, nullable=True)
+    events = Column(JSON, nullable=False)  # the issue's issue_events rows
+    archived_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+
+class Zone(Base):
+    """Administrative zone (district) polygon imported from GeoJSON"""
+    __tablename__ = "zones"
+
+    id = Column(Integer, primary_key=True)
+    code = Column(String(100), unique=True, nullable=False)  # id in the source data
+    name = Column(String(200), nullable=False)
+    geometry = Column(JSON, nullable=False)  # GeoJSON Polygon or MultiPolygon
+    min_lon = Column(Float, nullable=False)
+    min_lat = Column(Float, nullable=False)
+    max_lon = Column(Float, nullable=False)
+    max_lat = Column(Float, nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=False)
+
+
 class Notification(Base):
     __tablename__ = "notifications"
+    __table_args__ = (
+        # Serves per-user listing, unread filtering and retention scans
+        Index("ix_notifications_user_read_created", "user_id", "is_read", "created_at"),
+        Index("ix_notifications_read_created", "is_read", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
@@ -73,3 +127,241 @@ class Notification(Base):
     user = relationship("User", back_populates="notifications")
     issue = relationship("Issue", back_populates="notifications")
 
+
+class NotificationCounter(Base):
+    """Per-user unread notification count, kept in sync on every write"""
+    __tablename__ = "notification_counters"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    unread_count = Column(Integer, default=0, nullable=False)
+
+
+class NotificationArchive(Base):
+    """Cold storage for old read notifications (moved by the compaction job)"""
+    __tablename__ = "notifications_archive"
+
+    id = Column(Integer, primary_key=True)  # same id as in notifications
+    user_id = Column(Integer, nullable=False, index=True)
+    issue_id = Column(Integer, nullable=True)
+    title = Column(String(200), nullable=False)
+    message = Column(Text, nullable=False)
+    is_read = Column(Boolean, default=True, nullable=False)
+    created_at = Column(DateTime(timezone=True))
+    archived_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+
+
+class IdempotencyKey(Base):
+    """Stored response for a client-supplied Idempotency-Key (replayed on retry)"""
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (UniqueConstraint("user_id", "key", name="uq_idempotency_user_key"),)
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    key = Column(String(255), nullable=False)
+    request_hash = Column(String(64), nullable=False)
+    status_code = Column(Integer, nullable=False)
+    response_body = Column(JSON, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+
+class RefreshToken(Base):
+    """Opaque refresh token (SHA-256 hash only); rotated on every use"""
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    # Login session: all tokens of one rotation chain share it (access tokens carry it as "sid")
+    session_id = Column(String(32), nullable=False, index=True)
+    token_hash = Column(String(64), nullable=False, unique=True)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    # Set when exchanged for a new token; presenting it again means it leaked
+    used_at = Column(DateTime(timezone=True))
+    revoked = Column(Boolean, nullable=False, default=False)
+
+
+class RevokedSession(Base):
+    """Session whose access tokens are rejected until they have all expired"""
+    __tablename__ = "revoked_sessions"
+
+    session_id = Column(String(32), primary_key=True)
+    revoked_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    # Expiry of the last access token issued for the session
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
+class IssueRollup(Base):
+    """Issue counts per geohash cell, day and category (maintained on write)"""
+    __tablename__ = "issue_rollups"
+    __table_args__ = (UniqueConstraint("geohash", "day", "category", name="uq_issue_rollup_cell"),)
+
+    id = Column(Integer, primary_key=True)
+    geohash = Column(String(12), nullable=False)
+    day = Column(Date, nullable=False, index=True)
+    category = Column(Enum(IssueCategory), nullable=False)
+    count = Column(Integer, default=0, nullable=False)
+
+
+class TriageQueueEntry(Base):
+    """Pending issue waiting for an admin, with its precomputed priority"""
+    __tablename__ = "triage_queue"
+
+    issue_id = Column(Integer, ForeignKey("issues.id", ondelete="CASCADE"), primary_key=True)
+    category = Column(Enum(IssueCategory), nullable=False)
+    geohash = Column(String(12), nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    # Orders like the current priority at any time (see app/triage.py)
+    priority_key = Column(Float, nullable=False, index=True)
+    claimed_by = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class TriageCell(Base):
+    """Density level of a geohash cell that its triage_queue keys use"""
+    __tablename__ = "triage_cells"
+
+    geohash = Column(String(12), primary_key=True)
+    density_level = Column(Integer, nullable=False)
+
+
+class IngestReceipt(Base):
+    """Outcome of a report acknowledged by the ingest buffer (app/ingest.py)"""
+    __tablename__ = "ingest_receipts"
+
+    provisional_id = Column(String(32), primary_key=True)
+    reporter_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    # Set when the report became an issue (or was a retry of an existing one)
+    issue_id = Column(Integer, ForeignKey("issues.id", ondelete="SET NULL"), nullable=True)
+    error = Column(String(500), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+
+class IssueEvent(Base):
+    """Append-only log of issue changes (written in the same transaction)"""
+    __tablename__ = "issue_events"
+    __table_args__ = (
+        # Serves timelines and "when did the issue enter its status" lookups
+        Index("ix_issue_events_issue_created", "issue_id", "created_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    issue_id = Column(Integer, ForeignKey("issues.id", ondelete="CASCADE"), nullable=False)
+    actor_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    event_type = Column(Enum(IssueEventType), nullable=False)
+    from_status = Column(Enum(IssueStatus), nullable=True)
+    to_status = Column(Enum(IssueStatus), nullable=True)
+    changes = Column(JSON, nullable=True)  # {field: [old, new]}
+    created_at = Column(DateTime(timezone=True), nullable=False)
+
+
+class IssueSlaMetric(Base):
+    """Aggregated status durations per category (maintained on every transition)"""
+    __tablename__ = "issue_sla_metrics"
+    __table_args__ = (UniqueConstraint("category", "status", "metric", name="uq_issue_sla_metric"),)
+
+    id = Column(Integer, primary_key=True)
+    category = Column(Enum(IssueCategory), nullable=False)
+    status = Column(Enum(IssueStatus), nullable=False)
+    metric = Column(String(20), nullable=False)  # time_in_status or time_to_status
+    samples = Column(Integer, default=0, nullable=False)
+    total_seconds = Column(Float, default=0, nullable=False)
+    max_seconds = Column(Float, default=0, nullable=False)
+
+class IssueChange(Base):
+    """
+    Latest change of every issue (tombstone when deleted), ordered by seq
+
+    An issue's row is replaced on each change, so the table stays one row per
+    issue and GET /api/issues/changes returns each changed issue once.
+    """
+    __tablename__ = "issue_changes"
+    # Never reuse sequence numbers of replaced rows (SQLite)
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    seq = Column(Integer, primary_key=True, autoincrement=True)
+    issue_id = Column(Integer, nullable=False, unique=True)  # no FK: outlives the issue
+    deleted = Column(Boolean, default=False, nullable=False)
+    changed_at = Column(DateTime(timezone=True), nullable=False)
+
+
+class PendingIssueChange(Base):
+    """
+    Change not yet numbered in issue_changes (PostgreSQL only)
+
+    Writers stage changes with their transaction id instead of serializing
+    on one lock; app.sync.publish_issue_changes() moves them to
+    issue_changes once every older transaction has finished.
+    """
+    __tablename__ = "issue_changes_pending"
+    __table_args__ = (
+        Index("ix_issue_changes_pending_xid", "xid", "id"),
+    )
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    issue_id = Column(Integer, nullable=False)
+    deleted = Column(Boolean, default=False, nullable=False)
+    changed_at = Column(DateTime(timezone=True), nullable=False)
+    xid = Column(BigInteger, nullable=False)  # txid_current() of the writer
+
+
+class IssueListStamp(Base):
+    """Last modification time of the issues in each (category, status) slice"""
+    __tablename__ = "issue_list_stamps"
+
+    category = Column(Enum(IssueCategory), primary_key=True)
+    status = Column(Enum(IssueStatus), primary_key=True)
+    modified_at = Column(DateTime(timezone=True), nullable=False)
+
+class Subscription(Base):
+    """A user following an issue, a category or a circular area"""
+    __tablename__ = "subscriptions"
+    __table_args__ = (
+        Index("ix_subscriptions_issue", "issue_id"),
+        Index("ix_subscriptions_category", "category"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    kind = Column(Enum(SubscriptionKind), nullable=False)
+    issue_id = Column(Integer, ForeignKey("issues.id", ondelete="CASCADE"), nullable=True)
+    category = Column(Enum(IssueCategory), nullable=True)
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
+    radius_m = Column(Float, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    cells = relationship("SubscriptionCell", cascade="all, delete-orphan")
+
+
+class SubscriptionCell(Base):
+    """Spatial index for area subscriptions: geohash cells covering each area"""
+    __tablename__ = "subscription_cells"
+
+    cell = Column(String(12), primary_key=True)
+    subscription_id = Column(Integer, ForeignKey("subscriptions.id", ondelete="CASCADE"), primary_key=True)
+
+
+class ShardRegion(Base):
+    """Region pinned to a shard by the rebalancing tools (primary database only)"""
+    __tablename__ = "shard_regions"
+
+    region = Column(String(50), primary_key=True)  # geohash prefix or "zone:<id>"
+    shard = Column(Integer, nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=False)
+
+
+class IssueIdCounter(Base):
+    """Last issue id allocated on this shard's database (app/sharding.py)"""
+    __tablename__ = "issue_id_counters"
+
+    shard = Column(Integer, primary_key=True)
+    last_id = Column(Integer, nullable=False)
+
+
+class ShardRelocation(Base):
+    """Issue moved away from the shard its id was allocated on (primary database only)"""
+    __tablename__ = "shard_relocations"
+
+    issue_id = Column(Integer, primary_key=True)  # no FK: the issue lives on another database
+    shard = Column(Integer, nullable=False)
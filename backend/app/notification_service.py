@@ -1,9 +1,43 @@
 """
 Service for creating notifications
 """
-from typing import Optional
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+from sqlalchemy import bindparam, delete, exists, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from app.models import Notification, Issue, IssueStatus
+from dotenv import load_dotenv
+from app.database import dialect_insert
+from app.models import (
+    Notification,
+    NotificationArchive,
+    NotificationCounter,
+    Issue,
+    IssueStatus,
+    User
+)
+
+load_dotenv()
+
+# Retention policy for read notifications
+# "archive" moves them to notifications_archive, "delete" drops them
+NOTIFICATION_RETENTION_MODE = os.getenv("NOTIFICATION_RETENTION_MODE", "archive")
+NOTIFICATION_RETENTION_DAYS = int(os.getenv("NOTIFICATION_RETENTION_DAYS", "30"))
+# Archived rows older than this are deleted (0 keeps them forever)
+NOTIFICATION_ARCHIVE_RETENTION_DAYS = int(os.getenv("NOTIFICATION_ARCHIVE_RETENTION_DAYS", "365"))
+NOTIFICATION_COMPACTION_BATCH_SIZE = int(os.getenv("NOTIFICATION_COMPACTION_BATCH_SIZE", "1000"))
+# Pause between batches so the job never monopolizes the database
+NOTIFICATION_COMPACTION_PAUSE_SECONDS = float(os.getenv("NOTIFICATION_COMPACTION_PAUSE_SECONDS", "0.05"))
+
+# Wording of status change notifications
+STATUS_MESSAGES = {
+    IssueStatus.PENDING: "is pending review",
+    IssueStatus.IN_PROGRESS: "is now in progress",
+    IssueStatus.RESOLVED: "has been resolved",
+    IssueStatus.CLOSED: "has been closed"
+}
 
 
 def create_notification(
@@ -24,11 +58,177 @@ def create_notification(
         is_read=False
     )
     db.add(notification)
+    adjust_unread_count(db, user_id, 1)
     db.commit()
     db.refresh(notification)
     return notification
 
 
+def adjust_unread_count(db: Session, user_id: int, delta: int) -> None:
+    """
+    Atomically add delta to a user's unread counter (part of the caller's
+    transaction). The counter row is created on first increment.
+    """
+    adjust_unread_counts(db, {user_id: delta})
+
+
+def adjust_unread_counts(db: Session, deltas: Dict[int, int]) -> None:
+    """Bulk variant of adjust_unread_count: one executemany per direction"""
+    table = NotificationCounter.__table__
+    increments = [
+        {"user_id": user_id, "unread_count": delta}
+        for user_id, delta in deltas.items() if delta > 0
+    ]
+    decrements = [
+        {"counter_user_id": user_id, "delta": delta}
+        for user_id, delta in deltas.items() if delta < 0
+    ]
+
+    upsert = dialect_insert(db)
+    if increments and upsert is not None:
+        stmt = upsert(table)
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["user_id"],
+                set_={"unread_count": table.c.unread_count + stmt.excluded.unread_count}
+            ),
+            increments
+        )
+    elif increments:
+        # No upsert support: update existing rows, missing ones are created
+        # by the reconciliation job
+        decrements += [
+            {"counter_user_id": row["user_id"], "delta": row["unread_count"]}
+            for row in increments
+        ]
+
+    if decrements:
+        db.execute(
+            update(table)
+            .where(table.c.user_id == bindparam("counter_user_id"))
+            .values(unread_count=table.c.unread_count + bindparam("delta")),
+            decrements
+        )
+
+
+def unread_count_for_user(db: Session, user_id: int) -> int:
+    """Unread count from the counter row (primary key lookup)"""
+    count = db.scalar(
+        select(NotificationCounter.unread_count).where(NotificationCounter.user_id == user_id)
+    )
+    if count is None:
+        # Counter not created yet (user predates counters): backfill once
+        count = db.scalar(
+            select(func.count(Notification.id)).where(
+                Notification.user_id == user_id,
+                Notification.is_read == False
+            )
+        )
+        try:
+            db.execute(insert(NotificationCounter).values(user_id=user_id, unread_count=count))
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+    return max(count, 0)
+
+
+def forget_issue_notifications(db: Session, issue_id: int) -> None:
+    """
+    Decrement unread counters for notifications about to be removed together
+    with their issue (part of the caller's transaction)
+    """
+    rows = db.execute(
+        select(Notification.user_id, func.count(Notification.id))
+        .where(Notification.issue_id == issue_id, Notification.is_read == False)
+        .group_by(Notification.user_id)
+    ).all()
+    for user_id, count in rows:
+        adjust_unread_count(db, user_id, -count)
+
+
+def backfill_unread_counters(db: Session) -> int:
+    """
+    Create the missing counters of users that predate them from their unread
+    notifications (at startup, before an increment could create them at 1)
+
+    Returns:
+        Number of counters created
+    """
+    table = NotificationCounter.__table__
+    unread = (
+        select(func.count(Notification.id))
+        .where(Notification.user_id == User.id, Notification.is_read == False)
+        .scalar_subquery()
+    )
+    try:
+        created = db.execute(
+            insert(table).from_select(
+                ["user_id", "unread_count"],
+                select(User.id, unread).where(~exists().where(table.c.user_id == User.id))
+            )
+        ).rowcount
+        db.commit()
+    except IntegrityError:
+        # Another worker backfilled concurrently
+        db.rollback()
+        return 0
+    return created
+
+
+def reconcile_unread_counts(db: Session, batch_size: int = 1000) -> int:
+    """
+    Repair counter drift by recomputing counters from the notifications table
+
+    Each batch of users is fixed with one correlated UPDATE in its own short
+    transaction.
+
+    Returns:
+        Number of counters that were corrected
+    """
+    table = NotificationCounter.__table__
+
+    # Create missing counters (corrected below if they drifted meanwhile)
+    backfill_unread_counters(db)
+
+    actual = (
+        select(func.count(Notification.id))
+        .where(Notification.user_id == table.c.user_id, Notification.is_read == False)
+        .scalar_subquery()
+    )
+    fixed = 0
+    last_user_id = 0
+    while True:
+        user_ids = db.scalars(
+            select(table.c.user_id)
+            .where(table.c.user_id > last_user_id)
+            .order_by(table.c.user_id)
+            .limit(batch_size)
+        ).all()
+        if not user_ids:
+            break
+        result = db.execute(
+            update(table)
+            .where(table.c.user_id.in_(user_ids), table.c.unread_count != actual)
+            .values(unread_count=actual)
+        )
+        db.commit()
+        fixed += result.rowcount
+        last_user_id = user_ids[-1]
+    return fixed
+
+
+def run_unread_count_reconciliation() -> None:
+    """Background job entry point: repair unread counter drift"""
+    from app.database import SessionLocal, init_engine
+
+    init_engine()
+    db = SessionLocal()
+    try:
+        reconcile_unread_counts(db)
+    finally:
+        db.close()
+
+
 def notify_issue_status_change(
     db: Session,
     issue: Issue,
@@ -41,14 +241,7 @@ def notify_issue_status_change(
     if old_status == new_status:
         return
     
-    status_messages = {
-        IssueStatus.PENDING: "is pending review",
-        IssueStatus.IN_PROGRESS: "is now in progress",
-        IssueStatus.RESOLVED: "has been resolved",
-        IssueStatus.CLOSED: "has been closed"
-    }
-    
-    message = status_messages.get(new_status, f"status changed to {new_status.value}")
+    message = STATUS_MESSAGES.get(new_status, f"status changed to {new_status.value}")
     
     create_notification(
         db=db,
@@ -58,3 +251,104 @@ def notify_issue_status_change(
         issue_id=issue.id
     )
 
+
+
+def compact_notifications(
+    db: Session,
+    retention_days: int = NOTIFICATION_RETENTION_DAYS,
+    batch_size: int = NOTIFICATION_COMPACTION_BATCH_SIZE,
+    mode: str = NOTIFICATION_RETENTION_MODE,
+    max_batches: Optional[int] = None
+) -> int:
+    """
+    Move (or delete) read notifications older than retention_days out of the
+    hot table
+
+    Works in small batches, each in its own short transaction, so no long
+    locks are held on the notifications table.
+
+    Returns:
+        Number of notifications removed from the hot table
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+    total = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        ids = db.scalars(
+            select(Notification.id)
+            .where(Notification.is_read == True, Notification.created_at < cutoff)
+            .order_by(Notification.id)
+            .limit(batch_size)
+        ).all()
+        if not ids:
+            break
+
+        try:
+            if mode == "archive":
+                db.execute(
+                    insert(NotificationArchive).from_select(
+                        ["id", "user_id", "issue_id", "title", "message", "is_read", "created_at"],
+                        select(
+                            Notification.id,
+                            Notification.user_id,
+                            Notification.issue_id,
+                            Notification.title,
+                            Notification.message,
+                            Notification.is_read,
+                            Notification.created_at
+                        ).where(Notification.id.in_(ids))
+                    )
+                )
+            db.execute(delete(Notification).where(Notification.id.in_(ids)))
+            db.commit()
+        except IntegrityError:
+            # Another worker archived this batch concurrently; leave the rest to it
+            db.rollback()
+            break
+
+        total += len(ids)
+        batches += 1
+        if len(ids) < batch_size:
+            break
+        if NOTIFICATION_COMPACTION_PAUSE_SECONDS:
+            time.sleep(NOTIFICATION_COMPACTION_PAUSE_SECONDS)
+    return total
+
+
+def purge_notification_archive(
+    db: Session,
+    retention_days: int = NOTIFICATION_ARCHIVE_RETENTION_DAYS,
+    batch_size: int = NOTIFICATION_COMPACTION_BATCH_SIZE
+) -> int:
+    """Delete archived notifications older than retention_days, in batches"""
+    if retention_days <= 0:
+        return 0
+    cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+    total = 0
+    while True:
+        ids = db.scalars(
+            select(NotificationArchive.id)
+            .where(NotificationArchive.archived_at < cutoff)
+            .limit(batch_size)
+        ).all()
+        if not ids:
+            break
+        db.execute(delete(NotificationArchive).where(NotificationArchive.id.in_(ids)))
+        db.commit()
+        total += len(ids)
+        if len(ids) < batch_size:
+            break
+    return total
+
+
+def run_notification_retention() -> None:
+    """Background job entry point: apply the retention policy"""
+    from app.database import SessionLocal, init_engine
+
+    init_engine()
+    db = SessionLocal()
+    try:
+        compact_notifications(db)
+        purge_notification_archive(db)
+    finally:
+        db.close()
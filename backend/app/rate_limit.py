@@ -0,0 +1,299 @@
+"""
+Rate limiting and admission control
+
+- Token-bucket rate limiter keyed by route scope + user id / client IP.
+  The in-memory backend is per worker process; set RATE_LIMIT_BACKEND to a
+  redis:// URL to share buckets between workers and hosts.
+- Global admission control middleware that caps in-flight requests per
+  worker and sheds excess load with 503 + Retry-After instead of queueing
+  until latency explodes.
+"""
+import asyncio
+import math
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Optional, Tuple
+from fastapi import HTTPException, Request, status
+from dotenv import load_dotenv
+from app.database import DB_MAX_OVERFLOW, DB_POOL_SIZE
+
+load_dotenv()
+
+# Configuration
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+# Limits as "<count>/<period>" (period: second, minute, hour)
+RATE_LIMIT_LOGIN = os.getenv("RATE_LIMIT_LOGIN", "10/minute")
+RATE_LIMIT_REGISTER = os.getenv("RATE_LIMIT_REGISTER", "5/hour")
+RATE_LIMIT_REFRESH = os.getenv("RATE_LIMIT_REFRESH", "60/minute")
+RATE_LIMIT_CREATE_ISSUE = os.getenv("RATE_LIMIT_CREATE_ISSUE", "30/minute")
+RATE_LIMIT_CREATE_UPLOAD = os.getenv("RATE_LIMIT_CREATE_UPLOAD", "60/minute")
+
+# Admission control (per worker process)
+# Endpoints query the database from the event loop: admitting more requests
+# than the pool can serve blocks the loop on pool checkout while connection
+# holders can't finish. A request can hold DB_SESSIONS_PER_REQUEST pooled
+# sessions at once (its own, plus e.g. a merged read's session on shard 0 or
+# a status fan-out running before the request's session is closed), so the
+# default admits as many requests as the pool can serve at that peak.
+# Known limitation: the async handlers still run their synchronous queries
+# on the event loop, so one slow query delays every request of the worker;
+# this cap only keeps that from turning into a pool checkout deadlock.
+DB_SESSIONS_PER_REQUEST = int(os.getenv("DB_SESSIONS_PER_REQUEST", "2"))
+MAX_CONCURRENT_REQUESTS = int(os.getenv(
+    "MAX_CONCURRENT_REQUESTS",
+    str(max(1, (DB_POOL_SIZE + DB_MAX_OVERFLOW) // DB_SESSIONS_PER_REQUEST))
+))
+MAX_QUEUED_REQUESTS = int(os.getenv("MAX_QUEUED_REQUESTS", "400"))
+QUEUE_TIMEOUT_SECONDS = float(os.getenv("QUEUE_TIMEOUT_SECONDS", "2.0"))
+# (method or None for any, path prefix) of routes that don't hold a pooled
+# session while they run: a slot is held until the response body is sent,
+# so image downloads and upload chunks on slow links would starve the
+# database-bound routes (upload chunks close their session before reading)
+ADMISSION_EXEMPT_ROUTES: Tuple[Tuple[Optional[str], str], ...] = (
+    (None, "/health"),
+    (None, "/docs"),
+    (None, "/redoc"),
+    (None, "/openapi.json"),
+    (None, "/.well-known/"),
+    (None, "/api/images/"),
+    ("PATCH", "/api/uploads/"),
+)
+
+_PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+def parse_rate(rate: str) -> Tuple[int, float]:
+    """Parse "10/minute" into (10, 60.0)"""
+    count, _, period = rate.partition("/")
+    period = period.strip().rstrip("s") or "second"
+    if period not in _PERIODS:
+        raise ValueError(f"Invalid rate period: {rate}")
+    return int(count), float(_PERIODS[period])
+
+
+class RateLimitBackend(ABC):
+    """Interface for token bucket storage"""
+
+    @abstractmethod
+    def hit(self, key: str, capacity: int, refill_per_second: float, cost: int = 1) -> Tuple[bool, float]:
+        """
+        Take cost tokens from the bucket identified by key
+
+        A cost above the capacity is allowed once the bucket is full and
+        leaves it in debt: later requests wait until it has refilled.
+
+        Returns:
+            (allowed, retry_after_seconds)
+        """
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """Process-local token buckets with LRU eviction"""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, capacity: int, refill_per_second: float, cost: int = 1) -> Tuple[bool, float]:
+        now = time.monotonic()
+        needed = float(min(cost, capacity))
+        with self._lock:
+            tokens, last = self._buckets.pop(key, (float(capacity), now))
+            tokens = min(float(capacity), tokens + (now - last) * refill_per_second)
+            allowed = tokens >= needed
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        if allowed:
+            return True, 0.0
+        return False, (needed - tokens) / refill_per_second
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """Token buckets shared through Redis (requires the `redis` package)"""
+
+    _SCRIPT = """
+    local capacity = tonumber(ARGV[1])
+    local rate = tonumber(ARGV[2])
+    local now = tonumber(ARGV[3])
+    local cost = tonumber(ARGV[4])
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or capacity
+    local ts = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + (now - ts) * rate)
+    local allowed = 0
+    if tokens >= math.min(cost, capacity) then
+        tokens = tokens - cost
+        allowed = 1
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate) + 1)
+    return {allowed, tostring(tokens)}
+    """
+
+    def __init__(self, url: str):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis requires the 'redis' package")
+        self._client = redis.Redis.from_url(url)
+        self._script = self._client.register_script(self._SCRIPT)
+
+    def hit(self, key: str, capacity: int, refill_per_second: float, cost: int = 1) -> Tuple[bool, float]:
+        allowed, tokens = self._script(
+            keys=[f"ratelimit:{key}"], args=[capacity, refill_per_second, time.time(), cost]
+        )
+        if int(allowed):
+            return True, 0.0
+        return False, (min(cost, capacity) - float(tokens)) / refill_per_second
+
+
+_backend: Optional[RateLimitBackend] = None
+
+
+def get_rate_limit_backend() -> RateLimitBackend:
+    """Return the backend for this process (created lazily, after fork)"""
+    global _backend
+    if _backend is None:
+        if RATE_LIMIT_BACKEND.startswith(("redis://", "rediss://")):
+            _backend = RedisRateLimitBackend(RATE_LIMIT_BACKEND)
+        else:
+            _backend = MemoryRateLimitBackend()
+    return _backend
+
+
+def set_rate_limit_backend(backend: Optional[RateLimitBackend]) -> None:
+    """Replace the backend (e.g. with a custom shared implementation)"""
+    global _backend
+    _backend = backend
+
+
+def client_ip(request: Request) -> str:
+    """Best-effort client address (proxy headers are resolved by the server)"""
+    return request.client.host if request.client else "unknown"
+
+
+class RateLimiter:
+    """
+    FastAPI dependency enforcing a token bucket per (scope, client)
+
+    Usage:
+        @router.post("/login", dependencies=[Depends(RateLimiter("login", "10/minute"))])
+    """
+
+    def __init__(self, scope: str, rate: str):
+        self.scope = scope
+        self.capacity, period = parse_rate(rate)
+        self.refill_per_second = self.capacity / period
+
+    def check(self, identity: str, cost: int = 1) -> None:
+        """Consume cost tokens (e.g. one per report of a batch) for identity or raise 429"""
+        if not RATE_LIMIT_ENABLED:
+            return
+        allowed, retry_after = get_rate_limit_backend().hit(
+            f"{self.scope}:{identity}", self.capacity, self.refill_per_second, cost
+        )
+        if not allowed:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests. Please try again later.",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
+
+    async def __call__(self, request: Request) -> None:
+        self.check(f"ip:{client_ip(request)}")
+
+
+login_rate_limit = RateLimiter("login", RATE_LIMIT_LOGIN)
+register_rate_limit = RateLimiter("register", RATE_LIMIT_REGISTER)
+refresh_rate_limit = RateLimiter("refresh", RATE_LIMIT_REFRESH)
+create_issue_rate_limit = RateLimiter("create_issue", RATE_LIMIT_CREATE_ISSUE)
+create_upload_rate_limit = RateLimiter("create_upload", RATE_LIMIT_CREATE_UPLOAD)
+
+
+class AdmissionControlMiddleware:
+    """
+    Cap concurrent requests per worker and shed load early
+
+    Up to max_concurrency requests run at once, up to max_queue more wait at
+    most queue_timeout seconds for a slot; everything else gets an immediate
+    503 with Retry-After.
+    """
+
+    def __init__(
+        self,
+        app,
+        max_concurrency: int = MAX_CONCURRENT_REQUESTS,
+        max_queue: int = MAX_QUEUED_REQUESTS,
+        queue_timeout: float = QUEUE_TIMEOUT_SECONDS,
+        exempt_routes: Tuple[Tuple[Optional[str], str], ...] = ADMISSION_EXEMPT_ROUTES,
+    ):
+        self.app = app
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.exempt_routes = exempt_routes
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.in_flight = 0
+        self.waiting = 0
+        self.shed = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self._exempt(scope["method"], scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        if self._semaphore is None:
+            # Created lazily so it binds to the worker's event loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        if self._semaphore.locked():
+            if self.waiting >= self.max_queue:
+                await self._reject(send)
+                return
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                await self._reject(send)
+                return
+            finally:
+                self.waiting -= 1
+        else:
+            await self._semaphore.acquire()
+
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def _exempt(self, method: str, path: str) -> bool:
+        return any(
+            path.startswith(prefix) and (exempt_method is None or method == exempt_method)
+            for exempt_method, prefix in self.exempt_routes
+        )
+
+    async def _reject(self, send) -> None:
+        self.shed += 1
+        body = b'{"detail":"Server is busy. Please try again shortly."}'
+        await send({
+            "type": "http.response.start",
+            "status": status.HTTP_503_SERVICE_UNAVAILABLE,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(self.queue_timeout))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
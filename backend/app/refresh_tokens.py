@@ -0,0 +1,110 @@
+"""
+Rotating refresh tokens
+
+A login starts a session and returns an access token plus an opaque refresh
+token. POST /api/auth/refresh exchanges the refresh token for a new pair:
+the presented token is marked used and a new one is issued for the same
+session. Refresh tokens are random 256-bit values, so they are stored as a
+plain SHA-256 hash (a slow password hash buys nothing here) and a refresh
+costs one indexed lookup instead of a bcrypt verification.
+
+Presenting an already used refresh token means it was copied: the whole
+session is revoked, including the access tokens issued for it.
+"""
+import hashlib
+import os
+import secrets
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+from fastapi import HTTPException, status
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+from app.models import RefreshToken, User
+from app.revocation import revocation_list
+from app.utils import ACCESS_TOKEN_EXPIRE_MINUTES
+
+load_dotenv()
+
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite returns naive datetimes; everything is stored in UTC
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def hash_refresh_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def new_session_id() -> str:
+    return secrets.token_hex(16)
+
+
+def issue_refresh_token(db: Session, user_id: int, session_id: str) -> str:
+    """Create a refresh token for a session (part of the caller's transaction)"""
+    token = secrets.token_urlsafe(32)
+    now = _utcnow()
+    db.add(RefreshToken(
+        user_id=user_id,
+        session_id=session_id,
+        token_hash=hash_refresh_token(token),
+        created_at=now,
+        expires_at=now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    ))
+    return token
+
+
+def revoke_sessions(db: Session, *session_ids: str) -> None:
+    """Log sessions out: refresh tokens stop working, access tokens are rejected"""
+    expires_at = _utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    revocation_list.revoke(db, session_ids, expires_at)
+
+
+def rotate_refresh_token(db: Session, token: str) -> Tuple[User, str, str]:
+    """
+    Exchange a refresh token for a new one (commits)
+
+    Returns:
+        (user, new refresh token, session id)
+
+    Raises:
+        HTTPException 401: Unknown, expired, revoked or reused token
+    """
+    invalid = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    record: Optional[RefreshToken] = db.query(RefreshToken).filter(
+        RefreshToken.token_hash == hash_refresh_token(token)
+    ).first() if token else None
+    now = _utcnow()
+    if record is None or record.revoked or _as_utc(record.expires_at) <= now:
+        raise invalid
+
+    # Conditional update: of two concurrent uses only one wins
+    claimed = db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.id == record.id, RefreshToken.used_at.is_(None))
+        .values(used_at=now)
+    ).rowcount
+    if not claimed:
+        revoke_sessions(db, record.session_id)
+        db.commit()
+        raise invalid
+
+    user = db.get(User, record.user_id)
+    if user is None:
+        db.rollback()
+        raise invalid
+    new_token = issue_refresh_token(db, user.id, record.session_id)
+    db.commit()
+    return user, new_token, record.session_id
@@ -0,0 +1,159 @@
+"""
+Revoked sessions (logout) checked on every authenticated request
+
+Access tokens stay stateless: they carry the id of their login session
+("sid") and are rejected once that session is revoked. The exact list lives
+in the revoked_sessions table; each worker keeps a bloom filter of it in
+memory, so the common case (token not revoked) costs a few hashes and no
+query. Only bloom hits, i.e. revoked sessions and rare false positives, are
+confirmed against the table.
+
+Revocations made by this worker apply immediately; those made by other
+workers are picked up within REVOCATION_SYNC_SECONDS (one indexed query per
+interval). Rows are kept only until the session's last access token has
+expired, and the filter is rebuilt from the remaining rows periodically.
+"""
+import hashlib
+import math
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Iterable
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+from app.database import SessionLocal, dialect_insert
+from app.models import RefreshToken, RevokedSession
+
+load_dotenv()
+
+# How stale another worker's view of revocations may be
+REVOCATION_SYNC_SECONDS = float(os.getenv("REVOCATION_SYNC_SECONDS", "1"))
+# Expected number of concurrently revoked sessions and target false positive rate
+REVOCATION_BLOOM_CAPACITY = int(os.getenv("REVOCATION_BLOOM_CAPACITY", "100000"))
+REVOCATION_BLOOM_ERROR_RATE = float(os.getenv("REVOCATION_BLOOM_ERROR_RATE", "0.001"))
+# Rebuilding drops expired sessions from the filter
+REVOCATION_REBUILD_SECONDS = float(os.getenv("REVOCATION_REBUILD_SECONDS", "600"))
+SESSION_PURGE_INTERVAL_SECONDS = int(os.getenv("SESSION_PURGE_INTERVAL_SECONDS", "3600"))
+
+# Re-read revocations this far behind the last sync (commit delay of other writers)
+_SYNC_OVERLAP = timedelta(seconds=30)
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class BloomFilter:
+    """Fixed-size bloom filter of strings (no false negatives)"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(1, capacity)
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str) -> Iterable[int]:
+        # Double hashing: k positions from one 128-bit digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevocationList:
+    """Per-worker view of revoked_sessions"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bloom = BloomFilter(REVOCATION_BLOOM_CAPACITY, REVOCATION_BLOOM_ERROR_RATE)
+        self._synced_at = None  # database time covered by the last sync
+        self._next_sync = 0.0
+        self._next_rebuild = 0.0
+
+    def revoke(self, db: Session, session_ids: Iterable[str], expires_at: datetime) -> None:
+        """
+        Revoke sessions (part of the caller's transaction) and their refresh tokens
+
+        Args:
+            expires_at: When the last access token issued for the sessions expires
+        """
+        session_ids = list(dict.fromkeys(session_ids))
+        if not session_ids:
+            return
+        now = _utcnow()
+        db.query(RefreshToken).filter(
+            RefreshToken.session_id.in_(session_ids)
+        ).update({RefreshToken.revoked: True}, synchronize_session=False)
+
+        rows = [dict(session_id=sid, revoked_at=now, expires_at=expires_at) for sid in session_ids]
+        upsert = dialect_insert(db)
+        if upsert is not None:
+            db.execute(upsert(RevokedSession.__table__).on_conflict_do_nothing(), rows)
+        else:
+            for row in rows:
+                if db.get(RevokedSession, row["session_id"]) is None:
+                    db.add(RevokedSession(**row))
+        with self._lock:
+            for sid in session_ids:
+                self._bloom.add(sid)
+
+    def is_revoked(self, db: Session, session_id: str) -> bool:
+        self._sync(db)
+        with self._lock:
+            if session_id not in self._bloom:
+                return False
+        # Bloom hit: confirm against the exact list
+        return db.get(RevokedSession, session_id) is not None
+
+    def _sync(self, db: Session) -> None:
+        now = time.monotonic()
+        if now < self._next_sync:
+            return
+        rebuild = now >= self._next_rebuild
+        started = _utcnow()
+        query = select(RevokedSession.session_id).where(RevokedSession.expires_at > started)
+        if not rebuild and self._synced_at is not None:
+            query = query.where(RevokedSession.revoked_at >= self._synced_at - _SYNC_OVERLAP)
+        session_ids = db.scalars(query).all()
+
+        with self._lock:
+            if rebuild:
+                capacity = max(REVOCATION_BLOOM_CAPACITY, 2 * len(session_ids))
+                bloom = BloomFilter(capacity, REVOCATION_BLOOM_ERROR_RATE)
+                self._next_rebuild = now + REVOCATION_REBUILD_SECONDS
+            else:
+                bloom = self._bloom
+            for sid in session_ids:
+                bloom.add(sid)
+            self._bloom = bloom
+            self._synced_at = started
+            self._next_sync = now + REVOCATION_SYNC_SECONDS
+
+
+revocation_list = RevocationList()
+
+
+def purge_expired_sessions() -> int:
+    """Delete expired refresh tokens and revocations nobody can need any more"""
+    db = SessionLocal()
+    try:
+        now = _utcnow()
+        deleted = db.query(RefreshToken).filter(
+            RefreshToken.expires_at < now
+        ).delete(synchronize_session=False)
+        deleted += db.query(RevokedSession).filter(
+            RevokedSession.expires_at < now
+        ).delete(synchronize_session=False)
+        db.commit()
+        return deleted
+    finally:
+        db.close()
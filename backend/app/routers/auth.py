@@ -8,19 +8,52 @@ from sqlalchemy.exc import IntegrityError
 from datetime import timedelta
 from app.database import get_db
 from app.models import User, UserRole
-from app.schemas import UserRegister, UserLogin, UserResponse, Token
+from app.models import RefreshToken
+from app.schemas import UserRegister, UserLogin, UserResponse, Token, RefreshTokenRequest
 from app.utils import (
     verify_password,
     get_password_hash,
     create_access_token,
+    decode_access_token,
     get_current_active_user,
+    oauth2_scheme,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
+from app.refresh_tokens import issue_refresh_token, new_session_id, revoke_sessions, rotate_refresh_token
+from app.rate_limit import login_rate_limit, register_rate_limit, refresh_rate_limit
 
 router = APIRouter()
 
 
-@router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
+def issue_tokens(db: Session, user: User, session_id: str = None, refresh_token: str = None) -> dict:
+    """
+    Access token for the user's session plus a refresh token (a new session
+    and refresh token are created, and committed, when not given)
+    """
+    if session_id is None:
+        session_id = new_session_id()
+        refresh_token = issue_refresh_token(db, user.id, session_id)
+        db.commit()
+
+    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token = create_access_token(
+        data={"sub": user.id, "email": user.email, "role": user.role.value, "sid": session_id},
+        expires_delta=access_token_expires
+    )
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "refresh_token": refresh_token,
+        "expires_in": int(access_token_expires.total_seconds())
+    }
+
+
+@router.post(
+    "/register",
+    response_model=UserResponse,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(register_rate_limit)]
+)
 async def register(user_data: UserRegister, db: Session = Depends(get_db)):
     """
     Register a new user
@@ -55,7 +88,7 @@ async def register(user_data: UserRegister, db: Session = Depends(get_db)):
         )
 
 
-@router.post("/login", response_model=Token)
+@router.post("/login", response_model=Token, dependencies=[Depends(login_rate_limit)])
 async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)
@@ -75,20 +108,11 @@ async def login(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # Create access token
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.id, "email": user.email, "role": user.role.value},
-        expires_delta=access_token_expires
-    )
-    
-    return {
-        "access_token": access_token,
-        "token_type": "bearer"
-    }
+    # Start a session: access token + refresh token
+    return issue_tokens(db, user)
 
 
-@router.post("/login/json", response_model=Token)
+@router.post("/login/json", response_model=Token, dependencies=[Depends(login_rate_limit)])
 async def login_json(user_data: UserLogin, db: Session = Depends(get_db)):
     """
     Alternative login endpoint that accepts JSON instead of form data
@@ -103,17 +127,46 @@ async def login_json(user_data: UserLogin, db: Session = Depends(get_db)):
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # Create access token
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.id, "email": user.email, "role": user.role.value},
-        expires_delta=access_token_expires
-    )
-    
-    return {
-        "access_token": access_token,
-        "token_type": "bearer"
-    }
+    # Start a session: access token + refresh token
+    return issue_tokens(db, user)
+
+
+@router.post("/refresh", response_model=Token, dependencies=[Depends(refresh_rate_limit)])
+async def refresh(request: RefreshTokenRequest, db: Session = Depends(get_db)):
+    """
+    Exchange a refresh token for a new access token and refresh token
+    (the presented refresh token can't be used again)
+    """
+    user, refresh_token, session_id = rotate_refresh_token(db, request.refresh_token)
+    return issue_tokens(db, user, session_id, refresh_token)
+
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(
+    all_sessions: bool = False,
+    token: str = Depends(oauth2_scheme),
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Revoke the current session (or with all_sessions=true every session of
+    the user): its refresh token stops working and its access tokens are
+    rejected from now on
+    """
+    session_ids = []
+    session_id = decode_access_token(token).get("sid")
+    if session_id:
+        session_ids.append(session_id)
+    if all_sessions:
+        session_ids.extend(
+            sid for (sid,) in db.query(RefreshToken.session_id).filter(
+                RefreshToken.user_id == current_user.id,
+                RefreshToken.revoked.is_(False)
+            ).distinct()
+        )
+    revoke_sessions(db, *session_ids)
+    db.commit()
+    return None
 
 
 @router.get("/me", response_model=UserResponse)
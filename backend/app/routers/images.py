@@ -28,6 +28,13 @@ async def get_image(file_path: str):
             detail="Invalid file path"
         )
     
+    # Staged uploads are not public until attached to an issue
+    if file_path.startswith("tmp/"):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Image not found"
+        )
+    
     file_full_path = Path(UPLOAD_DIR) / file_path
     
     # Ensure file is within upload directory
@@ -1,19 +1,126 @@
 """
 Issue CRUD endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, UploadFile, File, Query, Header
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import delete, insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import UploadFile as StarletteUploadFile
 from typing import List, Optional
-from app.database import get_db
-from app.models import Issue, IssueCategory, IssueStatus
-from app.schemas import IssueCreate, IssueUpdate, IssueResponse
-from app.utils import get_current_active_user, get_current_admin_user
-from app.file_utils import save_uploaded_image, get_image_url, delete_image_file
+from datetime import date, datetime, timezone
+import json
+import os
+from app.database import get_db, get_read_db
+from app.models import IngestReceipt, Issue, IssueCategory, IssueEvent, IssueStatus, Notification, Subscription
+from app.schemas import (
+    IssueCreate,
+    IssueUpdate,
+    IssueResponse,
+    IssueBatchItem,
+    IssueBatchResult,
+    IssueBatchResponse,
+    IssueChangesResponse,
+    ProvisionalIssueResponse,
+    HeatmapResponse,
+    TrendsResponse,
+    IssueTimelineResponse,
+    SlaResponse,
+    TriageClaimResponse,
+    TriageEntry
+)
+from app.utils import get_current_active_user, get_current_admin_user, rate_limited_user
+from app.rate_limit import create_issue_rate_limit
+from app.idempotency import (
+    validate_key,
+    request_fingerprint,
+    get_stored_response,
+    get_stored_responses,
+    store_response,
+    replay
+)
+from app.analytics import ROLLUP_PRECISION, apply_cell_deltas, issue_cell, record_issues
+from app.notification_service import forget_issue_notifications, notify_issue_status_change
+from app.subscription_service import fan_out_status_change
+from app.issue_events import issue_snapshot, record_changes, record_created, timeline
+from app.zones import locate_zone, locate_zones
+from app.uploads import take_completed_upload
+from app.snapshots import snapshot_response
+from app.archive import archived_timeline, get_archived_issue
+from app.triage import current_priority, release_claim, update_triage_queue
+from app.sync import is_not_modified, track_issue_changes, validator_headers
+from app.sharding import (
+    get_issue_db,
+    get_location_db,
+    get_read_issue_db,
+    open_issue_session,
+    shard_for_location,
+    shard_session,
+    shard_sessionmakers,
+    with_issue_ids
+)
+from app.shard_queries import (
+    claim_next_issue,
+    issue_changes,
+    last_modified,
+    latest_issues,
+    merged_heatmap,
+    merged_sla_report,
+    merged_trends,
+    triage_snapshot
+)
+from app.export import (
+    EXPORT_FORMATS,
+    build_export_query,
+    parse_bbox,
+    require_pyarrow,
+    stream_export
+)
+from app.file_utils import (
+    StagedImage,
+    stage_uploaded_image,
+    promote_staged_image,
+    discard_staged_image,
+    get_image_url,
+    delete_image_file
+)
 from fastapi import Request
 
+# Maximum number of reports accepted by POST /batch
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "50"))
+# Same setting as app.ingest, which is only imported in buffered mode
+INGEST_MODE = os.getenv("INGEST_MODE", "direct")
+
 router = APIRouter()
 
 
+def issue_response_body(issue: Issue, base_url: str) -> dict:
+    """Serialize an issue for the API (image path converted to a full URL)"""
+    body = jsonable_encoder(IssueResponse.model_validate(issue))
+    if body.get("image_url"):
+        body["image_url"] = get_image_url(body["image_url"], base_url)
+    return body
+
+
+def discard_image(staged: Optional[StagedImage], image_path: Optional[str]) -> None:
+    """Remove an image whose issue insert was rolled back"""
+    if image_path:
+        delete_image_file(image_path)
+    else:
+        discard_staged_image(staged)
+
+
+def discard_batch_images(pending: list, promoted: List[str]) -> None:
+    """Remove staged and already promoted images of a rolled back batch"""
+    for image_path in promoted:
+        delete_image_file(image_path)
+    for _, _, staged, _ in pending:
+        discard_staged_image(staged)
+
+
 @router.post("/", response_model=IssueResponse, status_code=status.HTTP_201_CREATED)
 async def create_issue(
     request: Request,
@@ -23,8 +130,11 @@ async def create_issue(
     latitude: float,
     longitude: float,
     image: Optional[UploadFile] = File(None),
+    upload_id: Optional[str] = None,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_active_user)
+    issue_db: Session = Depends(get_location_db),
+    current_user = Depends(rate_limited_user(create_issue_rate_limit))
 ):
     """
     Create a new issue report
@@ -35,54 +145,343 @@ async def create_issue(
     - **latitude**: Latitude coordinate
     - **longitude**: Longitude coordinate
     - **image**: Optional image file (jpg, png, gif)
+    - **upload_id**: Finished resumable upload (POST /api/uploads/) to use
+      as the image instead
+    - **Idempotency-Key** (header): Optional client key; retries with the same
+      key replay the original response instead of creating a duplicate
+    
+    With INGEST_MODE=buffered the report is acknowledged with 202 and a
+    provisional id once it is in the ingest buffer; resolve it with
+    GET /api/issues/provisional/{provisional_id}.
     """
-    # Create issue first
-    new_issue = Issue(
-        title=title,
-        description=description,
-        category=category,
-        latitude=latitude,
-        longitude=longitude,
-        reporter_id=current_user.id
-    )
+    if image and upload_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Send either an image or an upload_id, not both"
+        )
     
-    db.add(new_issue)
-    db.commit()
-    db.refresh(new_issue)
+    fingerprint = None
+    if idempotency_key:
+        validate_key(idempotency_key)
+        fingerprint = request_fingerprint(
+            title=title,
+            description=description,
+            category=category.value,
+            latitude=latitude,
+            longitude=longitude,
+            image=image.filename if image else upload_id
+        )
+        record = get_stored_response(issue_db, current_user.id, idempotency_key)
+        if record:
+            return replay(record, fingerprint)
+
+    reporter_id = current_user.id
+    
+    # Release the connections held since authentication: staging the image is
+    # pure disk I/O and must not pin a pooled connection
+    db.close()
+    issue_db.close()
     
-    # Handle image upload if provided
+    # Stage the image before the issue exists (streamed to temp storage)
+    staged = None
     if image:
         try:
-            image_path = await save_uploaded_image(image, new_issue.id)
-            new_issue.image_url = image_path
-            
-            db.commit()
-            db.refresh(new_issue)
-        except Exception as e:
-            # If image upload fails, delete the issue
-            db.delete(new_issue)
-            db.commit()
+            staged = await stage_uploaded_image(image)
+        except HTTPException as e:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Error uploading image: {str(e)}"
+                detail=f"Error uploading image: {e.detail}"
             )
+    elif upload_id:
+        staged = await run_in_threadpool(take_completed_upload, upload_id, reporter_id)
     
-    # Convert image path to full URL for response
     base_url = str(request.base_url).rstrip('/')
-    if new_issue.image_url:
-        new_issue.image_url = get_image_url(new_issue.image_url, base_url)
+    if INGEST_MODE == "buffered":
+        from app.ingest import submit_report
+        # Durable in the local log now, inserted by the ingest flusher
+        provisional_id = await submit_report(
+            reporter_id,
+            dict(title=title, description=description, category=category.value,
+                 latitude=latitude, longitude=longitude),
+            staged, base_url, idempotency_key, fingerprint
+        )
+        return ORJSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content={"provisional_id": provisional_id, "status": "pending", "issue": None, "error": None},
+            headers={"Location": f"/api/issues/provisional/{provisional_id}"}
+        )
     
-    return new_issue
+    # Insert, link image and store the idempotent response in one transaction
+    image_path = None
+    try:
+        new_issue = issue_db.scalars(
+            insert(Issue).returning(Issue),
+            with_issue_ids(issue_db, [dict(
+                title=title,
+                description=description,
+                category=category,
+                latitude=latitude,
+                longitude=longitude,
+                reporter_id=reporter_id,
+                zone_id=locate_zone(db, latitude, longitude)
+            )])
+        ).one()
+        
+        if staged:
+            image_path = promote_staged_image(staged, new_issue.id)
+            new_issue.image_url = image_path
+        
+        record_issues(issue_db, [new_issue])
+        update_triage_queue(issue_db, [new_issue])
+        record_created(issue_db, [new_issue], reporter_id)
+        track_issue_changes(issue_db, [new_issue])
+        
+        # Convert image path to full URL for response
+        body = issue_response_body(new_issue, base_url)
+        
+        if idempotency_key:
+            store_response(
+                issue_db, reporter_id, idempotency_key, fingerprint,
+                status.HTTP_201_CREATED, body
+            )
+        
+        issue_db.commit()
+    except IntegrityError:
+        issue_db.rollback()
+        discard_image(staged, image_path)
+        # A concurrent retry with the same key committed first
+        record = get_stored_response(issue_db, reporter_id, idempotency_key) if idempotency_key else None
+        if record is None:
+            raise
+        return replay(record, fingerprint)
+    except Exception:
+        issue_db.rollback()
+        discard_image(staged, image_path)
+        raise
+    
+    return body
+
+
+@router.post("/batch", response_model=IssueBatchResponse)
+async def create_issues_batch(
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_active_user)
+):
+    """
+    Create many queued reports in one request (offline sync)
+    
+    Multipart form:
+    - **reports**: JSON array of reports, each with title, description,
+      category, latitude, longitude and optionally:
+        - **client_id**: Device-generated id; resubmitting it returns the
+          already created issue instead of a duplicate
+        - **image**: Name of the form field that holds this report's image
+        - **upload_id**: Finished resumable upload to use as the image
+    - One file field per referenced image
+    
+    All new reports are inserted in a single transaction (one per shard
+    with sharding). The response lists an outcome (created, duplicate or
+    error) per report.
+    """
+    form = await request.form()
+    try:
+        raw_reports = json.loads(form.get("reports") or "")
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="'reports' must be a JSON array"
+        )
+    if not isinstance(raw_reports, list):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="'reports' must be a JSON array"
+        )
+    if len(raw_reports) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Too many reports in one batch. Maximum: {MAX_BATCH_SIZE}"
+        )
+    # Same budget as single reports: one token per report
+    create_issue_rate_limit.check(f"user:{current_user.id}", cost=len(raw_reports))
+    
+    results: List[Optional[IssueBatchResult]] = [None] * len(raw_reports)
+    
+    # Validate every report before touching the database
+    items = []
+    for index, raw in enumerate(raw_reports):
+        try:
+            items.append((index, IssueBatchItem.model_validate(raw)))
+        except ValidationError as e:
+            client_id = raw.get("client_id") if isinstance(raw, dict) else None
+            results[index] = IssueBatchResult(
+                index=index, client_id=client_id, status="error",
+                error="; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            )
+    
+    # Every report goes to the shard of its location (all to db without sharding)
+    zone_ids = dict(zip(
+        [index for index, _ in items],
+        locate_zones(db, [item.latitude for _, item in items], [item.longitude for _, item in items])
+    ))
+    shards = {
+        index: shard_for_location(db, item.latitude, item.longitude, zone_ids[index])
+        for index, item in items
+    }
+    
+    # Look up already submitted reports with one query per shard
+    stored = {}
+    for shard in sorted(set(shards.values())):
+        keys = [f"batch:{item.client_id}" for index, item in items if item.client_id and shards[index] == shard]
+        if keys:
+            with shard_session(db, shard) as issue_db:
+                stored.update(get_stored_responses(issue_db, current_user.id, keys))
+    
+    reporter_id = current_user.id
+    # Don't hold a pooled connection while images are staged
+    db.close()
+    
+    pending = []  # (index, item, staged image, fingerprint)
+    first_by_client_id = {}  # client_id -> (index, fingerprint) of its first pending report
+    duplicate_of = {}  # index -> index of the same report earlier in this batch
+    for index, item in items:
+        fingerprint = request_fingerprint(**item.model_dump(mode="json", exclude={"client_id"}))
+        if item.client_id:
+            record = stored.get(f"batch:{item.client_id}")
+            first = first_by_client_id.get(item.client_id)
+            if record is not None or first is not None:
+                request_hash = record.request_hash if record is not None else first[1]
+                if request_hash != fingerprint:
+                    results[index] = IssueBatchResult(
+                        index=index, client_id=item.client_id, status="error",
+                        error="client_id was already used with different report data"
+                    )
+                elif record is not None:
+                    results[index] = IssueBatchResult(
+                        index=index, client_id=item.client_id, status="duplicate",
+                        issue=record.response_body
+                    )
+                else:
+                    duplicate_of[index] = first[0]
+                continue
+        
+        image = None
+        if item.upload_id:
+            try:
+                image = await run_in_threadpool(take_completed_upload, item.upload_id, reporter_id)
+            except HTTPException as e:
+                results[index] = IssueBatchResult(
+                    index=index, client_id=item.client_id, status="error", error=e.detail
+                )
+                continue
+        elif item.image:
+            upload = form.get(item.image)
+            if not isinstance(upload, StarletteUploadFile):
+                results[index] = IssueBatchResult(
+                    index=index, client_id=item.client_id, status="error",
+                    error=f"Image field '{item.image}' not found in request"
+                )
+                continue
+            try:
+                image = await stage_uploaded_image(upload)
+            except HTTPException as e:
+                results[index] = IssueBatchResult(
+                    index=index, client_id=item.client_id, status="error", error=e.detail
+                )
+                continue
+        
+        pending.append((index, item, image, fingerprint))
+        if item.client_id:
+            first_by_client_id[item.client_id] = (index, fingerprint)
+    
+    base_url = str(request.base_url).rstrip('/')
+    committed = False
+    for shard in sorted({shards[index] for index, _, _, _ in pending}):
+        group = [report for report in pending if shards[report[0]] == shard]
+        promoted = []
+        with shard_session(db, shard) as issue_db:
+            try:
+                # Bulk insert all reports, rows come back in parameter order
+                new_issues = issue_db.scalars(
+                    insert(Issue).returning(Issue, sort_by_parameter_order=True),
+                    with_issue_ids(issue_db, [
+                        dict(
+                            title=item.title,
+                            description=item.description,
+                            category=item.category,
+                            latitude=item.latitude,
+                            longitude=item.longitude,
+                            reporter_id=reporter_id,
+                            zone_id=zone_ids[index]
+                        )
+                        for index, item, _, _ in group
+                    ])
+                ).all()
+                record_issues(issue_db, new_issues)
+                update_triage_queue(issue_db, new_issues)
+                record_created(issue_db, new_issues, reporter_id)
+                track_issue_changes(issue_db, new_issues)
+                
+                for (index, item, image, fingerprint), issue in zip(group, new_issues):
+                    if image:
+                        issue.image_url = promote_staged_image(image, issue.id)
+                        promoted.append(issue.image_url)
+                    body = issue_response_body(issue, base_url)
+                    if item.client_id:
+                        store_response(
+                            issue_db, reporter_id, f"batch:{item.client_id}", fingerprint,
+                            status.HTTP_201_CREATED, body
+                        )
+                    results[index] = IssueBatchResult(
+                        index=index, client_id=item.client_id, status="created", issue=body
+                    )
+                
+                issue_db.commit()
+                committed = True
+            except Exception as e:
+                issue_db.rollback()
+                if not committed:
+                    discard_batch_images(pending, promoted)
+                    if isinstance(e, IntegrityError):
+                        raise HTTPException(
+                            status_code=status.HTTP_409_CONFLICT,
+                            detail="A concurrent submission with the same client ids is in progress. Please retry."
+                        )
+                    raise
+                # Other shards committed already: report this shard's reports
+                # as failed, resubmitting them (same client ids) is safe
+                discard_batch_images(group, promoted)
+                for index, item, _, _ in group:
+                    results[index] = IssueBatchResult(
+                        index=index, client_id=item.client_id, status="error",
+                        error="Could not be saved, please retry"
+                    )
+    
+    # Reports repeated within this batch point at the issue created above
+    for index, first_index in duplicate_of.items():
+        first = results[first_index]
+        results[index] = IssueBatchResult(
+            index=index, client_id=first.client_id, status="duplicate", issue=first.issue
+        )
+    
+    return IssueBatchResponse(
+        created=sum(1 for r in results if r.status == "created"),
+        duplicates=sum(1 for r in results if r.status == "duplicate"),
+        errors=sum(1 for r in results if r.status == "error"),
+        results=results
+    )
 
 
 @router.get("/", response_model=List[IssueResponse])
 async def get_all_issues(
     request: Request,
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
     category: Optional[IssueCategory] = None,
     status: Optional[IssueStatus] = None,
-    db: Session = Depends(get_db)
+    zone_id: Optional[int] = None,
+    db: Optional[Session] = Depends(get_read_db)
 ):
     """
     Get all issues with optional filtering
@@ -91,20 +490,28 @@ async def get_all_issues(
     - **limit**: Maximum number of records to return
     - **category**: Filter by category
     - **status**: Filter by status
-    """
-    query = db.query(Issue)
+    - **zone_id**: Filter by administrative zone
     
-    # Apply filters
-    if category:
-        query = query.filter(Issue.category == category)
-    if status:
-        query = query.filter(Issue.status == status)
+    Supports conditional requests (If-None-Match / If-Modified-Since):
+    304 Not Modified when no issue matching the filters changed.
     
-    # Order by created_at descending (newest first)
-    query = query.order_by(Issue.created_at.desc())
+    While the database is unavailable the first page is served from the
+    read-only snapshot.
+    """
+    if db is None:
+        return snapshot_response(
+            request, "feed", max_items=limit, category=category, status=status, skip=skip, zone_id=zone_id
+        )
+    
+    headers = {}
+    modified_at = last_modified(db, category, status)
+    if modified_at:
+        headers = validator_headers(modified_at)
+        if is_not_modified(request, headers, modified_at):
+            return Response(status_code=304, headers=headers)
     
-    # Apply pagination
-    issues = query.offset(skip).limit(limit).all()
+    # Newest first, filtered and paginated (merged across shards)
+    issues = latest_issues(db, skip, limit, category, status, zone_id)
     
     # Convert image paths to full URLs
     base_url = str(request.base_url).rstrip('/')
@@ -112,19 +519,302 @@ async def get_all_issues(
         if issue.image_url:
             issue.image_url = get_image_url(issue.image_url, base_url)
     
+    response.headers.update(headers)
     return issues
 
 
+@router.get("/changes", response_model=IssueChangesResponse)
+async def get_issue_changes(
+    request: Request,
+    since: Optional[str] = Query(None, description="sync_token of the previous call"),
+    limit: int = Query(500, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    """
+    Issues created, updated or deleted since a sync token
+    
+    Start without `since` to get every issue, then pass the returned
+    `sync_token` on the next call. Repeat while `has_more` is true.
+    
+    - **since**: Sync token from the previous response
+    - **limit**: Maximum number of changes returned
+    """
+    issues, deleted, sync_token, has_more = issue_changes(db, since, limit)
+    
+    base_url = str(request.base_url).rstrip('/')
+    return {
+        "issues": [issue_response_body(issue, base_url) for issue in issues],
+        "deleted": deleted,
+        "sync_token": sync_token,
+        "has_more": has_more
+    }
+
+
+@router.get("/export")
+async def export_issues(
+    request: Request,
+    format: str = Query("ndjson", pattern="^(ndjson|csv|arrow|parquet)$"),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    category: Optional[IssueCategory] = None,
+    status: Optional[IssueStatus] = None,
+    bbox: Optional[str] = Query(None, description="min_lon,min_lat,max_lon,max_lat"),
+    zone_id: Optional[int] = None
+):
+    """
+    Stream all matching issues for analytics (no pagination)
+    
+    - **format**: ndjson (default), csv, arrow (IPC stream) or parquet
+    - **since** / **until**: created_at range (ISO 8601, until is exclusive)
+    - **category**: Filter by category
+    - **status**: Filter by status
+    - **bbox**: Filter by bounding box
+    - **zone_id**: Filter by administrative zone
+    """
+    # Note: 'status' is shadowed by the query parameter in this endpoint
+    try:
+        bounds = parse_bbox(bbox) if bbox else None
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid bbox: {str(e)}"
+        )
+    
+    if format in ("arrow", "parquet"):
+        try:
+            require_pyarrow()
+        except ImportError as e:
+            raise HTTPException(
+                status_code=501,
+                detail=str(e)
+            )
+    
+    query = build_export_query(since, until, category, status, bounds, zone_id)
+    base_url = str(request.base_url).rstrip('/')
+    return StreamingResponse(
+        stream_export(query, format, base_url, shard_sessionmakers()),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="issues.{format}"'}
+    )
+
+
+@router.get("/analytics/heatmap", response_model=HeatmapResponse)
+async def get_heatmap(
+    request: Request,
+    precision: int = Query(5, ge=1, le=ROLLUP_PRECISION),
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    category: Optional[IssueCategory] = None,
+    bbox: Optional[str] = Query(None, description="min_lon,min_lat,max_lon,max_lat"),
+    db: Optional[Session] = Depends(get_read_db)
+):
+    """
+    Issue density per geohash cell
+    
+    - **precision**: Geohash length (1 = continent ... 6 = ~1km)
+    - **since** / **until**: Day range (until is exclusive)
+    - **category**: Filter by category
+    - **bbox**: Only cells whose center lies in the bounding box
+    """
+    if db is None:
+        return snapshot_response(
+            request, "heatmap", precision=precision, since=since, until=until, category=category, bbox=bbox
+        )
+    
+    try:
+        bounds = parse_bbox(bbox) if bbox else None
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid bbox: {str(e)}"
+        )
+    
+    return {
+        "precision": precision,
+        "cells": merged_heatmap(db, precision, since, until, category, bounds)
+    }
+
+
+@router.get("/analytics/trends", response_model=TrendsResponse)
+async def get_trends(
+    request: Request,
+    precision: int = Query(5, ge=1, le=ROLLUP_PRECISION),
+    days: int = Query(30, ge=1, le=366),
+    window: int = Query(7, ge=2, le=90),
+    category: Optional[IssueCategory] = None,
+    limit: int = Query(20, ge=1, le=200),
+    db: Optional[Session] = Depends(get_read_db)
+):
+    """
+    Trending areas: daily counts per geohash cell with anomaly scores
+    
+    - **precision**: Geohash length
+    - **days**: Length of the returned series (ending today)
+    - **window**: Days in the moving baseline used for the anomaly score
+    - **category**: Filter by category
+    - **limit**: Number of cells returned, highest current score first
+    """
+    if db is None:
+        return snapshot_response(
+            request, "trends", precision=precision, days=days, window=window, category=category, limit=limit
+        )
+    
+    return {
+        "precision": precision,
+        "window": window,
+        "cells": merged_trends(db, precision, days, window, category, limit)
+    }
+
+
+@router.get("/analytics/sla", response_model=SlaResponse)
+async def get_sla_metrics(
+    request: Request,
+    category: Optional[IssueCategory] = None,
+    db: Optional[Session] = Depends(get_read_db)
+):
+    """
+    Time spent in each status and time to first reach each status, per category
+    
+    Read from precomputed aggregates maintained on every status change.
+    
+    - **category**: Filter by category
+    """
+    if db is None:
+        return snapshot_response(request, "sla", category=category)
+    
+    return {"metrics": merged_sla_report(db, category)}
+
+
+@router.get("/triage", response_model=List[TriageEntry])
+async def get_triage_queue(
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db),
+    current_admin = Depends(get_current_admin_user)
+):
+    """
+    Pending issues in triage order with their current priority and claim (Admin only)
+    """
+    now = datetime.now(timezone.utc)
+    entries = []
+    for entry in triage_snapshot(db, limit):
+        lease_expires_at = entry.lease_expires_at
+        if lease_expires_at is not None and lease_expires_at.tzinfo is None:
+            lease_expires_at = lease_expires_at.replace(tzinfo=timezone.utc)
+        active = entry.claimed_by is not None and lease_expires_at is not None and lease_expires_at > now
+        entries.append({
+            "issue_id": entry.issue_id,
+            "category": entry.category,
+            "priority": current_priority(entry.priority_key, now),
+            "claimed_by": entry.claimed_by if active else None,
+            "lease_expires_at": lease_expires_at if active else None
+        })
+    return entries
+
+
+@router.post(
+    "/triage/claim",
+    response_model=TriageClaimResponse,
+    responses={204: {"description": "Nothing left to triage"}}
+)
+async def claim_triage_issue(
+    request: Request,
+    db: Session = Depends(get_db),
+    current_admin = Depends(get_current_admin_user)
+):
+    """
+    Claim the highest-priority pending issue no other admin is working on (Admin only)
+    
+    The claim lasts TRIAGE_LEASE_SECONDS: changing the issue's status
+    completes it, releasing it or letting the lease expire puts the issue
+    back in the queue. Returns 204 when the queue is empty.
+    """
+    claimed = claim_next_issue(db, current_admin.id)
+    if claimed is None:
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
+    entry, issue = claimed
+    base_url = str(request.base_url).rstrip('/')
+    return {
+        "issue": issue_response_body(issue, base_url),
+        "priority": current_priority(entry.priority_key),
+        "lease_expires_at": entry.lease_expires_at
+    }
+
+
+@router.post("/triage/{issue_id}/release", status_code=status.HTTP_204_NO_CONTENT)
+async def release_triage_issue(
+    issue_id: int,
+    issue_db: Session = Depends(get_issue_db),
+    current_admin = Depends(get_current_admin_user)
+):
+    """
+    Put a claimed issue back in the triage queue (Admin only)
+    """
+    if not release_claim(issue_db, issue_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Issue with id {issue_id} is not in the triage queue"
+        )
+    return None
+
+
+@router.get("/provisional/{provisional_id}", response_model=ProvisionalIssueResponse)
+async def get_provisional_issue(
+    provisional_id: str,
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_active_user)
+):
+    """
+    Resolve the provisional id of a buffered report (INGEST_MODE=buffered)
+    
+    202 with status pending while the report waits in the ingest buffer,
+    then the created issue, or status failed with the reason.
+    """
+    from app.ingest import is_pending
+    from app.models import UserRole
+    receipt = db.get(IngestReceipt, provisional_id)
+    if receipt is None and is_pending(provisional_id):
+        response.status_code = status.HTTP_202_ACCEPTED
+        response.headers["Retry-After"] = "1"
+        return {"provisional_id": provisional_id, "status": "pending"}
+    if receipt is None or (receipt.reporter_id != current_user.id and current_user.role != UserRole.ADMIN):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Report with provisional id {provisional_id} not found"
+        )
+    if receipt.error:
+        return {"provisional_id": provisional_id, "status": "failed", "error": receipt.error}
+    
+    body = None
+    if receipt.issue_id:
+        # The issue is on the shard of its location
+        with open_issue_session(db, receipt.issue_id) as issue_db:
+            issue = issue_db.get(Issue, receipt.issue_id)
+            if issue:
+                body = issue_response_body(issue, str(request.base_url).rstrip('/'))
+    if body is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="The issue created from this report was deleted"
+        )
+    return {"provisional_id": provisional_id, "status": "created", "issue": body}
+
+
 @router.get("/{issue_id}", response_model=IssueResponse)
 async def get_issue_by_id(
     issue_id: int,
     request: Request,
-    db: Session = Depends(get_db)
+    issue_db: Optional[Session] = Depends(get_read_issue_db)
 ):
     """
     Get a specific issue by ID
     """
-    issue = db.query(Issue).filter(Issue.id == issue_id).first()
+    if issue_db is None:
+        return snapshot_response(request, "issue", issue_id=issue_id)
+    
+    # Long-closed issues live in the archive
+    issue = issue_db.query(Issue).filter(Issue.id == issue_id).first() or get_archived_issue(issue_db, issue_id)
     
     if not issue:
         raise HTTPException(
@@ -140,12 +830,36 @@ async def get_issue_by_id(
     return issue
 
 
+@router.get("/{issue_id}/timeline", response_model=IssueTimelineResponse)
+async def get_issue_timeline(
+    issue_id: int,
+    issue_db: Session = Depends(get_issue_db)
+):
+    """
+    Change history of an issue (oldest first) and time spent in each status
+    """
+    issue = issue_db.query(Issue).filter(Issue.id == issue_id).first()
+    
+    if not issue:
+        archived = get_archived_issue(issue_db, issue_id)
+        if archived:
+            return archived_timeline(issue_db, archived)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Issue with id {issue_id} not found"
+        )
+    
+    return timeline(issue_db, issue)
+
+
 @router.patch("/{issue_id}", response_model=IssueResponse)
 async def update_issue(
     issue_id: int,
     issue_update: IssueUpdate,
     request: Request,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
+    issue_db: Session = Depends(get_issue_db),
     current_user = Depends(get_current_active_user)
 ):
     """
@@ -154,7 +868,7 @@ async def update_issue(
     Users can only update their own issues (except status).
     Only admins can update status.
     """
-    issue = db.query(Issue).filter(Issue.id == issue_id).first()
+    issue = issue_db.query(Issue).filter(Issue.id == issue_id).first()
     
     if not issue:
         raise HTTPException(
@@ -183,18 +897,34 @@ async def update_issue(
     
     # Track status change for notifications
     old_status = issue.status
+    old_cell = issue_cell(issue)
+    before = issue_snapshot(issue)
     
     # Update fields
     update_data = issue_update.model_dump(exclude_unset=True)
     for field, value in update_data.items():
         setattr(issue, field, value)
+    if "latitude" in update_data or "longitude" in update_data:
+        issue.zone_id = locate_zone(db, issue.latitude, issue.longitude)
+    
+    # Move the issue between analytics cells if location/category changed
+    new_cell = issue_cell(issue)
+    if new_cell != old_cell:
+        apply_cell_deltas(issue_db, {old_cell: -1, new_cell: 1})
     
-    db.commit()
-    db.refresh(issue)
+    update_triage_queue(issue_db, [issue])
+    record_changes(issue_db, issue, before, current_user.id)
+    track_issue_changes(issue_db, [issue], [(before["category"], before["status"])])
+    issue_db.commit()
+    issue_db.refresh(issue)
     
     # Create notification for status change
     if 'status' in update_data and old_status != issue.status:
         notify_issue_status_change(db, issue, old_status, issue.status)
+        # Subscribers are notified after the response is sent
+        background_tasks.add_task(
+            fan_out_status_change, issue.id, old_status, issue.status, [issue.reporter_id]
+        )
     
     # Convert image path to full URL
     base_url = str(request.base_url).rstrip('/')
@@ -209,13 +939,15 @@ async def update_issue_status(
     issue_id: int,
     new_status: IssueStatus,
     request: Request,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
+    issue_db: Session = Depends(get_issue_db),
     current_admin = Depends(get_current_admin_user)
 ):
     """
     Update issue status (Admin only)
     """
-    issue = db.query(Issue).filter(Issue.id == issue_id).first()
+    issue = issue_db.query(Issue).filter(Issue.id == issue_id).first()
     
     if not issue:
         raise HTTPException(
@@ -224,13 +956,21 @@ async def update_issue_status(
         )
     
     old_status = issue.status
+    before = issue_snapshot(issue)
     issue.status = new_status
-    db.commit()
-    db.refresh(issue)
+    update_triage_queue(issue_db, [issue])
+    record_changes(issue_db, issue, before, current_admin.id)
+    track_issue_changes(issue_db, [issue], [(before["category"], before["status"])])
+    issue_db.commit()
+    issue_db.refresh(issue)
     
     # Create notification for status change
     if old_status != new_status:
         notify_issue_status_change(db, issue, old_status, new_status)
+        # Subscribers are notified after the response is sent
+        background_tasks.add_task(
+            fan_out_status_change, issue.id, old_status, new_status, [issue.reporter_id]
+        )
     
     # Convert image path to full URL
     base_url = str(request.base_url).rstrip('/')
@@ -244,12 +984,13 @@ async def update_issue_status(
 async def delete_issue(
     issue_id: int,
     db: Session = Depends(get_db),
+    issue_db: Session = Depends(get_issue_db),
     current_admin = Depends(get_current_admin_user)
 ):
     """
     Delete an issue (Admin only)
     """
-    issue = db.query(Issue).filter(Issue.id == issue_id).first()
+    issue = issue_db.query(Issue).filter(Issue.id == issue_id).first()
     
     if not issue:
         raise HTTPException(
@@ -261,8 +1002,19 @@ async def delete_issue(
     if issue.image_url:
         delete_image_file(issue.image_url)
     
-    db.delete(issue)
-    db.commit()
+    record_issues(issue_db, [issue], delta=-1)
+    update_triage_queue(issue_db, [issue], removed=True)
+    track_issue_changes(issue_db, [issue], deleted=True)
+    issue_db.execute(delete(IssueEvent).where(IssueEvent.issue_id == issue.id))
+    # Notifications and subscriptions live on the primary (the same
+    # database without sharding); its notifications go with it
+    forget_issue_notifications(db, issue.id)
+    db.execute(delete(Subscription).where(Subscription.issue_id == issue.id))
+    if issue_db is not db:
+        db.execute(delete(Notification).where(Notification.issue_id == issue.id))
+        db.commit()
+    issue_db.delete(issue)
+    issue_db.commit()
     
     return None
 
@@ -8,6 +8,7 @@ from app.database import get_db
 from app.models import Notification
 from app.schemas import NotificationResponse
 from app.utils import get_current_active_user
+from app.notification_service import adjust_unread_count, unread_count_for_user
 
 router = APIRouter()
 
@@ -48,13 +49,9 @@ async def get_unread_count(
 ):
     """
     Get count of unread notifications for current user
+    (read from the per-user counter, no COUNT over notifications)
     """
-    count = db.query(Notification).filter(
-        Notification.user_id == current_user.id,
-        Notification.is_read == False
-    ).count()
-    
-    return {"unread_count": count}
+    return {"unread_count": unread_count_for_user(db, current_user.id)}
 
 
 @router.put("/{notification_id}/read", response_model=NotificationResponse)
@@ -77,9 +74,15 @@ async def mark_notification_as_read(
             detail="Notification not found"
         )
     
-    notification.is_read = True
-    db.commit()
-    db.refresh(notification)
+    if not notification.is_read:
+        # Conditional update so concurrent requests decrement only once
+        updated = db.query(Notification).filter(
+            Notification.id == notification.id,
+            Notification.is_read == False
+        ).update({"is_read": True}, synchronize_session=False)
+        adjust_unread_count(db, current_user.id, -updated)
+        db.commit()
+        db.refresh(notification)
     
     return notification
 
@@ -96,6 +99,7 @@ async def mark_all_as_read(
         Notification.user_id == current_user.id,
         Notification.is_read == False
     ).update({"is_read": True})
+    adjust_unread_count(db, current_user.id, -updated)
     
     db.commit()
     
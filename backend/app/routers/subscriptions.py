@@ -0,0 +1,142 @@
+"""
+Subscription endpoints (follow issues, categories or areas)
+"""
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from typing import List
+import os
+from app.database import get_db
+from app.models import Issue, Subscription, SubscriptionKind
+from app.schemas import SubscriptionCreate, SubscriptionResponse
+from app.utils import get_current_active_user
+from app.subscription_service import create_subscription
+from app.sharding import open_issue_session
+
+router = APIRouter()
+
+MAX_SUBSCRIPTIONS_PER_USER = int(os.getenv("MAX_SUBSCRIPTIONS_PER_USER", "100"))
+MIN_AREA_RADIUS_M = float(os.getenv("MIN_AREA_RADIUS_M", "50"))
+MAX_AREA_RADIUS_M = float(os.getenv("MAX_AREA_RADIUS_M", "50000"))
+
+
+@router.get("/", response_model=List[SubscriptionResponse])
+async def get_user_subscriptions(
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_active_user)
+):
+    """
+    Get subscriptions of the current user
+    """
+    return db.query(Subscription).filter(
+        Subscription.user_id == current_user.id
+    ).order_by(Subscription.created_at.desc()).all()
+
+
+@router.post("/", response_model=SubscriptionResponse, status_code=status.HTTP_201_CREATED)
+async def subscribe(
+    subscription: SubscriptionCreate,
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_active_user)
+):
+    """
+    Subscribe to status changes
+
+    - **kind=issue**: requires issue_id
+    - **kind=category**: requires category
+    - **kind=area**: requires latitude, longitude and radius_m
+    """
+    query = db.query(Subscription).filter(
+        Subscription.user_id == current_user.id,
+        Subscription.kind == subscription.kind
+    )
+
+    if subscription.kind == SubscriptionKind.ISSUE:
+        if subscription.issue_id is None:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="issue_id is required for issue subscriptions"
+            )
+        with open_issue_session(db, subscription.issue_id) as issue_db:
+            exists = issue_db.query(Issue.id).filter(Issue.id == subscription.issue_id).first()
+        if not exists:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Issue with id {subscription.issue_id} not found"
+            )
+        query = query.filter(Subscription.issue_id == subscription.issue_id)
+    elif subscription.kind == SubscriptionKind.CATEGORY:
+        if subscription.category is None:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="category is required for category subscriptions"
+            )
+        query = query.filter(Subscription.category == subscription.category)
+    else:
+        if None in (subscription.latitude, subscription.longitude, subscription.radius_m):
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="latitude, longitude and radius_m are required for area subscriptions"
+            )
+        if not (-90 <= subscription.latitude <= 90 and -180 <= subscription.longitude <= 180):
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Invalid coordinates"
+            )
+        if not MIN_AREA_RADIUS_M <= subscription.radius_m <= MAX_AREA_RADIUS_M:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"radius_m must be between {MIN_AREA_RADIUS_M:g} and {MAX_AREA_RADIUS_M:g}"
+            )
+        query = query.filter(
+            Subscription.latitude == subscription.latitude,
+            Subscription.longitude == subscription.longitude,
+            Subscription.radius_m == subscription.radius_m
+        )
+
+    existing = query.first()
+    if existing:
+        return existing
+
+    count = db.query(Subscription).filter(Subscription.user_id == current_user.id).count()
+    if count >= MAX_SUBSCRIPTIONS_PER_USER:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Subscription limit of {MAX_SUBSCRIPTIONS_PER_USER} reached"
+        )
+
+    return create_subscription(
+        db,
+        user_id=current_user.id,
+        kind=subscription.kind,
+        issue_id=subscription.issue_id,
+        category=subscription.category,
+        latitude=subscription.latitude,
+        longitude=subscription.longitude,
+        radius_m=subscription.radius_m
+    )
+
+
+@router.delete("/{subscription_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def unsubscribe(
+    subscription_id: int,
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_active_user)
+):
+    """
+    Delete a subscription of the current user
+    """
+    subscription = db.query(Subscription).filter(
+        Subscription.id == subscription_id,
+        Subscription.user_id == current_user.id
+    ).first()
+
+    if not subscription:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Subscription not found"
+        )
+
+    db.delete(subscription)
+    db.commit()
+
+    return None
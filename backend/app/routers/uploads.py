@@ -0,0 +1,134 @@
+"""
+Resumable upload endpoints (tus 1.0)
+
+    POST   /api/uploads/       Upload-Length, Upload-Metadata (filename, filetype)
+    HEAD   /api/uploads/{id}   current Upload-Offset
+    PATCH  /api/uploads/{id}   Upload-Offset + application/offset+octet-stream body
+    DELETE /api/uploads/{id}   abandon the upload
+
+Attach a finished upload with POST /api/issues/?upload_id={id}.
+"""
+import time
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response, status
+from sqlalchemy.orm import Session
+from starlette.requests import ClientDisconnect
+from typing import Optional
+from app.database import get_db
+from app.file_utils import MAX_FILE_SIZE
+from app.rate_limit import create_upload_rate_limit
+from app.uploads import (
+    TUS_EXTENSIONS,
+    TUS_VERSION,
+    UPLOAD_SESSION_TTL_SECONDS,
+    create_session,
+    delete_session,
+    get_session,
+    http_date,
+    parse_metadata,
+    write_chunk
+)
+from app.utils import get_current_active_user, rate_limited_user
+
+router = APIRouter()
+
+
+def tus_headers(**headers) -> dict:
+    return {"Tus-Resumable": TUS_VERSION, **{name.replace("_", "-"): str(value) for name, value in headers.items()}}
+
+
+def check_tus_version(tus_resumable: Optional[str] = Header(None)) -> None:
+    if tus_resumable is not None and tus_resumable != TUS_VERSION:
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail=f"Unsupported Tus-Resumable version (supported: {TUS_VERSION})",
+            headers={"Tus-Version": TUS_VERSION}
+        )
+
+
+@router.options("/")
+async def upload_options():
+    """
+    Supported protocol version, extensions and maximum size
+    """
+    return Response(status_code=status.HTTP_204_NO_CONTENT, headers=tus_headers(
+        Tus_Version=TUS_VERSION, Tus_Extension=TUS_EXTENSIONS, Tus_Max_Size=MAX_FILE_SIZE
+    ))
+
+
+@router.post("/", status_code=status.HTTP_201_CREATED, dependencies=[Depends(check_tus_version)])
+async def create_upload(
+    upload_length: int = Header(...),
+    upload_metadata: Optional[str] = Header(None),
+    current_user = Depends(rate_limited_user(create_upload_rate_limit))
+):
+    """
+    Start a resumable image upload
+
+    - **Upload-Length** (header): Total size in bytes
+    - **Upload-Metadata** (header): "filename <base64>,filetype <base64>"
+    """
+    session = create_session(current_user.id, upload_length, parse_metadata(upload_metadata))
+    return Response(status_code=status.HTTP_201_CREATED, headers=tus_headers(
+        Location=f"/api/uploads/{session.upload_id}",
+        Upload_Offset=0,
+        Upload_Expires=http_date(session.expires_at)
+    ))
+
+
+@router.head("/{upload_id}", dependencies=[Depends(check_tus_version)])
+async def get_upload_offset(upload_id: str, current_user = Depends(get_current_active_user)):
+    """
+    How many bytes of the upload the server has (resume from there)
+    """
+    session = get_session(upload_id, current_user.id)
+    return Response(status_code=status.HTTP_200_OK, headers=tus_headers(
+        Upload_Offset=session.offset,
+        Upload_Length=session.length,
+        Upload_Expires=http_date(session.expires_at),
+        Cache_Control="no-store"
+    ))
+
+
+@router.patch("/{upload_id}", dependencies=[Depends(check_tus_version)])
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    upload_offset: int = Header(...),
+    content_type: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_active_user)
+):
+    """
+    Write the request body at Upload-Offset
+
+    The offset must equal the current one (409 otherwise). Bytes received
+    before a dropped connection are kept.
+    """
+    if content_type != "application/offset+octet-stream":
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Content-Type must be application/offset+octet-stream"
+        )
+    session = get_session(upload_id, current_user.id)
+
+    # A chunk can take long on a slow link: don't pin a pooled connection
+    db.close()
+
+    try:
+        offset = await write_chunk(session, upload_offset, request.stream())
+    except ClientDisconnect:
+        # Nobody to answer; the client resumes from HEAD
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
+    return Response(status_code=status.HTTP_204_NO_CONTENT, headers=tus_headers(
+        Upload_Offset=offset,
+        Upload_Expires=http_date(time.time() + UPLOAD_SESSION_TTL_SECONDS)
+    ))
+
+
+@router.delete("/{upload_id}", status_code=status.HTTP_204_NO_CONTENT, dependencies=[Depends(check_tus_version)])
+async def delete_upload(upload_id: str, current_user = Depends(get_current_active_user)):
+    """
+    Abandon an upload and delete its bytes
+    """
+    delete_session(get_session(upload_id, current_user.id))
+    return Response(status_code=status.HTTP_204_NO_CONTENT, headers=tus_headers())
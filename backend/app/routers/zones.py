@@ -0,0 +1,74 @@
+"""
+Administrative zone endpoints: list, locate, per-zone issue stats
+"""
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from app.database import get_db
+from app.models import IssueCategory, IssueStatus, Zone
+from app.schemas import ZoneDetail, ZoneLocation, ZoneResponse, ZoneStatsResponse
+from app.zones import locate_zone
+from app.shard_queries import zone_issue_counts
+
+router = APIRouter()
+
+
+@router.get("/", response_model=List[ZoneResponse])
+async def get_zones(db: Session = Depends(get_db)):
+    """
+    Get all zones (without geometry)
+    """
+    return db.query(Zone).order_by(Zone.name).all()
+
+
+@router.get("/locate", response_model=ZoneLocation)
+async def get_zone_at(
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180),
+    db: Session = Depends(get_db)
+):
+    """
+    Get the zone containing a point
+    """
+    zone_id = locate_zone(db, latitude, longitude)
+    return {"zone": db.get(Zone, zone_id) if zone_id is not None else None}
+
+
+@router.get("/stats", response_model=ZoneStatsResponse)
+async def get_zone_stats(
+    zone_id: Optional[int] = None,
+    category: Optional[IssueCategory] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Issue counts per zone by status and category
+
+    - **zone_id**: Only this zone
+    - **category**: Only issues of this category
+    """
+    zones = {}
+    for row_zone_id, issue_status, issue_category, count in zone_issue_counts(db, zone_id, category):
+        stats = zones.setdefault(row_zone_id, {
+            "zone_id": row_zone_id,
+            "total": 0,
+            "by_status": {value: 0 for value in IssueStatus},
+            "by_category": {value: 0 for value in IssueCategory}
+        })
+        stats["total"] += count
+        stats["by_status"][issue_status] += count
+        stats["by_category"][issue_category] += count
+    return {"zones": sorted(zones.values(), key=lambda stats: (stats["zone_id"] is None, stats["zone_id"] or 0))}
+
+
+@router.get("/{zone_id}", response_model=ZoneDetail)
+async def get_zone(zone_id: int, db: Session = Depends(get_db)):
+    """
+    Get a zone with its GeoJSON geometry
+    """
+    zone = db.get(Zone, zone_id)
+    if not zone:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Zone with id {zone_id} not found"
+        )
+    return zone
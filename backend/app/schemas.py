@@ -2,10 +2,10 @@
 Pydantic schemas for request/response validation
 Will be used in authentication and CRUD endpoints
 """
-from pydantic import BaseModel, EmailStr
-from typing import Optional
-from datetime import datetime
-from app.models import UserRole, IssueCategory, IssueStatus
+from pydantic import BaseModel, EmailStr, Field
+from typing import Any, Dict, List, Optional
+from datetime import date, datetime
+from app.models import UserRole, IssueCategory, IssueStatus, IssueEventType, SubscriptionKind
 
 # User Schemas
 class UserBase(BaseModel):
@@ -27,6 +27,11 @@ class UserResponse(UserBase):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None  # access token lifetime in seconds
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
 
 class TokenData(BaseModel):
     user_id: Optional[int] = None
@@ -64,10 +69,115 @@ class IssueResponse(IssueBase):
     created_at: datetime
     updated_at: Optional[datetime] = None
     reporter_id: int
+    zone_id: Optional[int] = None
+    
+    class Config:
+        from_attributes = True
+
+class ProvisionalIssueResponse(BaseModel):
+    provisional_id: str
+    status: str  # pending, created or failed
+    issue: Optional[IssueResponse] = None
+    error: Optional[str] = None
+
+class TriageEntry(BaseModel):
+    issue_id: int
+    category: IssueCategory
+    priority: float  # current score: category + nearby report density + age
+    claimed_by: Optional[int] = None
+    lease_expires_at: Optional[datetime] = None
+
+class TriageClaimResponse(BaseModel):
+    issue: IssueResponse
+    priority: float
+    lease_expires_at: datetime
+
+class IssueChangesResponse(BaseModel):
+    issues: List[IssueResponse]  # created or updated since the token
+    deleted: List[int]  # ids of issues deleted since the token
+    sync_token: str  # pass as ?since= on the next call
+    has_more: bool
+
+# Batch (offline sync) Schemas
+class IssueBatchItem(IssueCreate):
+    # Per-report idempotency key generated on the device (stored as
+    # "batch:<client_id>" in the 255-character idempotency key column)
+    client_id: Optional[str] = Field(None, max_length=249)
+    image: Optional[str] = None  # name of the multipart field holding the image
+    upload_id: Optional[str] = None  # finished resumable upload (POST /api/uploads/)
+
+class IssueBatchResult(BaseModel):
+    index: int
+    client_id: Optional[str] = None
+    status: str  # created, duplicate or error
+    issue: Optional[IssueResponse] = None
+    error: Optional[str] = None
+
+class IssueBatchResponse(BaseModel):
+    created: int
+    duplicates: int
+    errors: int
+    results: List[IssueBatchResult]
+
+# Analytics Schemas
+class HeatmapCell(BaseModel):
+    geohash: str
+    latitude: float
+    longitude: float
+    count: int
+
+class HeatmapResponse(BaseModel):
+    precision: int
+    cells: List[HeatmapCell]
+
+class TrendPoint(BaseModel):
+    day: date
+    count: int
+    score: float
+
+class TrendCell(BaseModel):
+    geohash: str
+    latitude: float
+    longitude: float
+    total: int
+    score: float
+    series: List[TrendPoint]
+
+class TrendsResponse(BaseModel):
+    precision: int
+    window: int
+    cells: List[TrendCell]
+
+# Event log / SLA Schemas
+class IssueEventResponse(BaseModel):
+    id: int
+    event_type: IssueEventType
+    actor_id: Optional[int] = None
+    from_status: Optional[IssueStatus] = None
+    to_status: Optional[IssueStatus] = None
+    changes: Optional[Dict[str, List[Any]]] = None
+    created_at: datetime
     
     class Config:
         from_attributes = True
 
+class IssueTimelineResponse(BaseModel):
+    issue_id: int
+    status: IssueStatus
+    events: List[IssueEventResponse]
+    time_in_status: Dict[str, float]  # seconds per status, including the current one
+
+class SlaMetric(BaseModel):
+    category: IssueCategory
+    status: IssueStatus
+    metric: str  # time_in_status or time_to_status
+    samples: int
+    average_seconds: float
+    max_seconds: float
+
+class SlaResponse(BaseModel):
+    metrics: List[SlaMetric]
+
 # Notification Schemas
 class NotificationBase(BaseModel):
     title: str
@@ -87,3 +197,52 @@ class NotificationResponse(NotificationBase):
     class Config:
         from_attributes = True
 
+# Subscription Schemas
+class SubscriptionCreate(BaseModel):
+    kind: SubscriptionKind
+    issue_id: Optional[int] = None  # kind=issue
+    category: Optional[IssueCategory] = None  # kind=category
+    latitude: Optional[float] = None  # kind=area
+    longitude: Optional[float] = None
+    radius_m: Optional[float] = None
+
+class SubscriptionResponse(BaseModel):
+    id: int
+    kind: SubscriptionKind
+    issue_id: Optional[int] = None
+    category: Optional[IssueCategory] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    radius_m: Optional[float] = None
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+# Zone Schemas
+class ZoneResponse(BaseModel):
+    id: int
+    code: str
+    name: str
+    min_lon: float
+    min_lat: float
+    max_lon: float
+    max_lat: float
+    
+    class Config:
+        from_attributes = True
+
+class ZoneDetail(ZoneResponse):
+    geometry: Dict[str, Any]  # GeoJSON Polygon or MultiPolygon
+
+class ZoneLocation(BaseModel):
+    zone: Optional[ZoneResponse] = None  # None outside all zones
+
+class ZoneStats(BaseModel):
+    zone_id: Optional[int] = None  # None: issues outside all zones
+    total: int
+    by_status: Dict[IssueStatus, int]
+    by_category: Dict[IssueCategory, int]
+
+class ZoneStatsResponse(BaseModel):
+    zones: List[ZoneStats]
@@ -0,0 +1,239 @@
+"""
+Issue reads across shards (see app/sharding.py)
+
+Each function takes the request's session on the primary and answers like
+its single-database counterpart: without sharding it runs that query on the
+given session, with sharding the query runs on every shard in parallel and
+the partial results are merged:
+
+- lists: each shard returns its first skip + limit issues newest first (only
+  their sort keys for deeper pages), the streams are merge-sorted on
+  created_at
+- heatmaps / trends / SLA: counts and sums are added up per cell or metric
+- change feeds: one sequence number per shard in the sync token
+"""
+import heapq
+from datetime import date, datetime, timezone
+from typing import List, Optional, Tuple
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from app.analytics import coarsen_cells, heatmap, rank_trends, trend_counts, trend_range, trends
+from app.issue_events import sla_metrics, sla_report, sla_summary
+from app.models import Issue, IssueCategory, IssueSlaMetric, IssueStatus, TriageQueueEntry
+from app.sharding import SHARDING_ENABLED, scatter, shard_count, shard_session
+from app.sync import (
+    changes_since,
+    decode_sync_token,
+    decode_sync_tokens,
+    encode_sync_token,
+    encode_sync_tokens,
+    list_last_modified
+)
+from app.triage import claim_next, next_claimable_priority, queue_snapshot
+
+
+def _as_utc(value: Optional[datetime]) -> datetime:
+    # SQLite returns naive datetimes; everything is stored in UTC
+    if value is None:
+        return datetime.min.replace(tzinfo=timezone.utc)
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _feed_query(
+    db: Session,
+    category: Optional[IssueCategory],
+    issue_status: Optional[IssueStatus],
+    zone_id: Optional[int]
+):
+    query = db.query(Issue)
+    if category:
+        query = query.filter(Issue.category == category)
+    if issue_status:
+        query = query.filter(Issue.status == issue_status)
+    if zone_id is not None:
+        query = query.filter(Issue.zone_id == zone_id)
+    # Newest first
+    return query.order_by(Issue.created_at.desc())
+
+
+def latest_issues(
+    db: Session,
+    skip: int,
+    limit: int,
+    category: Optional[IssueCategory] = None,
+    issue_status: Optional[IssueStatus] = None,
+    zone_id: Optional[int] = None
+) -> List[Issue]:
+    """A page of issues newest first"""
+    if not SHARDING_ENABLED:
+        return _feed_query(db, category, issue_status, zone_id).offset(skip).limit(limit).all()
+
+    if not skip:
+        pages = scatter(lambda shard_db: _feed_query(shard_db, category, issue_status, zone_id)
+                        .order_by(Issue.id.desc()).limit(limit).all())
+        merged = heapq.merge(*pages, key=lambda issue: (_as_utc(issue.created_at), issue.id), reverse=True)
+        return [issue for _, issue in zip(range(limit), merged)]
+
+    # Deep pages: merge the sort keys of skip + limit rows per shard, then
+    # load only the rows of the page
+    keys = scatter(lambda shard_db: [
+        (_as_utc(created_at), issue_id)
+        for created_at, issue_id in _feed_query(shard_db, category, issue_status, zone_id)
+        .order_by(Issue.id.desc()).with_entities(Issue.created_at, Issue.id).limit(skip + limit)
+    ])
+    page = [key[1] for _, key in zip(range(skip + limit), heapq.merge(*keys, reverse=True))][skip:]
+    if not page:
+        return []
+    issues = {
+        issue.id: issue
+        for shard_issues in scatter(lambda shard_db: shard_db.query(Issue).filter(Issue.id.in_(page)).all())
+        for issue in shard_issues
+    }
+    return [issues[issue_id] for issue_id in page if issue_id in issues]
+
+
+def last_modified(
+    db: Session,
+    category: Optional[IssueCategory] = None,
+    issue_status: Optional[IssueStatus] = None
+) -> Optional[datetime]:
+    """list_last_modified() of all shards"""
+    if not SHARDING_ENABLED:
+        return list_last_modified(db, category, issue_status)
+    stamps = [stamp for stamp in scatter(lambda shard_db: list_last_modified(shard_db, category, issue_status)) if stamp]
+    return max(stamps) if stamps else None
+
+
+def merged_heatmap(
+    db: Session,
+    precision: int = 5,
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    category: Optional[IssueCategory] = None,
+    bbox: Optional[tuple] = None
+) -> List[dict]:
+    if not SHARDING_ENABLED:
+        return heatmap(db, precision, since, until, category, bbox)
+    cells = scatter(lambda shard_db: heatmap(shard_db, precision, since, until, category, bbox))
+    return coarsen_cells((cell for shard_cells in cells for cell in shard_cells), precision)
+
+
+def merged_trends(
+    db: Session,
+    precision: int = 5,
+    days: int = 30,
+    window: int = 7,
+    category: Optional[IssueCategory] = None,
+    limit: int = 20
+) -> List[dict]:
+    if not SHARDING_ENABLED:
+        return trends(db, precision, days, window, category, limit)
+    start, end = trend_range(days, window)
+    rows = scatter(lambda shard_db: trend_counts(shard_db, precision, start, end, category))
+    return rank_trends([row for shard_rows in rows for row in shard_rows], start, days, window, limit)
+
+
+def merged_sla_report(db: Session, category: Optional[IssueCategory] = None) -> List[dict]:
+    if not SHARDING_ENABLED:
+        return sla_report(db, category)
+    merged = {}
+    for metrics in scatter(lambda shard_db: sla_metrics(shard_db, category)):
+        for metric in metrics:
+            key = (metric.category, metric.status, metric.metric)
+            total = merged.get(key)
+            if total is None:
+                merged[key] = IssueSlaMetric(
+                    category=metric.category,
+                    status=metric.status,
+                    metric=metric.metric,
+                    samples=metric.samples,
+                    total_seconds=metric.total_seconds,
+                    max_seconds=metric.max_seconds
+                )
+                continue
+            total.samples += metric.samples
+            total.total_seconds += metric.total_seconds
+            total.max_seconds = max(total.max_seconds, metric.max_seconds)
+    # The order of sla_metrics() (enums are stored by name)
+    return sla_summary(sorted(merged.values(), key=lambda m: (m.category.name, m.metric, m.status.name)))
+
+
+def zone_issue_counts(
+    db: Session,
+    zone_id: Optional[int] = None,
+    category: Optional[IssueCategory] = None
+) -> List[tuple]:
+    """(zone_id, status, category, count) rows; a combination may repeat (one row per shard)"""
+    def counts(shard_db: Session) -> List[tuple]:
+        query = select(Issue.zone_id, Issue.status, Issue.category, func.count(Issue.id))
+        if zone_id is not None:
+            query = query.where(Issue.zone_id == zone_id)
+        if category:
+            query = query.where(Issue.category == category)
+        return [tuple(row) for row in shard_db.execute(query.group_by(Issue.zone_id, Issue.status, Issue.category))]
+
+    if not SHARDING_ENABLED:
+        return counts(db)
+    return [row for rows in scatter(counts) for row in rows]
+
+
+def triage_snapshot(db: Session, limit: int) -> List[TriageQueueEntry]:
+    """queue_snapshot() of all shards"""
+    if not SHARDING_ENABLED:
+        return queue_snapshot(db, limit)
+    queues = scatter(lambda shard_db: queue_snapshot(shard_db, limit))
+    merged = heapq.merge(*queues, key=lambda entry: (-entry.priority_key, entry.issue_id))
+    return [entry for _, entry in zip(range(limit), merged)]
+
+
+def claim_next_issue(db: Session, admin_id: int) -> Optional[Tuple[TriageQueueEntry, Issue]]:
+    """
+    claim_next() on the shard whose best claimable issue has the highest
+    priority (the next shards if another admin was faster)
+
+    Returns:
+        (claimed entry, its issue) or None if nothing is claimable
+    """
+    if not SHARDING_ENABLED:
+        entry = claim_next(db, admin_id)
+        return (entry, db.get(Issue, entry.issue_id)) if entry else None
+
+    heads = scatter(next_claimable_priority)
+    for shard in sorted((shard for shard, key in enumerate(heads) if key is not None), key=lambda s: -heads[s]):
+        with shard_session(db, shard) as shard_db:
+            entry = claim_next(shard_db, admin_id)
+            if entry is not None:
+                # entry.issue_id reloads the committed entry: both stay usable once the session is closed
+                return entry, shard_db.get(Issue, entry.issue_id)
+    return None
+
+
+def issue_changes(db: Session, token: Optional[str], limit: int) -> Tuple[List[Issue], List[int], str, bool]:
+    """
+    changes_since() of all shards, filled up to limit one shard after the
+    other
+
+    Returns:
+        (changed issues, deleted issue ids, next sync token, has more)
+    """
+    if not SHARDING_ENABLED:
+        issues, deleted, last_seq, has_more = changes_since(db, decode_sync_token(token), limit)
+        return issues, deleted, encode_sync_token(last_seq), has_more
+
+    seqs = decode_sync_tokens(token, shard_count())
+    issues: List[Issue] = []
+    deleted: List[int] = []
+    has_more = False
+    for shard in range(shard_count()):
+        remaining = limit - len(issues) - len(deleted)
+        if remaining <= 0:
+            has_more = True
+            break
+        with shard_session(db, shard) as shard_db:
+            shard_issues, shard_deleted, seqs[shard], more = changes_since(shard_db, seqs[shard], remaining)
+        issues.extend(shard_issues)
+        deleted.extend(shard_deleted)
+        has_more = has_more or more
+    return issues, deleted, encode_sync_tokens(seqs), has_more
@@ -0,0 +1,636 @@
+"""
+Regional sharding of issues across several databases
+
+DATABASE_URL stays the primary database: users, sessions, zones,
+notifications and subscriptions only live there. With SHARD_URLS set, issues
+and everything kept per issue (events, rollups, SLA metrics, triage queue,
+change log, list stamps, archive, idempotency records of created issues) are
+split over the primary (shard 0) and the listed databases (shards 1..N):
+
+- A new issue goes to the shard of its region: the geohash prefix of
+  SHARD_GEOHASH_PRECISION characters, or its zone with SHARD_REGION=zone.
+  Regions pinned in shard_regions go where pinned, the others are spread by
+  a hash of the region.
+- Ids encode the shard: shard k allocates ids from k << SHARD_ID_BITS, so
+  single-issue routes open a session on the right database without a
+  directory. Issues moved by rebalancing keep their id; shard_relocations
+  records where they went.
+- Lists, stats, maps and exports ask every shard in parallel and merge the
+  results (app/shard_queries.py).
+
+Nothing is committed atomically across databases: moves copy first, then
+record the relocation, then delete, so a crash at any point leaves the issue
+readable and re-running the move finishes it.
+
+Create the shard schemas (also done at startup), inspect the distribution,
+pin a region to a shard and move its issues, or even out the shards:
+    python -m app.sharding init
+    python -m app.sharding status
+    python -m app.sharding move <region> <shard>
+    python -m app.sharding rebalance [--apply]
+"""
+import os
+import threading
+import time
+import zlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+from dotenv import load_dotenv
+from fastapi import Depends
+from sqlalchemy import delete, func, insert, inspect, select, text, update
+from sqlalchemy.orm import Session, sessionmaker
+from app.analytics import encode_geohash, geohash_bounds, record_issues
+from app.database import Base, SessionLocal, create_db_engine, get_db, get_read_db, init_engine, upgrade_schema
+from app.models import (
+    Issue,
+    IssueArchive,
+    IssueEvent,
+    IssueIdCounter,
+    IssueRollup,
+    ShardRegion,
+    ShardRelocation,
+    TriageQueueEntry
+)
+from app.sync import forget_issue_changes, track_issue_changes
+
+load_dotenv()
+
+# Databases of shards 1..N (comma separated URLs); empty: no sharding
+SHARD_URLS = [url.strip() for url in os.getenv("SHARD_URLS", "").split(",") if url.strip()]
+SHARDING_ENABLED = bool(SHARD_URLS)
+# Ids per shard = 2 ** SHARD_ID_BITS (26: 67M issues per shard, 32 shards
+# within 32-bit ids). Never change it once issues exist.
+SHARD_ID_BITS = int(os.getenv("SHARD_ID_BITS", "26"))
+# Region of an issue: "geohash" (prefix of SHARD_GEOHASH_PRECISION
+# characters, 3 ~ 156km x 156km) or "zone" (administrative zone)
+SHARD_REGION = os.getenv("SHARD_REGION", "geohash").lower()
+SHARD_GEOHASH_PRECISION = int(os.getenv("SHARD_GEOHASH_PRECISION", "3"))
+# How often workers look for regions pinned elsewhere
+SHARD_MAP_CHECK_SECONDS = float(os.getenv("SHARD_MAP_CHECK_SECONDS", "30"))
+# Threads per worker running the per-shard queries of one request
+SHARD_SCATTER_WORKERS = int(os.getenv("SHARD_SCATTER_WORKERS", "8"))
+SHARD_MOVE_BATCH_SIZE = int(os.getenv("SHARD_MOVE_BATCH_SIZE", "500"))
+# rebalance stops when no shard is further than this from the mean load
+SHARD_REBALANCE_TOLERANCE = float(os.getenv("SHARD_REBALANCE_TOLERANCE", "0.1"))
+
+# Tables living on every shard; the rest only on the primary. Foreign keys
+# between the two groups can't hold across databases.
+SHARDED_TABLES = {
+    "issues",
+    "issues_archive",
+    "issue_events",
+    "issue_rollups",
+    "issue_sla_metrics",
+    "triage_queue",
+    "triage_cells",
+    "issue_changes",
+    "issue_changes_pending",
+    "issue_list_stamps",
+    "idempotency_keys",
+    "issue_id_counters",
+}
+
+T = TypeVar("T")
+
+_lock = threading.Lock()
+_sessionmakers: Dict[int, sessionmaker] = {}
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _reset_after_fork() -> None:
+    # Same as database.py: the child builds its own pools (and threads)
+    global _executor
+    for factory in _sessionmakers.values():
+        factory.kw["bind"].dispose(close=False)
+    _sessionmakers.clear()
+    _executor = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+# --- Shards --------------------------------------------------------------------
+
+def shard_count() -> int:
+    return 1 + len(SHARD_URLS)
+
+
+def shard_sessionmaker(shard: int) -> sessionmaker:
+    """Session factory of a shard (shard 0: the primary's SessionLocal)"""
+    if shard == 0:
+        init_engine()
+        return SessionLocal
+    with _lock:
+        factory = _sessionmakers.get(shard)
+        if factory is None:
+            factory = sessionmaker(
+                autocommit=False,
+                autoflush=False,
+                bind=create_db_engine(SHARD_URLS[shard - 1]),
+                info={"shard": shard}
+            )
+            _sessionmakers[shard] = factory
+        return factory
+
+
+def shard_sessionmakers() -> List[sessionmaker]:
+    return [shard_sessionmaker(shard) for shard in range(shard_count())]
+
+
+def dispose_shard_engines() -> None:
+    with _lock:
+        for factory in _sessionmakers.values():
+            factory.kw["bind"].dispose()
+        _sessionmakers.clear()
+
+
+def for_each_shard(func: Callable[[Session], T], primary: Optional[Session] = None) -> List[T]:
+    """
+    Run func(session) on every shard in turn, each with its own session
+    (shard 0 uses `primary` if given); just the primary without sharding
+    """
+    results = []
+    for shard in range(shard_count()):
+        if shard == 0 and primary is not None:
+            results.append(func(primary))
+            continue
+        db = shard_sessionmaker(shard)()
+        try:
+            results.append(func(db))
+        finally:
+            db.close()
+    return results
+
+
+def scatter(func: Callable[[Session], T]) -> List[T]:
+    """for_each_shard() with the shards queried in parallel (results in shard order)"""
+    global _executor
+
+    def run(shard: int) -> T:
+        db = shard_sessionmaker(shard)()
+        try:
+            return func(db)
+        finally:
+            db.close()
+
+    if shard_count() == 1:
+        return [run(0)]
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(SHARD_SCATTER_WORKERS, thread_name_prefix="shard-scatter")
+    return list(_executor.map(run, range(shard_count())))
+
+
+# --- Ids -----------------------------------------------------------------------
+
+def shard_id_floor(shard: int) -> int:
+    """Ids of shard `shard` are allocated above this"""
+    return shard << SHARD_ID_BITS
+
+
+def home_shard(issue_id: int) -> int:
+    """Shard an issue id was allocated on"""
+    return issue_id >> SHARD_ID_BITS
+
+
+def ensure_id_counter(db: Session, shard: int) -> None:
+    """
+    Create the id counter of a shard database (commits); refuses a database
+    that already belongs to another shard (SHARD_URLS reordered)
+    """
+    counters = dict(db.execute(select(IssueIdCounter.shard, IssueIdCounter.last_id)).all())
+    if set(counters) - {shard}:
+        raise RuntimeError(
+            f"Database of shard {shard} holds the issues of shard {min(set(counters) - {shard})}: "
+            "SHARD_URLS must keep its order"
+        )
+    if shard in counters:
+        return
+    floor, ceiling = shard_id_floor(shard), shard_id_floor(shard + 1)
+    # Ids used before sharding (primary) or by earlier runs stay used
+    used = [
+        db.scalar(select(func.max(model.id)).where(model.id >= floor, model.id < ceiling))
+        for model in (Issue, IssueArchive)
+    ]
+    db.add(IssueIdCounter(shard=shard, last_id=max([floor, *(value for value in used if value)])))
+    db.commit()
+
+
+def allocate_issue_ids(db: Session, shard: int, count: int) -> List[int]:
+    """
+    Reserve `count` ids in a shard's range (part of the caller's transaction,
+    rolled back with it)
+
+    Explicit ids instead of the database's autoincrement: relocated issues
+    keep ids from other ranges, which SQLite would continue from.
+    """
+    last_id = db.execute(
+        update(IssueIdCounter)
+        .where(IssueIdCounter.shard == shard)
+        .values(last_id=IssueIdCounter.last_id + count)
+        .returning(IssueIdCounter.last_id)
+    ).scalar_one()
+    if last_id >= shard_id_floor(shard + 1):
+        raise RuntimeError(f"Shard {shard} has used up its id range (SHARD_ID_BITS={SHARD_ID_BITS})")
+    return list(range(last_id - count + 1, last_id + 1))
+
+
+def with_issue_ids(db: Session, rows: List[dict]) -> List[dict]:
+    """Issue rows to insert on the shard of db, with ids allocated in its range when sharded"""
+    if not SHARDING_ENABLED:
+        return rows
+    ids = allocate_issue_ids(db, db.info.get("shard", 0), len(rows))
+    return [dict(row, id=issue_id) for row, issue_id in zip(rows, ids)]
+
+
+def _drop_cross_database_foreign_keys(db: Session) -> int:
+    """Drop foreign keys between sharded and primary-only tables (PostgreSQL)"""
+    bind = db.get_bind()
+    if bind.dialect.name != "postgresql":
+        return 0  # SQLite doesn't enforce them here (PRAGMA foreign_keys is off)
+    inspector = inspect(bind)
+    dropped = 0
+    for table in inspector.get_table_names():
+        for foreign_key in inspector.get_foreign_keys(table):
+            if (table in SHARDED_TABLES) != (foreign_key["referred_table"] in SHARDED_TABLES):
+                db.execute(text(f'ALTER TABLE "{table}" DROP CONSTRAINT "{foreign_key["name"]}"'))
+                dropped += 1
+    db.commit()
+    return dropped
+
+
+def init_shard_schemas() -> None:
+    """Create the tables on every shard, set id ranges and drop cross-database foreign keys"""
+    from app import models  # noqa: F401
+
+    for shard in range(shard_count()):
+        db = shard_sessionmaker(shard)()
+        try:
+            Base.metadata.create_all(bind=db.get_bind())
+            upgrade_schema(db.get_bind())
+            _drop_cross_database_foreign_keys(db)
+            ensure_id_counter(db, shard)
+        finally:
+            db.close()
+
+
+# --- Regions -------------------------------------------------------------------
+
+def region_of(latitude: float, longitude: float, zone_id: Optional[int] = None) -> str:
+    if SHARD_REGION == "zone":
+        return f"zone:{zone_id if zone_id is not None else 'none'}"
+    return encode_geohash(latitude, longitude, SHARD_GEOHASH_PRECISION)
+
+
+def hashed_shard(region: str) -> int:
+    """Shard of a region nobody pinned"""
+    return zlib.crc32(region.encode()) % shard_count()
+
+
+class _RegionMapCache:
+    """Per-worker copy of shard_regions, reloaded when it changes"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._regions: Optional[Dict[str, int]] = None
+        self._version = None
+        self._next_check = 0.0
+
+    def get(self, db: Session) -> Dict[str, int]:
+        now = time.monotonic()
+        if self._regions is not None and now < self._next_check:
+            return self._regions
+        version = tuple(db.execute(select(func.count(ShardRegion.region), func.max(ShardRegion.updated_at))).one())
+        with self._lock:
+            if self._regions is None or version != self._version:
+                self._regions = dict(db.execute(select(ShardRegion.region, ShardRegion.shard)).all())
+                self._version = version
+            self._next_check = now + SHARD_MAP_CHECK_SECONDS
+            return self._regions
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._regions = None
+
+
+region_map = _RegionMapCache()
+
+
+def shard_for_region(db: Session, region: str) -> int:
+    """Shard new issues of a region go to (db: the primary)"""
+    pinned = region_map.get(db).get(region)
+    if pinned is not None and pinned < shard_count():
+        return pinned
+    return hashed_shard(region)
+
+
+def shard_for_location(db: Session, latitude: float, longitude: float, zone_id: Optional[int] = None) -> int:
+    if not SHARDING_ENABLED:
+        return 0
+    return shard_for_region(db, region_of(latitude, longitude, zone_id))
+
+
+def issue_shard(db: Session, issue_id: int) -> int:
+    """Shard holding an issue (db: the primary)"""
+    if not SHARDING_ENABLED:
+        return 0
+    relocated = db.scalar(select(ShardRelocation.shard).where(ShardRelocation.issue_id == issue_id))
+    if relocated is not None:
+        return relocated
+    shard = home_shard(issue_id)
+    # Not an id of any shard: look on the primary (it won't be found)
+    return shard if 0 <= shard < shard_count() else 0
+
+
+@contextmanager
+def shard_session(db: Optional[Session], shard: int) -> Iterator[Optional[Session]]:
+    """Session on a shard; the primary session db itself for shard 0"""
+    if shard == 0 or db is None:
+        yield db
+        return
+    session = shard_sessionmaker(shard)()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def open_issue_session(db: Optional[Session], issue_id: int):
+    """shard_session() of the shard holding an issue"""
+    return shard_session(db, issue_shard(db, issue_id) if db is not None else 0)
+
+
+# Dependencies: the session for the issue of the route (the request's
+# session itself without sharding)
+
+def get_issue_db(issue_id: int, db: Session = Depends(get_db)):
+    with open_issue_session(db, issue_id) as issue_db:
+        yield issue_db
+
+
+def get_read_issue_db(issue_id: int, db: Optional[Session] = Depends(get_read_db)):
+    """get_issue_db for read routes: None while the circuit breaker is open"""
+    with open_issue_session(db, issue_id) as issue_db:
+        yield issue_db
+
+
+def get_location_db(latitude: float, longitude: float, db: Session = Depends(get_db)):
+    """Session on the shard a new issue at (latitude, longitude) goes to"""
+    zone_id = None
+    if SHARDING_ENABLED and SHARD_REGION == "zone":
+        from app.zones import locate_zone
+        zone_id = locate_zone(db, latitude, longitude)
+    with shard_session(db, shard_for_location(db, latitude, longitude, zone_id)) as issue_db:
+        yield issue_db
+
+
+# --- Moving regions ------------------------------------------------------------
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _columns(row, model) -> dict:
+    return {column.key: getattr(row, column.key) for column in model.__table__.columns}
+
+
+def _region_query(region: str):
+    """Issues possibly in a region (callers check region_of exactly)"""
+    query = select(Issue)
+    if region.startswith("zone:"):
+        zone = region[len("zone:"):]
+        return query.where(Issue.zone_id.is_(None) if zone == "none" else Issue.zone_id == int(zone))
+    min_lat, min_lon, max_lat, max_lon = geohash_bounds(region)
+    return query.where(
+        Issue.latitude.between(min_lat, max_lat),
+        Issue.longitude.between(min_lon, max_lon)
+    )
+
+
+def pin_region(db: Session, region: str, shard: int) -> None:
+    """New issues of the region go to shard (commits)"""
+    row = db.get(ShardRegion, region)
+    if row is None:
+        db.add(ShardRegion(region=region, shard=shard, updated_at=_utcnow()))
+    else:
+        row.shard = shard
+        row.updated_at = _utcnow()
+    db.commit()
+    region_map.invalidate()
+
+
+def _move_batch(db: Session, source: Session, target: Session, target_shard: int, issues: List[Issue]) -> None:
+    """Copy issues with their events and queue entries to target, then delete them from source"""
+    ids = [issue.id for issue in issues]
+    copied = set(target.scalars(select(Issue.id).where(Issue.id.in_(ids))))
+    new_issues = [issue for issue in issues if issue.id not in copied]
+    new_ids = [issue.id for issue in new_issues]
+
+    # 1. Target: the same rows under the same ids (events get new ids there)
+    if new_issues:
+        target.execute(insert(Issue), [_columns(issue, Issue) for issue in new_issues])
+        events = source.scalars(
+            select(IssueEvent)
+            .where(IssueEvent.issue_id.in_(new_ids))
+            .order_by(IssueEvent.created_at, IssueEvent.id)
+        ).all()
+        if events:
+            target.execute(insert(IssueEvent), [
+                {key: value for key, value in _columns(event, IssueEvent).items() if key != "id"}
+                for event in events
+            ])
+        entries = source.scalars(select(TriageQueueEntry).where(TriageQueueEntry.issue_id.in_(new_ids))).all()
+        if entries:
+            target.execute(insert(TriageQueueEntry), [_columns(entry, TriageQueueEntry) for entry in entries])
+        record_issues(target, new_issues)
+        # Replicas see an update from the target; the source keeps no tombstone
+        track_issue_changes(target, new_issues)
+        target.commit()
+
+    # 2. Primary: where the ids are now
+    db.execute(delete(ShardRelocation).where(ShardRelocation.issue_id.in_(ids)))
+    relocated = [dict(issue_id=issue_id, shard=target_shard) for issue_id in ids if home_shard(issue_id) != target_shard]
+    if relocated:
+        db.execute(insert(ShardRelocation), relocated)
+    db.commit()
+
+    # 3. Source: forget them
+    record_issues(source, issues, delta=-1)
+    source.execute(delete(TriageQueueEntry).where(TriageQueueEntry.issue_id.in_(ids)))
+    source.execute(delete(IssueEvent).where(IssueEvent.issue_id.in_(ids)))
+    forget_issue_changes(source, ids)
+    source.execute(delete(Issue).where(Issue.id.in_(ids)))
+    source.commit()
+
+
+def move_region(db: Session, region: str, shard: int, batch_size: int = SHARD_MOVE_BATCH_SIZE) -> int:
+    """
+    Move the issues of a region to shard (db: the primary; commits per batch)
+
+    Archived issues, SLA aggregates and idempotency records stay where they
+    are: reads merge them across shards anyway.
+
+    Returns:
+        Number of issues moved
+    """
+    if not 0 <= shard < shard_count():
+        raise ValueError(f"No shard {shard} (shards: 0..{shard_count() - 1})")
+    moved = 0
+    for source_shard in range(shard_count()):
+        if source_shard == shard:
+            continue
+        with shard_session(db, source_shard) as source, shard_session(db, shard) as target:
+            last_id = -1
+            while True:
+                # Locked until deleted: concurrent edits wait, then find the
+                # issue gone and are routed to the target (PostgreSQL)
+                candidates = source.scalars(
+                    _region_query(region)
+                    .where(Issue.id > last_id)
+                    .order_by(Issue.id)
+                    .limit(batch_size)
+                    .with_for_update()
+                ).all()
+                if not candidates:
+                    break
+                last_id = candidates[-1].id
+                issues = [
+                    issue for issue in candidates
+                    if region_of(issue.latitude, issue.longitude, issue.zone_id) == region
+                ]
+                if issues:
+                    _move_batch(db, source, target, shard, issues)
+                    moved += len(issues)
+    return moved
+
+
+def region_loads(db: Session) -> List[Counter]:
+    """Issues per region on each shard (from the rollups, or zone_id counts)"""
+    def count(shard_db: Session) -> Counter:
+        if SHARD_REGION == "zone":
+            rows = shard_db.execute(select(Issue.zone_id, func.count(Issue.id)).group_by(Issue.zone_id))
+            return Counter({f"zone:{zone_id if zone_id is not None else 'none'}": n for zone_id, n in rows})
+        prefix = func.substr(IssueRollup.geohash, 1, SHARD_GEOHASH_PRECISION)
+        rows = shard_db.execute(select(prefix, func.sum(IssueRollup.count)).group_by(prefix))
+        return Counter({region: int(n) for region, n in rows if n})
+
+    return for_each_shard(count, primary=db)
+
+
+def plan_rebalance(loads: List[Counter], tolerance: float = SHARD_REBALANCE_TOLERANCE) -> List[Tuple[str, int, int, int]]:
+    """
+    Greedy moves evening out the shards: repeatedly move the region of the
+    fullest shard that best halves its gap to the emptiest one
+
+    Returns:
+        [(region, from shard, to shard, issues)]
+    """
+    loads = [Counter(shard_loads) for shard_loads in loads]
+    totals = [sum(shard_loads.values()) for shard_loads in loads]
+    mean = sum(totals) / len(totals)
+    moves = []
+    while True:
+        heavy = max(range(len(totals)), key=totals.__getitem__)
+        light = min(range(len(totals)), key=totals.__getitem__)
+        gap = totals[heavy] - totals[light]
+        if gap <= tolerance * mean:
+            break
+        candidates = [(region, n) for region, n in loads[heavy].items() if 0 < n < gap]
+        if not candidates:
+            break
+        region, n = min(candidates, key=lambda candidate: (abs(gap / 2 - candidate[1]), candidate[0]))
+        del loads[heavy][region]
+        loads[light][region] += n
+        totals[heavy] -= n
+        totals[light] += n
+        moves.append((region, heavy, light, n))
+    return moves
+
+
+def shard_status(db: Session) -> List[dict]:
+    """Issue counts and id range usage per shard"""
+    def stats(shard_db: Session) -> dict:
+        floor = shard_id_floor(shard_db.info.get("shard", 0))
+        return {
+            "issues": shard_db.scalar(select(func.count(Issue.id))),
+            # Of its own range (relocated issues keep ids of other shards)
+            "max_id": shard_db.scalar(
+                select(func.max(Issue.id)).where(Issue.id >= floor, Issue.id < floor + (1 << SHARD_ID_BITS))
+            ),
+        }
+
+    rows = []
+    pinned = Counter(db.scalars(select(ShardRegion.shard)))
+    relocated = Counter(db.scalars(select(ShardRelocation.shard)))
+    for shard, row in enumerate(for_each_shard(stats, primary=db)):
+        floor = shard_id_floor(shard)
+        used = (row["max_id"] or floor) - floor
+        rows.append({
+            "shard": shard,
+            **row,
+            "id_range_used": used / (1 << SHARD_ID_BITS),
+            "pinned_regions": pinned[shard],
+            "relocated_issues": relocated[shard],
+        })
+    return rows
+
+
+def _move_regions(db: Session, moves: List[Tuple[str, int]]) -> int:
+    """Pin regions, let every worker pick up the new map, then move their issues"""
+    for region, shard in moves:
+        pin_region(db, region, shard)
+    print(f"Pinned {len(moves)} regions, waiting {SHARD_MAP_CHECK_SECONDS:.0f}s for workers to reload the map")
+    time.sleep(SHARD_MAP_CHECK_SECONDS)
+    moved = 0
+    for region, shard in moves:
+        count = move_region(db, region, shard)
+        print(f"{region}: moved {count} issues to shard {shard}")
+        moved += count
+    return moved
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Manage issue shards")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("init", help="create shard schemas and id ranges")
+    commands.add_parser("status", help="issues per shard")
+    move_parser = commands.add_parser("move", help="pin a region to a shard and move its issues")
+    move_parser.add_argument("region", help="geohash prefix or zone:<id>")
+    move_parser.add_argument("shard", type=int)
+    rebalance_parser = commands.add_parser("rebalance", help="plan (and --apply) region moves evening out the shards")
+    rebalance_parser.add_argument("--apply", action="store_true")
+    args = parser.parse_args()
+
+    init_shard_schemas()
+    primary = SessionLocal()
+    try:
+        if args.command == "status":
+            for row in shard_status(primary):
+                print(
+                    f"shard {row['shard']}: {row['issues']} issues, "
+                    f"{row['id_range_used']:.2%} of id range used, "
+                    f"{row['pinned_regions']} pinned regions, {row['relocated_issues']} relocated issues"
+                )
+        elif args.command == "move":
+            if (SHARD_REGION == "zone") != args.region.startswith("zone:"):
+                parser.error(f"region must be {'zone:<id>' if SHARD_REGION == 'zone' else 'a geohash prefix'}")
+            if SHARD_REGION != "zone" and len(args.region) != SHARD_GEOHASH_PRECISION:
+                parser.error(f"geohash regions have {SHARD_GEOHASH_PRECISION} characters")
+            print(f"Moved {_move_regions(primary, [(args.region, args.shard)])} issues")
+        elif args.command == "rebalance":
+            plan = plan_rebalance(region_loads(primary))
+            if not plan:
+                print("Shards are balanced")
+            for region, source, target, count in plan:
+                print(f"{region}: shard {source} -> {target} ({count} issues)")
+            if plan and args.apply:
+                print(f"Moved {_move_regions(primary, [(region, target) for region, _, target, _ in plan])} issues")
+    finally:
+        primary.close()
+        dispose_shard_engines()
@@ -0,0 +1,274 @@
+"""
+Precomputed snapshots of the public issue views for degraded read-only mode
+
+A periodic job renders what the public read routes return for their most
+requested parameters (latest issues per category/status, each of those
+issues, heatmap cells, default trends, SLA stats), gzips every body and
+writes them into one file:
+
+    magic | index offset | index length | gzipped bodies | index (JSON)
+
+The index maps a view key (e.g. "feed?category=safety&skip=0&status=pending")
+to the offset and length of its gzipped body. The file is replaced
+atomically, so readers always see a complete snapshot.
+
+While the database circuit breaker is open (see get_read_db) the routes
+answer from the snapshot instead: the file is memory-mapped once per worker
+and bodies are sent as slices of the mapping, without copying or
+recompressing them. Requests with parameters the snapshot doesn't cover get
+503 like the write routes.
+"""
+import gzip
+import mmap
+import os
+import struct
+import time
+from email.utils import formatdate
+from enum import Enum
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+import orjson
+from dotenv import load_dotenv
+from fastapi import HTTPException, Request, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse, Response
+from sqlalchemy.orm import Session
+from app.analytics import ROLLUP_PRECISION, coarsen_cells
+from app.compression import choose_encoding
+from app.database import SessionLocal, db_breaker
+from app.file_lock import try_lock
+from app.file_utils import get_image_url
+from app.models import Issue, IssueCategory, IssueStatus
+from app.shard_queries import latest_issues, merged_heatmap, merged_sla_report, merged_trends
+from app.schemas import HeatmapResponse, IssueResponse, SlaResponse, TrendsResponse
+
+load_dotenv()
+
+SNAPSHOT_DIR = Path(os.getenv("SNAPSHOT_DIR", "./snapshots"))
+SNAPSHOT_INTERVAL_SECONDS = int(os.getenv("SNAPSHOT_INTERVAL_SECONDS", "60"))
+# Issues per category/status feed (GET /api/issues/ allows limit <= 100)
+SNAPSHOT_FEED_SIZE = int(os.getenv("SNAPSHOT_FEED_SIZE", "100"))
+# Prefix for image URLs in snapshots (no request to take it from);
+# empty: URLs relative to the API host
+SNAPSHOT_BASE_URL = os.getenv("SNAPSHOT_BASE_URL", "")
+
+SNAPSHOT_PATH = SNAPSHOT_DIR / "public.snapshot"
+
+_MAGIC = b"CRSNAP01"
+_HEADER = struct.Struct("<8sQQ")  # magic, index offset, index length
+
+
+def snapshot_key(view: str, **params) -> str:
+    """Canonical key of a view and its parameters (None values dropped)"""
+    query = "&".join(
+        f"{name}={value.value if isinstance(value, Enum) else value}"
+        for name, value in sorted(params.items())
+        if value is not None
+    )
+    return f"{view}?{query}"
+
+
+# Writing
+
+def _gzip(body: dict) -> bytes:
+    # mtime=0: unchanged views produce identical bytes
+    return gzip.compress(orjson.dumps(body), compresslevel=9, mtime=0)
+
+
+def _issue_body(issue: Issue) -> dict:
+    body = jsonable_encoder(IssueResponse.model_validate(issue))
+    if body.get("image_url"):
+        body["image_url"] = get_image_url(body["image_url"], SNAPSHOT_BASE_URL)
+    return body
+
+
+def build_snapshot(db: Session) -> Dict[str, Tuple[bytes, Optional[int]]]:
+    """
+    Render the snapshot views
+
+    Returns:
+        {key: (gzipped JSON body, number of items for list bodies)}
+    """
+    views = {}
+    categories = [None, *IssueCategory]
+
+    issues = {}
+    for category in categories:
+        for issue_status in [None, *IssueStatus]:
+            feed = latest_issues(db, 0, SNAPSHOT_FEED_SIZE, category, issue_status)
+            bodies = []
+            for issue in feed:
+                if issue.id not in issues:
+                    issues[issue.id] = _issue_body(issue)
+                bodies.append(issues[issue.id])
+            key = snapshot_key("feed", category=category, status=issue_status, skip=0)
+            views[key] = (_gzip(bodies), len(bodies))
+    for issue_id, body in issues.items():
+        views[snapshot_key("issue", issue_id=issue_id)] = (_gzip(body), None)
+
+    # Map clusters: one rollup query per category, coarser levels derived
+    finest = {category: merged_heatmap(db, ROLLUP_PRECISION, category=category) for category in IssueCategory}
+    finest[None] = [cell for cells in finest.values() for cell in cells]
+    for category, cells in finest.items():
+        for precision in range(1, ROLLUP_PRECISION + 1):
+            body = {"precision": precision, "cells": coarsen_cells(cells, precision)}
+            views[snapshot_key("heatmap", precision=precision, category=category)] = (
+                _gzip(jsonable_encoder(HeatmapResponse.model_validate(body))), None
+            )
+
+    metrics = merged_sla_report(db)
+    for category in categories:
+        # Route defaults only
+        body = {"precision": 5, "window": 7, "cells": merged_trends(db, 5, 30, 7, category, 20)}
+        views[snapshot_key("trends", precision=5, days=30, window=7, category=category, limit=20)] = (
+            _gzip(jsonable_encoder(TrendsResponse.model_validate(body))), None
+        )
+        body = {"metrics": [m for m in metrics if category is None or m["category"] == category]}
+        views[snapshot_key("sla", category=category)] = (
+            _gzip(jsonable_encoder(SlaResponse.model_validate(body))), None
+        )
+    return views
+
+
+def write_snapshot(views: Dict[str, Tuple[bytes, Optional[int]]], path: Path = SNAPSHOT_PATH) -> None:
+    """Write views to path atomically"""
+    entries = {}
+    tmp = path.with_name(f"{path.name}.tmp-{os.getpid()}")
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, 0, 0))
+        offset = _HEADER.size
+        for key, (body, count) in views.items():
+            f.write(body)
+            entries[key] = (offset, len(body), count)
+            offset += len(body)
+        index = orjson.dumps({"generated_at": time.time(), "views": entries})
+        f.write(index)
+        f.seek(0)
+        f.write(_HEADER.pack(_MAGIC, offset, len(index)))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def run_snapshot_writer() -> bool:
+    """
+    Periodic job: refresh the snapshot with its own session
+
+    Only one worker of a host writes at a time, and not more often than
+    every half interval, so N workers don't write N snapshots per interval.
+
+    Returns:
+        Whether a snapshot was written
+    """
+    if db_breaker.state != "closed":
+        return False  # keep the last good snapshot
+    SNAPSHOT_DIR.mkdir(parents=True, exist_ok=True)
+    with open(SNAPSHOT_DIR / ".lock", "w") as lock:
+        if not try_lock(lock.fileno()):
+            return False
+        try:
+            if time.time() - SNAPSHOT_PATH.stat().st_mtime < SNAPSHOT_INTERVAL_SECONDS / 2:
+                return False
+        except FileNotFoundError:
+            pass
+        db = SessionLocal()
+        try:
+            views = build_snapshot(db)
+        finally:
+            db.close()
+        write_snapshot(views)
+        return True
+
+
+# Serving
+
+class SnapshotResponse(Response):
+    """Response whose body is a slice of the mapped snapshot (not copied)"""
+    media_type = "application/json"
+
+    def render(self, content) -> memoryview:
+        return content
+
+
+class SnapshotStore:
+    """The current snapshot file, memory-mapped (reloaded when replaced)"""
+
+    def __init__(self, path: Path = SNAPSHOT_PATH):
+        self.path = path
+        self.generated_at: Optional[float] = None
+        self._identity = None
+        self._buffer: Optional[memoryview] = None
+        self._views: Dict[str, list] = {}
+
+    def _refresh(self) -> None:
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return  # keep serving the one already mapped, if any
+        identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if identity == self._identity:
+            return
+        with open(self.path, "rb") as f:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, index_offset, index_length = _HEADER.unpack_from(mapping)
+        if magic != _MAGIC:
+            raise ValueError(f"{self.path} is not a snapshot file")
+        index = orjson.loads(mapping[index_offset:index_offset + index_length])
+        # The previous mapping is unmapped once responses using it are sent
+        self._buffer = memoryview(mapping)
+        self._views = index["views"]
+        self.generated_at = index["generated_at"]
+        self._identity = identity
+
+    def get(self, key: str) -> Optional[Tuple[memoryview, Optional[int]]]:
+        """Gzipped body of a view and its item count, or None"""
+        self._refresh()
+        entry = self._views.get(key)
+        if entry is None:
+            return None
+        offset, length, count = entry
+        return self._buffer[offset:offset + length], count
+
+    def info(self) -> dict:
+        self._refresh()
+        if self.generated_at is None:
+            return {"available": False}
+        return {
+            "available": True,
+            "generated_at": formatdate(self.generated_at, usegmt=True),
+            "age_seconds": round(time.time() - self.generated_at),
+            "views": len(self._views)
+        }
+
+
+snapshot_store = SnapshotStore()
+
+
+def snapshot_response(request: Request, view: str, max_items: Optional[int] = None, **params) -> Response:
+    """
+    Answer a read route from the snapshot while the database is unavailable
+
+    The parameters must match a precomputed view exactly; max_items trims
+    list bodies (the route's page size). 503 if the view isn't in the
+    snapshot.
+    """
+    found = snapshot_store.get(snapshot_key(view, **params))
+    if found is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database temporarily unavailable and this view is not in the read-only snapshot",
+            headers={"Retry-After": str(max(1, round(db_breaker.retry_after())))}
+        )
+    body, count = found
+    headers = {
+        # Staleness: seconds since the data was read from the database
+        "Age": str(max(0, round(time.time() - snapshot_store.generated_at))),
+        "X-Snapshot-Generated-At": formatdate(snapshot_store.generated_at, usegmt=True),
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding"
+    }
+    if max_items is not None and count is not None and max_items < count:
+        return ORJSONResponse(orjson.loads(gzip.decompress(body))[:max_items], headers=headers)
+    if choose_encoding(request.headers.get("accept-encoding", ""), ["gzip"]):
+        return SnapshotResponse(body, headers={**headers, "Content-Encoding": "gzip"})
+    return Response(gzip.decompress(body), media_type="application/json", headers=headers)
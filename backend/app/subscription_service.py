@@ -0,0 +1,198 @@
+"""
+Service for issue / category / area subscriptions and notification fan-out
+
+Area subscriptions are circles indexed by the geohash cells that cover them
+(subscription_cells). Matching an issue looks up the prefixes of the issue's
+geohash in that index and then checks the exact distance, so it never scans
+all area subscriptions.
+
+Fan-out runs after the response has been sent (FastAPI BackgroundTasks) with
+its own session and inserts notifications in bulk batches.
+"""
+import math
+import os
+from typing import List, Optional, Set
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+from app.analytics import ROLLUP_PRECISION, encode_geohash
+from app.models import (
+    Issue,
+    IssueCategory,
+    IssueStatus,
+    Notification,
+    Subscription,
+    SubscriptionCell,
+    SubscriptionKind
+)
+from app.notification_service import STATUS_MESSAGES, adjust_unread_counts
+
+load_dotenv()
+
+# Rows per INSERT batch (and transaction) during fan-out
+FANOUT_BATCH_SIZE = int(os.getenv("FANOUT_BATCH_SIZE", "5000"))
+
+EARTH_RADIUS_M = 6371000.0
+
+
+def distance_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance in meters (haversine)"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def _cell_size_m(precision: int, latitude: float) -> tuple:
+    """(height, width) of a geohash cell in meters at the given latitude"""
+    bits = 5 * precision
+    lat_deg = 180.0 / (1 << (bits // 2))
+    lon_deg = 360.0 / (1 << ((bits + 1) // 2))
+    meters_per_deg = math.pi * EARTH_RADIUS_M / 180.0
+    return lat_deg * meters_per_deg, lon_deg * meters_per_deg * max(math.cos(math.radians(latitude)), 0.01)
+
+
+def covering_cells(latitude: float, longitude: float, radius_m: float) -> Set[str]:
+    """
+    Geohash cells covering a circle: the cell containing the center and its
+    neighbours, at the finest precision whose cells are at least radius_m wide
+    """
+    precision = 1
+    for candidate in range(ROLLUP_PRECISION, 0, -1):
+        height, width = _cell_size_m(candidate, latitude)
+        if height >= radius_m and width >= radius_m:
+            precision = candidate
+            break
+    height, width = _cell_size_m(precision, latitude)
+    dlat = height / (math.pi * EARTH_RADIUS_M / 180.0)
+    dlon = width / (math.pi * EARTH_RADIUS_M / 180.0 * max(math.cos(math.radians(latitude)), 0.01))
+    cells = set()
+    for i in (-1, 0, 1):
+        for j in (-1, 0, 1):
+            lat = min(max(latitude + i * dlat, -90.0), 90.0)
+            lon = (longitude + j * dlon + 180.0) % 360.0 - 180.0
+            cells.add(encode_geohash(lat, lon, precision))
+    return cells
+
+
+def create_subscription(
+    db: Session,
+    user_id: int,
+    kind: SubscriptionKind,
+    issue_id: Optional[int] = None,
+    category: Optional[IssueCategory] = None,
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None,
+    radius_m: Optional[float] = None
+) -> Subscription:
+    """Create a subscription (and its spatial index entries for areas)"""
+    subscription = Subscription(
+        user_id=user_id,
+        kind=kind,
+        issue_id=issue_id if kind == SubscriptionKind.ISSUE else None,
+        category=category if kind == SubscriptionKind.CATEGORY else None,
+        latitude=latitude if kind == SubscriptionKind.AREA else None,
+        longitude=longitude if kind == SubscriptionKind.AREA else None,
+        radius_m=radius_m if kind == SubscriptionKind.AREA else None
+    )
+    if kind == SubscriptionKind.AREA:
+        subscription.cells = [
+            SubscriptionCell(cell=cell)
+            for cell in covering_cells(latitude, longitude, radius_m)
+        ]
+    db.add(subscription)
+    db.commit()
+    db.refresh(subscription)
+    return subscription
+
+
+def find_subscribers(
+    db: Session,
+    issue_id: int,
+    category: IssueCategory,
+    latitude: float,
+    longitude: float
+) -> Set[int]:
+    """User ids subscribed to the issue, its category or an area containing it"""
+    user_ids = set(db.scalars(
+        select(Subscription.user_id).where(
+            Subscription.kind == SubscriptionKind.ISSUE,
+            Subscription.issue_id == issue_id
+        )
+    ))
+    user_ids.update(db.scalars(
+        select(Subscription.user_id).where(
+            Subscription.kind == SubscriptionKind.CATEGORY,
+            Subscription.category == category
+        )
+    ))
+
+    # Area candidates from the cell index, then exact distance check
+    geohash = encode_geohash(latitude, longitude)
+    prefixes = [geohash[:length] for length in range(1, len(geohash) + 1)]
+    candidates = db.execute(
+        select(
+            Subscription.user_id,
+            Subscription.latitude,
+            Subscription.longitude,
+            Subscription.radius_m
+        )
+        .join(SubscriptionCell, SubscriptionCell.subscription_id == Subscription.id)
+        .where(SubscriptionCell.cell.in_(prefixes))
+        .distinct()
+    )
+    for user_id, lat, lon, radius_m in candidates:
+        if user_id not in user_ids and distance_m(latitude, longitude, lat, lon) <= radius_m:
+            user_ids.add(user_id)
+    return user_ids
+
+
+def fan_out_status_change(
+    issue_id: int,
+    old_status: IssueStatus,
+    new_status: IssueStatus,
+    exclude_user_ids: Optional[List[int]] = None
+) -> int:
+    """
+    Notify every subscriber of an issue status change
+
+    Meant to run as a background task: uses its own session and commits one
+    bulk INSERT per FANOUT_BATCH_SIZE subscribers.
+
+    Returns:
+        Number of notifications created
+    """
+    from app.database import SessionLocal, init_engine
+    from app.sharding import open_issue_session
+
+    if old_status == new_status:
+        return 0
+
+    init_engine()
+    db = SessionLocal()
+    try:
+        with open_issue_session(db, issue_id) as issue_db:
+            issue = issue_db.get(Issue, issue_id)
+        if issue is None:
+            return 0
+        user_ids = find_subscribers(db, issue.id, issue.category, issue.latitude, issue.longitude)
+        user_ids.difference_update(exclude_user_ids or [])
+        if not user_ids:
+            return 0
+
+        message = STATUS_MESSAGES.get(new_status, f"status changed to {new_status.value}")
+        title = f"Issue Status Update: {issue.title}"
+        body = f"An issue you follow, '{issue.title}', {message}."
+        ordered = sorted(user_ids)
+        for start in range(0, len(ordered), FANOUT_BATCH_SIZE):
+            batch = ordered[start:start + FANOUT_BATCH_SIZE]
+            db.execute(insert(Notification), [
+                dict(user_id=user_id, issue_id=issue.id, title=title, message=body, is_read=False)
+                for user_id in batch
+            ])
+            adjust_unread_counts(db, {user_id: 1 for user_id in batch})
+            db.commit()
+        return len(ordered)
+    finally:
+        db.close()
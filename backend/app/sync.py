@@ -0,0 +1,311 @@
+"""
+Change tracking for issue listings
+
+- issue_changes holds the latest change of every issue (tombstones for
+  deleted ones) under an increasing sequence number. A sync token is the
+  last sequence number a client has seen; GET /api/issues/changes returns
+  everything after it, so clients can keep a local replica up to date with
+  small incremental payloads.
+- issue_list_stamps holds the last modification time per (category, status)
+  slice, so list endpoints answer Last-Modified / If-Modified-Since and
+  ETag / If-None-Match from at most a few rows. Both the old and the new
+  slice of a changed issue are touched, so moves and deletes count too.
+
+Both are written in the same transaction as the issue change.
+
+A reader must never see seq N+1 before seq N commits. SQLite has one writer
+at a time, so rows are numbered as they are inserted. On PostgreSQL writers
+stage rows in issue_changes_pending with their transaction id, and readers
+publish them (publish_issue_changes) once every older transaction has
+finished. Only publishers serialize, never the issue writes themselves.
+"""
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from fastapi import HTTPException, Request, status
+from sqlalchemy import delete, func, insert, select, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.database import dialect_insert
+from app.models import Issue, IssueCategory, IssueChange, IssueListStamp, IssueStatus, PendingIssueChange
+
+Slice = Tuple[IssueCategory, IssueStatus]
+
+# Taken by publish_issue_changes() on PostgreSQL (one publisher at a time)
+_CHANGES_LOCK_ID = 0x15C4A9
+PUBLISH_BATCH_SIZE = 5000
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite returns naive datetimes; everything is stored in UTC
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def encode_sync_token(seq: int) -> str:
+    return str(seq)
+
+
+def decode_sync_token(token: Optional[str]) -> int:
+    """Sequence number of a sync token (no token = from the beginning)"""
+    if not token:
+        return 0
+    try:
+        seq = int(token)
+    except ValueError:
+        seq = -1
+    if seq < 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid sync token"
+        )
+    return seq
+
+
+def encode_sync_tokens(seqs: List[int]) -> str:
+    """Sync token covering several change logs (one per shard)"""
+    return ".".join(str(seq) for seq in seqs)
+
+
+def decode_sync_tokens(token: Optional[str], count: int) -> List[int]:
+    """
+    Sequence number per change log of a token; a single number (token from
+    before sharding) continues on the first log
+    """
+    parts = token.split(".") if token else []
+    if len(parts) > count or not all(parts):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid sync token"
+        )
+    return [decode_sync_token(part) for part in parts] + [0] * (count - len(parts))
+
+
+def _is_postgresql(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def _record_changes(db: Session, issue_ids: List[int], deleted: bool, changed_at: datetime) -> None:
+    """Replace the change rows of issues (staged on PostgreSQL)"""
+    rows = [dict(issue_id=issue_id, deleted=deleted, changed_at=changed_at) for issue_id in issue_ids]
+    if _is_postgresql(db):
+        db.execute(insert(PendingIssueChange).values(xid=func.txid_current()), rows)
+        return
+    # New rows get new sequence numbers
+    db.execute(delete(IssueChange).where(IssueChange.issue_id.in_(issue_ids)))
+    db.execute(insert(IssueChange), rows)
+
+
+def forget_issue_changes(db: Session, issue_ids: List[int]) -> None:
+    """Drop the change rows of issues that left this database (no tombstone)"""
+    db.execute(delete(IssueChange).where(IssueChange.issue_id.in_(issue_ids)))
+    db.execute(delete(PendingIssueChange).where(PendingIssueChange.issue_id.in_(issue_ids)))
+
+
+def publish_issue_changes(db: Session, batch_size: int = PUBLISH_BATCH_SIZE) -> int:
+    """
+    Number the staged changes of finished transactions (PostgreSQL; commits)
+
+    Changes of transactions older than the oldest one still running can no
+    longer be joined by others, so numbering them now keeps sequence order
+    equal to commit order. Skipped while another publisher is at it: its
+    rows become visible when it commits.
+
+    Returns:
+        Number of staged changes published
+    """
+    if not _is_postgresql(db):
+        return 0
+    published = 0
+    while True:
+        if not db.scalar(text("SELECT pg_try_advisory_xact_lock(:id)"), {"id": _CHANGES_LOCK_ID}):
+            db.rollback()
+            return published
+        horizon = db.scalar(text("SELECT txid_snapshot_xmin(txid_current_snapshot())"))
+        pending = db.execute(
+            select(
+                PendingIssueChange.id,
+                PendingIssueChange.issue_id,
+                PendingIssueChange.deleted,
+                PendingIssueChange.changed_at
+            )
+            .where(PendingIssueChange.xid < horizon)
+            .order_by(PendingIssueChange.xid, PendingIssueChange.id)
+            .limit(batch_size)
+        ).all()
+        if not pending:
+            db.rollback()
+            return published
+        latest = {}
+        for row in pending:
+            latest.pop(row.issue_id, None)  # keep the last change, in its position
+            latest[row.issue_id] = row
+        db.execute(delete(IssueChange).where(IssueChange.issue_id.in_(list(latest))))
+        db.execute(insert(IssueChange), [
+            dict(issue_id=row.issue_id, deleted=row.deleted, changed_at=row.changed_at)
+            for row in latest.values()
+        ])
+        db.execute(delete(PendingIssueChange).where(PendingIssueChange.id.in_([row.id for row in pending])))
+        db.commit()
+        published += len(pending)
+        if len(pending) < batch_size:
+            return published
+
+
+def track_issue_changes(
+    db: Session,
+    issues: Iterable[Issue],
+    previous_slices: Iterable[Slice] = (),
+    deleted: bool = False
+) -> None:
+    """
+    Record that issues were created, updated or deleted (part of the caller's
+    transaction)
+
+    Args:
+        issues: The changed issues, in their new state
+        previous_slices: (category, status) the issues had before the change
+        deleted: Record tombstones instead of updates
+    """
+    issues = list(issues)
+    if not issues:
+        return
+    now = _utcnow()
+    _record_changes(db, [issue.id for issue in issues], deleted, now)
+
+    slices = set(previous_slices)
+    slices.update((IssueCategory(issue.category), IssueStatus(issue.status)) for issue in issues)
+    touch_list_stamps(db, slices, now)
+
+
+def touch_list_stamps(db: Session, slices: Iterable[Slice], modified_at: datetime) -> None:
+    """Set the modification time of (category, status) slices"""
+    rows = [
+        dict(category=category, status=issue_status, modified_at=modified_at)
+        for category, issue_status in slices
+    ]
+    if not rows:
+        return
+
+    table = IssueListStamp.__table__
+    upsert = dialect_insert(db)
+    if upsert is not None:
+        stmt = upsert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["category", "status"],
+            set_={"modified_at": stmt.excluded.modified_at}
+        )
+        db.execute(stmt, rows)
+        return
+
+    # Generic fallback: read-modify-write per slice
+    for row in rows:
+        stamp = db.get(IssueListStamp, (row["category"], row["status"]), with_for_update=True)
+        if stamp:
+            stamp.modified_at = modified_at
+        else:
+            db.add(IssueListStamp(**row))
+
+
+def list_last_modified(
+    db: Session,
+    category: Optional[IssueCategory] = None,
+    issue_status: Optional[IssueStatus] = None
+) -> Optional[datetime]:
+    """Last modification of the issues matching a list filter (None if unknown)"""
+    query = select(func.max(IssueListStamp.modified_at))
+    if category:
+        query = query.where(IssueListStamp.category == category)
+    if issue_status:
+        query = query.where(IssueListStamp.status == issue_status)
+    modified_at = db.scalar(query)
+    return _as_utc(modified_at) if modified_at else None
+
+
+def validator_headers(last_modified: datetime) -> Dict[str, str]:
+    """Last-Modified and ETag for a list last modified at `last_modified`"""
+    return {
+        "Last-Modified": format_datetime(last_modified.replace(microsecond=0), usegmt=True),
+        # Full precision: Last-Modified alone misses changes within a second
+        "ETag": f'W/"{int(last_modified.timestamp() * 1000000)}"',
+        "Cache-Control": "no-cache"
+    }
+
+
+def is_not_modified(request: Request, headers: Dict[str, str], last_modified: datetime) -> bool:
+    """Evaluate If-None-Match / If-Modified-Since (If-None-Match wins when both are sent)"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or headers["ETag"] in tags or headers["ETag"][2:] in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def changes_since(db: Session, since: int, limit: int) -> Tuple[List[Issue], List[int], int, bool]:
+    """
+    Issues changed after sequence number `since`
+
+    Returns:
+        (changed issues, deleted issue ids, last sequence number, has more)
+    """
+    publish_issue_changes(db)
+    rows = db.execute(
+        select(IssueChange.seq, IssueChange.issue_id, IssueChange.deleted)
+        .where(IssueChange.seq > since)
+        .order_by(IssueChange.seq)
+        .limit(limit + 1)
+    ).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    last_seq = rows[-1].seq if rows else since
+
+    deleted_ids = [row.issue_id for row in rows if row.deleted]
+    changed_ids = [row.issue_id for row in rows if not row.deleted]
+    issues_by_id = {
+        issue.id: issue
+        for issue in db.scalars(select(Issue).where(Issue.id.in_(changed_ids)))
+    } if changed_ids else {}
+    # Keep the change order; an issue may have been deleted since the read
+    issues = [issues_by_id[issue_id] for issue_id in changed_ids if issue_id in issues_by_id]
+    return issues, deleted_ids, last_seq, has_more
+
+
+def backfill_issue_changes(db: Session) -> int:
+    """
+    Add change rows and list stamps for issues that predate change tracking
+
+    Returns:
+        Number of issues added
+    """
+    missing = select(Issue.id, Issue.category, Issue.status).where(
+        ~select(IssueChange.issue_id).where(IssueChange.issue_id == Issue.id).exists(),
+        ~select(PendingIssueChange.issue_id).where(PendingIssueChange.issue_id == Issue.id).exists()
+    ).order_by(Issue.id)
+    rows = db.execute(missing).all()
+    if not rows:
+        return 0
+    now = _utcnow()
+    try:
+        _record_changes(db, [row.id for row in rows], False, now)
+        touch_list_stamps(db, {(row.category, row.status) for row in rows}, now)
+        db.commit()
+    except IntegrityError:
+        # Another worker backfilled concurrently
+        db.rollback()
+        return 0
+    return len(rows)
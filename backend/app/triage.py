@@ -0,0 +1,374 @@
+"""
+Admin triage queue
+
+Every pending issue has a row in triage_queue. POST /api/issues/triage/claim
+hands the highest-priority unclaimed issue to an admin under a lease of
+TRIAGE_LEASE_SECONDS; the row leaves the queue when the issue's status
+changes, and an expired lease makes the issue claimable again.
+
+Priority = category weight + density weight * floor(log2(1 + reports in the
+issue's geohash cell over the last TRIAGE_DENSITY_DAYS)) + age weight * hours
+waiting. Age grows at the same rate for every issue, so the stored
+priority_key leaves it out (it subtracts age weight * creation time instead):
+ordering by priority_key is ordering by current priority, and the key only
+changes when the density level of a cell changes. triage_cells records the
+level each cell's keys use; a new report only shifts the other keys of its
+cell when it raises the level, which happens at 1, 3, 7, 15, ... reports.
+
+Rebuild the queue from the issues table (also run periodically):
+    python -m app.triage rebuild
+"""
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+from sqlalchemy import bindparam, delete, func, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+from app.analytics import code_to_geohash, encode_geohash, geohash_codes
+from app.database import dialect_insert
+from app.sharding import for_each_shard
+from app.models import Issue, IssueCategory, IssueRollup, IssueStatus, TriageCell, TriageQueueEntry
+
+load_dotenv()
+
+# How long a claim lasts without the issue's status changing
+TRIAGE_LEASE_SECONDS = int(os.getenv("TRIAGE_LEASE_SECONDS", "900"))
+TRIAGE_DENSITY_DAYS = int(os.getenv("TRIAGE_DENSITY_DAYS", "7"))
+TRIAGE_DENSITY_WEIGHT = float(os.getenv("TRIAGE_DENSITY_WEIGHT", "10"))
+TRIAGE_AGE_WEIGHT_PER_HOUR = float(os.getenv("TRIAGE_AGE_WEIGHT_PER_HOUR", "1"))
+# Density windows slide: recompute all keys this often
+TRIAGE_REFRESH_INTERVAL_SECONDS = int(os.getenv("TRIAGE_REFRESH_INTERVAL_SECONDS", "900"))
+
+CATEGORY_WEIGHTS = {
+    IssueCategory.SAFETY: 100.0,
+    IssueCategory.HEALTH: 90.0,
+    IssueCategory.INFRASTRUCTURE: 50.0,
+    IssueCategory.ENVIRONMENT: 30.0,
+    IssueCategory.OTHER: 10.0,
+}
+
+# SQLite: candidates tried when another admin claims the same row first
+_CLAIM_ATTEMPTS = 10
+_EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _as_utc(value: Optional[datetime]) -> datetime:
+    # SQLite returns naive datetimes; everything is stored in UTC
+    if value is None:
+        return _utcnow()
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _hours(value: datetime) -> float:
+    return (_as_utc(value) - _EPOCH).total_seconds() / 3600.0
+
+
+def density_level(density: int) -> int:
+    """floor(log2(1 + density))"""
+    return (1 + density).bit_length() - 1
+
+
+def priority_key(category: IssueCategory, density: int, created_at: datetime) -> float:
+    return (
+        CATEGORY_WEIGHTS[IssueCategory(category)]
+        + TRIAGE_DENSITY_WEIGHT * density_level(density)
+        - TRIAGE_AGE_WEIGHT_PER_HOUR * _hours(created_at)
+    )
+
+
+def current_priority(key: float, now: Optional[datetime] = None) -> float:
+    """Priority score now of an entry with the given key"""
+    return round(key + TRIAGE_AGE_WEIGHT_PER_HOUR * _hours(now or _utcnow()), 2)
+
+
+def cell_densities(db: Session, cells: Optional[Iterable[str]] = None) -> Dict[str, int]:
+    """Reports per geohash cell within the density window (all cells if None)"""
+    since = _utcnow().date() - timedelta(days=TRIAGE_DENSITY_DAYS)
+    query = select(IssueRollup.geohash, func.sum(IssueRollup.count)).where(IssueRollup.day >= since)
+    if cells is not None:
+        cells = list(cells)
+        if not cells:
+            return {}
+        query = query.where(IssueRollup.geohash.in_(cells))
+    return {cell: int(count or 0) for cell, count in db.execute(query.group_by(IssueRollup.geohash))}
+
+
+def _reprioritize_cells(db: Session, cells: Iterable[str], densities: Dict[str, int]) -> None:
+    """Recompute the keys of queued issues in cells"""
+    cells = list(cells)
+    if not cells:
+        return
+    for entry in db.scalars(select(TriageQueueEntry).where(TriageQueueEntry.geohash.in_(cells))):
+        entry.priority_key = priority_key(entry.category, densities.get(entry.geohash, 0), entry.created_at)
+
+
+def _update_cell_levels(db: Session, cells: Iterable[str], densities: Dict[str, int]) -> None:
+    """
+    Shift the keys of cells whose density level changed
+
+    The conditional UPDATE of the cell's level lets only one of several
+    concurrent writers apply the shift.
+    """
+    cells = list(cells)
+    if not cells:
+        return
+    levels = dict(db.execute(
+        select(TriageCell.geohash, TriageCell.density_level).where(TriageCell.geohash.in_(cells))
+    ).all())
+    upsert = dialect_insert(db)
+    for cell in cells:
+        level = density_level(densities.get(cell, 0))
+        previous = levels.get(cell)
+        if previous == level:
+            continue
+        if previous is None:
+            # First report in the cell since the last rebuild: its few
+            # queued issues (if any) get their keys recomputed
+            if upsert is not None:
+                added = db.execute(
+                    upsert(TriageCell).values(geohash=cell, density_level=level).on_conflict_do_nothing()
+                ).rowcount
+            else:
+                db.add(TriageCell(geohash=cell, density_level=level))
+                added = 1
+            if added:
+                _reprioritize_cells(db, [cell], densities)
+            continue
+        shifted = db.execute(
+            update(TriageCell)
+            .where(TriageCell.geohash == cell, TriageCell.density_level == previous)
+            .values(density_level=level)
+        ).rowcount
+        if shifted:
+            db.execute(
+                update(TriageQueueEntry)
+                .where(TriageQueueEntry.geohash == cell)
+                .values(priority_key=TriageQueueEntry.priority_key + TRIAGE_DENSITY_WEIGHT * (level - previous))
+                .execution_options(synchronize_session=False)
+            )
+
+
+def update_triage_queue(db: Session, issues: Iterable[Issue], removed: bool = False) -> None:
+    """
+    Queue, requeue or dequeue issues after a write (part of the caller's
+    transaction, after the rollups were updated)
+
+    Pending issues are (re)queued with a fresh priority, keeping an existing
+    claim; other issues, or all of them with removed=True, leave the queue.
+    """
+    issues = list(issues)
+    if not issues:
+        return
+    existing = {
+        entry.issue_id: entry
+        for entry in db.scalars(
+            select(TriageQueueEntry).where(TriageQueueEntry.issue_id.in_([issue.id for issue in issues]))
+        )
+    }
+    queued = {
+        issue.id: encode_geohash(issue.latitude, issue.longitude)
+        for issue in issues
+        if not removed and IssueStatus(issue.status) == IssueStatus.PENDING
+    }
+    cells = {entry.geohash for entry in existing.values()} | set(queued.values())
+    densities = cell_densities(db, cells)
+    # Before the keys below: the shift must not apply to them
+    _update_cell_levels(db, cells, densities)
+
+    for issue in issues:
+        if issue.id not in queued:
+            if issue.id in existing:
+                db.delete(existing[issue.id])
+            continue
+        entry = existing.get(issue.id)
+        if entry is None:
+            entry = TriageQueueEntry(issue_id=issue.id)
+            db.add(entry)
+        entry.category = IssueCategory(issue.category)
+        entry.geohash = queued[issue.id]
+        entry.created_at = _as_utc(issue.created_at)
+        entry.priority_key = priority_key(entry.category, densities.get(entry.geohash, 0), entry.created_at)
+
+
+def _available(now: datetime):
+    return or_(TriageQueueEntry.claimed_by.is_(None), TriageQueueEntry.lease_expires_at < now)
+
+
+def claim_next(db: Session, admin_id: int) -> Optional[TriageQueueEntry]:
+    """
+    Claim the highest-priority issue nobody holds a lease on (commits)
+
+    PostgreSQL locks the candidate row with SKIP LOCKED, so concurrent claims
+    never wait on each other or hand out the same issue. Elsewhere the claim
+    is a conditional UPDATE that only succeeds if the row is still
+    available; a lost race moves on to the next candidate.
+    """
+    now = _utcnow()
+    lease = dict(claimed_by=admin_id, lease_expires_at=now + timedelta(seconds=TRIAGE_LEASE_SECONDS))
+    candidates = (
+        select(TriageQueueEntry)
+        .where(_available(now))
+        .order_by(TriageQueueEntry.priority_key.desc(), TriageQueueEntry.issue_id)
+        .limit(1)
+    )
+
+    if db.get_bind().dialect.name == "postgresql":
+        entry = db.scalars(candidates.with_for_update(skip_locked=True)).first()
+        if entry is None:
+            db.rollback()
+            return None
+        for field, value in lease.items():
+            setattr(entry, field, value)
+        db.commit()
+        return entry
+
+    for _ in range(_CLAIM_ATTEMPTS):
+        issue_id = db.scalar(candidates.with_only_columns(TriageQueueEntry.issue_id))
+        if issue_id is None:
+            return None
+        claimed = db.execute(
+            update(TriageQueueEntry)
+            .where(TriageQueueEntry.issue_id == issue_id, _available(now))
+            .values(**lease)
+        ).rowcount
+        db.commit()
+        if claimed:
+            return db.get(TriageQueueEntry, issue_id, populate_existing=True)
+    return None
+
+
+def next_claimable_priority(db: Session) -> Optional[float]:
+    """priority_key of the entry claim_next() would hand out, None if nothing is claimable"""
+    return db.scalar(select(func.max(TriageQueueEntry.priority_key)).where(_available(_utcnow())))
+
+
+def release_claim(db: Session, issue_id: int) -> bool:
+    """Give a claimed issue back to the queue (commits); False if not queued"""
+    entry = db.get(TriageQueueEntry, issue_id)
+    if entry is None:
+        return False
+    entry.claimed_by = None
+    entry.lease_expires_at = None
+    db.commit()
+    return True
+
+
+def queue_snapshot(db: Session, limit: int) -> List[TriageQueueEntry]:
+    """Top of the queue, claimed or not"""
+    return list(db.scalars(
+        select(TriageQueueEntry)
+        .order_by(TriageQueueEntry.priority_key.desc(), TriageQueueEntry.issue_id)
+        .limit(limit)
+    ))
+
+
+def rebuild_triage_queue(db: Session, chunk_size: int = 5000) -> int:
+    """
+    Make the queue match the pending issues and recompute every key, keeping
+    claims (commits per chunk, so claims are never blocked for long)
+
+    Returns:
+        Number of queued issues
+    """
+    pending_ids = select(Issue.id).where(Issue.status == IssueStatus.PENDING)
+    db.execute(delete(TriageQueueEntry).where(TriageQueueEntry.issue_id.not_in(pending_ids)))
+    db.commit()
+
+    # Pending issues missing from the queue (created before it existed)
+    missing = db.execute(
+        select(Issue.id, Issue.category, Issue.latitude, Issue.longitude, Issue.created_at)
+        .where(
+            Issue.status == IssueStatus.PENDING,
+            ~select(TriageQueueEntry.issue_id).where(TriageQueueEntry.issue_id == Issue.id).exists()
+        )
+        .order_by(Issue.id)
+    ).all()
+    for start in range(0, len(missing), chunk_size):
+        rows = missing[start:start + chunk_size]
+        codes = geohash_codes([row.latitude for row in rows], [row.longitude for row in rows])
+        try:
+            db.execute(TriageQueueEntry.__table__.insert(), [
+                dict(
+                    issue_id=row.id,
+                    category=row.category,
+                    geohash=code_to_geohash(code),
+                    created_at=_as_utc(row.created_at),
+                    priority_key=0.0
+                )
+                for row, code in zip(rows, np.asarray(codes))
+            ])
+            db.commit()
+        except IntegrityError:
+            # Queued concurrently (new issue or another worker's rebuild)
+            db.rollback()
+
+    # Recompute every key with the current density window; the cell levels
+    # come first, so writes in between compute their keys with the new ones
+    densities = cell_densities(db)
+    entries = db.execute(
+        select(TriageQueueEntry.issue_id, TriageQueueEntry.category,
+               TriageQueueEntry.geohash, TriageQueueEntry.created_at)
+    ).all()
+    cells = set(densities) | {row.geohash for row in entries}
+    db.execute(delete(TriageCell))
+    if cells:
+        levels = [
+            dict(geohash=cell, density_level=density_level(densities.get(cell, 0))) for cell in sorted(cells)
+        ]
+        upsert = dialect_insert(db)
+        if upsert is not None:
+            # A cell a concurrent rebuild or new report inserted since the
+            # delete gets the level computed here
+            statement = upsert(TriageCell)
+            db.execute(
+                statement.on_conflict_do_update(
+                    index_elements=[TriageCell.geohash],
+                    set_=dict(density_level=statement.excluded.density_level)
+                ),
+                levels
+            )
+        else:
+            db.execute(insert(TriageCell), levels)
+    db.commit()
+    # Table-level UPDATE: an entry removed since the select (status change)
+    # matches no row instead of failing the chunk
+    set_key = (
+        update(TriageQueueEntry.__table__)
+        .where(TriageQueueEntry.__table__.c.issue_id == bindparam("entry_id"))
+        .values(priority_key=bindparam("key"))
+    )
+    for start in range(0, len(entries), chunk_size):
+        db.execute(set_key, [
+            dict(
+                entry_id=row.issue_id,
+                key=priority_key(row.category, densities.get(row.geohash, 0), row.created_at)
+            )
+            for row in entries[start:start + chunk_size]
+        ])
+        db.commit()
+    return len(entries)
+
+
+def run_triage_refresh() -> int:
+    """Periodic job: rebuild the queue of every shard with its own session"""
+    return sum(for_each_shard(rebuild_triage_queue))
+
+
+if __name__ == "__main__":
+    import sys
+    from app import models  # noqa: F401
+    from app.database import Base, init_engine
+
+    if sys.argv[1:] != ["rebuild"]:
+        print("Usage: python -m app.triage rebuild")
+        sys.exit(1)
+    Base.metadata.create_all(bind=init_engine())
+    print(f"Queued {run_triage_refresh()} pending issues")
@@ -0,0 +1,268 @@
+"""
+Resumable image uploads (tus 1.0 core protocol + creation, expiration and
+termination extensions)
+
+A client creates an upload session with the total size, then PATCHes the
+bytes in as many requests as it needs; after a dropped connection it asks
+for the current offset (HEAD) and continues from there instead of starting
+over. The finished upload is attached to an issue by passing its id as
+upload_id when creating the issue.
+
+Sessions live next to the staged uploads (UPLOAD_DIR/tmp/resumable, never
+served): <id>.part holds the bytes received so far (its size is the
+offset, its mtime the last activity) and <id>.json the session metadata,
+so every worker of a host sees the same state. Chunks are streamed to disk
+at their offset; an exclusive file lock keeps two PATCHes of one upload from
+interleaving. Sessions idle for UPLOAD_SESSION_TTL_SECONDS are deleted by a
+periodic sweep.
+"""
+import base64
+import binascii
+import json
+import os
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from email.utils import formatdate
+from pathlib import Path
+from typing import AsyncIterator, Dict, NamedTuple, Optional
+from fastapi import HTTPException, status
+from starlette.concurrency import run_in_threadpool
+from dotenv import load_dotenv
+from app.file_lock import try_lock
+from app.file_utils import (
+    ALLOWED_EXTENSIONS,
+    ALLOWED_MIME_TYPES,
+    MAX_FILE_SIZE,
+    STAGING_DIR,
+    StagedImage,
+    verify_image
+)
+
+load_dotenv()
+
+TUS_VERSION = "1.0.0"
+TUS_EXTENSIONS = "creation,expiration,termination"
+UPLOAD_SESSION_TTL_SECONDS = int(os.getenv("UPLOAD_SESSION_TTL_SECONDS", "86400"))
+UPLOAD_SESSION_SWEEP_INTERVAL_SECONDS = int(os.getenv("UPLOAD_SESSION_SWEEP_INTERVAL_SECONDS", "3600"))
+
+RESUMABLE_DIR = STAGING_DIR / "resumable"
+
+_UPLOAD_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+class UploadSession(NamedTuple):
+    upload_id: str
+    user_id: int
+    length: int
+    file_ext: str
+    offset: int
+    expires_at: float
+
+    @property
+    def complete(self) -> bool:
+        return self.offset == self.length
+
+
+def _part_path(upload_id: str) -> Path:
+    return RESUMABLE_DIR / f"{upload_id}.part"
+
+
+def _info_path(upload_id: str) -> Path:
+    return RESUMABLE_DIR / f"{upload_id}.json"
+
+
+def _not_found(upload_id: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=f"Upload {upload_id} not found or expired"
+    )
+
+
+def http_date(timestamp: float) -> str:
+    return formatdate(timestamp, usegmt=True)
+
+
+def parse_metadata(header: Optional[str]) -> Dict[str, str]:
+    """Upload-Metadata: comma separated "key base64(value)" pairs"""
+    metadata = {}
+    for pair in (header or "").split(","):
+        key, _, value = pair.strip().partition(" ")
+        if not key:
+            continue
+        try:
+            metadata[key] = base64.b64decode(value.strip(), validate=True).decode("utf-8") if value else ""
+        except (binascii.Error, UnicodeDecodeError):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid Upload-Metadata value for '{key}'"
+            )
+    return metadata
+
+
+def create_session(user_id: int, length: int, metadata: Dict[str, str]) -> UploadSession:
+    """Validate the announced image and create an empty session"""
+    if length < 1 or length > MAX_FILE_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File too large. Maximum size: {MAX_FILE_SIZE / 1024 / 1024:.1f}MB"
+        )
+    filename = metadata.get("filename", "")
+    file_ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    if file_ext not in ALLOWED_EXTENSIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid file type. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}"
+        )
+    if metadata.get("filetype") not in ALLOWED_MIME_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid file content type. Only images are allowed."
+        )
+
+    RESUMABLE_DIR.mkdir(parents=True, exist_ok=True)
+    upload_id = uuid.uuid4().hex
+    _part_path(upload_id).touch()
+    _info_path(upload_id).write_text(json.dumps({"user_id": user_id, "length": length, "file_ext": file_ext}))
+    return get_session(upload_id, user_id)
+
+
+def get_session(upload_id: str, user_id: int) -> UploadSession:
+    """The caller's session, 404 if unknown, expired or someone else's"""
+    if not _UPLOAD_ID.match(upload_id):
+        raise _not_found(upload_id)
+    try:
+        info = json.loads(_info_path(upload_id).read_text())
+        stat = _part_path(upload_id).stat()
+    except (FileNotFoundError, ValueError):
+        raise _not_found(upload_id)
+    expires_at = stat.st_mtime + UPLOAD_SESSION_TTL_SECONDS
+    if info["user_id"] != user_id or expires_at < time.time():
+        raise _not_found(upload_id)
+    return UploadSession(upload_id, info["user_id"], info["length"], info["file_ext"], stat.st_size, expires_at)
+
+
+@contextmanager
+def _locked(upload_id: str, mode: str = "r+b"):
+    """Open the part file holding its exclusive lock (423 if a PATCH is running)"""
+    try:
+        f = open(_part_path(upload_id), mode)
+    except FileNotFoundError:
+        raise _not_found(upload_id)
+    try:
+        if not try_lock(f.fileno()):
+            raise HTTPException(
+                status_code=status.HTTP_423_LOCKED,
+                detail="Another request is writing to this upload"
+            )
+        yield f
+    finally:
+        f.close()
+
+
+def _finish_write(f) -> None:
+    f.flush()
+    # Last activity: keeps the session from expiring
+    os.utime(f.fileno())
+
+
+async def write_chunk(session: UploadSession, offset: int, chunks: AsyncIterator[bytes]) -> int:
+    """
+    Append a request body at offset, streamed straight to disk
+
+    Bytes received before a dropped connection are kept, so the client can
+    resume from wherever the transfer stopped.
+
+    Returns:
+        The new offset
+    """
+    with _locked(session.upload_id) as f:
+        # Re-read under the lock: the offset may have moved since get_session
+        current = os.fstat(f.fileno()).st_size
+        if offset != current:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Upload-Offset {offset} does not match the current offset {current}"
+            )
+        f.seek(offset)
+        written = offset
+        try:
+            async for chunk in chunks:
+                if written + len(chunk) > session.length:
+                    await run_in_threadpool(f.truncate, offset)
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail="Chunk exceeds the announced Upload-Length"
+                    )
+                # Disk writes off the event loop
+                await run_in_threadpool(f.write, chunk)
+                written += len(chunk)
+        finally:
+            await run_in_threadpool(_finish_write, f)
+        return written
+
+
+def delete_session(session: UploadSession) -> None:
+    with _locked(session.upload_id):
+        _info_path(session.upload_id).unlink(missing_ok=True)
+        _part_path(session.upload_id).unlink(missing_ok=True)
+
+
+def take_completed_upload(upload_id: str, user_id: int) -> StagedImage:
+    """
+    Turn a finished upload into a staged image for promote_staged_image()
+
+    The session is consumed: the bytes are moved (renamed) into the staging
+    directory and verified like a regular multipart upload. Blocking (file
+    lock, rename, image decoding): routes call it in the threadpool.
+    """
+    session = get_session(upload_id, user_id)
+    if not session.complete:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Upload {upload_id} is incomplete ({session.offset} of {session.length} bytes)"
+        )
+    staged = StagedImage(STAGING_DIR / f"{uuid.uuid4()}.{session.file_ext}", session.file_ext)
+    with _locked(upload_id):
+        os.replace(_part_path(upload_id), staged.path)
+        _info_path(upload_id).unlink(missing_ok=True)
+    # Staged now: restart the clock for cleanup_staged_images
+    os.utime(staged.path)
+    try:
+        verify_image(staged.path)
+    except HTTPException:
+        staged.path.unlink(missing_ok=True)
+        raise
+    return staged
+
+
+def cleanup_expired_uploads(ttl_seconds: int = UPLOAD_SESSION_TTL_SECONDS) -> int:
+    """
+    Delete sessions without activity for ttl_seconds
+
+    Returns:
+        Number of sessions removed
+    """
+    if not RESUMABLE_DIR.exists():
+        return 0
+    cutoff = time.time() - ttl_seconds
+    removed = 0
+    for info in RESUMABLE_DIR.glob("*.json"):
+        upload_id = info.stem
+        try:
+            last_activity = _part_path(upload_id).stat().st_mtime
+        except FileNotFoundError:
+            last_activity = 0  # consumed or half-deleted
+        if last_activity >= cutoff:
+            continue
+        try:
+            with _locked(upload_id, "rb"):
+                info.unlink(missing_ok=True)
+                _part_path(upload_id).unlink(missing_ok=True)
+        except HTTPException as e:
+            if e.status_code == status.HTTP_423_LOCKED:
+                continue  # being written right now
+            info.unlink(missing_ok=True)
+        removed += 1
+    return removed
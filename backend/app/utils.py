@@ -3,12 +3,14 @@ Utility functions for authentication and security
 """
 from datetime import datetime, timedelta
 from typing import Optional
-from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from app.database import get_db
+from app.rate_limit import RateLimiter
+from app.jwt_keys import sign_claims, verify_token
+from app.revocation import revocation_list
 import os
 from dotenv import load_dotenv
 
@@ -20,9 +22,7 @@ load_dotenv()
 # Password hashing context
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-# JWT Configuration
-SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this-in-production")
-ALGORITHM = os.getenv("ALGORITHM", "HS256")
+# JWT Configuration (keys and algorithm: see app/jwt_keys.py)
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 
 # OAuth2 scheme (tokenUrl should point to the login endpoint)
@@ -42,23 +42,21 @@ def get_password_hash(password: str) -> str:
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token"""
     to_encode = data.copy()
+    # The JWT spec (and python-jose) require "sub" to be a string
+    if "sub" in to_encode:
+        to_encode["sub"] = str(to_encode["sub"])
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+    return sign_claims(to_encode)
 
 
 def decode_access_token(token: str) -> Optional[dict]:
-    """Decode and verify a JWT token"""
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
-    except JWTError:
-        return None
+    """Decode and verify a JWT token (cached per process until exp)"""
+    return verify_token(token)
 
 
 async def get_current_user(
@@ -78,8 +76,14 @@ async def get_current_user(
     if payload is None:
         raise credentials_exception
     
-    user_id: int = payload.get("sub")
-    if user_id is None:
+    try:
+        user_id = int(payload.get("sub"))
+    except (TypeError, ValueError):
+        raise credentials_exception
+
+    # Logged out sessions (tokens issued before refresh tokens carry no sid)
+    session_id = payload.get("sid")
+    if session_id and revocation_list.is_revoked(db, session_id):
         raise credentials_exception
     
     user = db.query(User).filter(User.id == user_id).first()
@@ -110,3 +114,18 @@ async def get_current_admin_user(
         )
     return current_user
 
+
+
+def rate_limited_user(limiter: RateLimiter):
+    """
+    Build a dependency returning the current active user after consuming a
+    token from the user's bucket for the given limiter
+
+    Usage:
+        current_user = Depends(rate_limited_user(create_issue_rate_limit))
+    """
+    async def dependency(current_user = Depends(get_current_active_user)):
+        limiter.check(f"user:{current_user.id}")
+        return current_user
+
+    return dependency
@@ -0,0 +1,467 @@
+"""
+Administrative zones (districts) and point-in-polygon assignment
+
+Zone polygons are imported from GeoJSON into the zones table; every issue
+gets the id of the zone containing it (issues.zone_id, indexed) when it is
+created or moved, so listings, stats and exports filter by zone with a plain
+index lookup.
+
+Lookups use an in-memory index built with NumPy, per worker:
+- an STR-packed R-tree over the bounding boxes of all polygon parts, and
+- per part, its edges bucketed into latitude bands, so the even-odd ray test
+  only looks at the few edges crossing the point's band instead of all of a
+  complex polygon's edges.
+Batches of points are located in one vectorized pass. Where zones overlap
+the smallest one wins. Workers reload the index when the zones table
+changes (checked every ZONE_INDEX_CHECK_SECONDS).
+
+Import a GeoJSON FeatureCollection (and assign all issues), or re-assign:
+    python -m app.zones import districts.geojson --id-property district_id
+    python -m app.zones assign
+"""
+import math
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from sqlalchemy import bindparam, func, select, update
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+from app.models import Issue, Zone
+
+load_dotenv()
+
+# How often workers look for zone changes made elsewhere
+ZONE_INDEX_CHECK_SECONDS = float(os.getenv("ZONE_INDEX_CHECK_SECONDS", "30"))
+
+# R-tree fan-out and target number of edges per latitude band
+NODE_CAPACITY = 16
+BAND_EDGES = 4
+# Points located per vectorized pass (bounds temporary arrays)
+LOCATE_CHUNK_SIZE = 50000
+
+
+def _polygons(geometry: dict) -> List[list]:
+    """Polygons (lists of rings) of a GeoJSON Polygon or MultiPolygon"""
+    kind = geometry.get("type") if isinstance(geometry, dict) else None
+    if kind == "Polygon":
+        return [geometry["coordinates"]]
+    if kind == "MultiPolygon":
+        return list(geometry["coordinates"])
+    raise ValueError(f"Unsupported geometry type {kind!r} (Polygon or MultiPolygon expected)")
+
+
+def _closed_ring(ring) -> Optional[np.ndarray]:
+    points = np.asarray(ring, dtype=np.float64)
+    if points.ndim != 2 or points.shape[1] < 2:
+        raise ValueError("Invalid polygon ring")
+    points = points[:, :2]
+    if len(points) and not np.array_equal(points[0], points[-1]):
+        points = np.vstack([points, points[:1]])
+    return points if len(points) >= 4 else None
+
+
+def geometry_bounds(geometry: dict) -> Tuple[float, float, float, float]:
+    """(min_lon, min_lat, max_lon, max_lat) of a GeoJSON geometry"""
+    points = np.vstack([
+        ring for polygon in _polygons(geometry) for ring in map(_closed_ring, polygon) if ring is not None
+    ])
+    return (
+        float(points[:, 0].min()), float(points[:, 1].min()),
+        float(points[:, 0].max()), float(points[:, 1].max())
+    )
+
+
+def _ragged_arange(counts: np.ndarray) -> np.ndarray:
+    """[0..c0-1, 0..c1-1, ...] for counts [c0, c1, ...]"""
+    ends = np.cumsum(counts)
+    return np.arange(ends[-1] if len(ends) else 0) - np.repeat(ends - counts, counts)
+
+
+def _str_order(bbox: np.ndarray, capacity: int) -> np.ndarray:
+    """Sort-Tile-Recursive order: vertical slices by x, each sorted by y"""
+    count = len(bbox)
+    center_x = (bbox[:, 0] + bbox[:, 2]) / 2
+    center_y = (bbox[:, 1] + bbox[:, 3]) / 2
+    slice_size = capacity * math.ceil(math.sqrt(math.ceil(count / capacity)))
+    by_x = np.argsort(center_x, kind="stable")
+    return np.concatenate([
+        chunk[np.argsort(center_y[chunk], kind="stable")]
+        for chunk in (by_x[start:start + slice_size] for start in range(0, count, slice_size))
+    ])
+
+
+def _contains(bbox: np.ndarray, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    return (bbox[:, 0] <= x) & (x <= bbox[:, 2]) & (bbox[:, 1] <= y) & (y <= bbox[:, 3])
+
+
+class ZoneIndex:
+    """Immutable point -> zone index over (zone id, GeoJSON geometry) pairs"""
+
+    def __init__(self, zones: Iterable[Tuple[int, dict]]):
+        part_zone, part_rings = [], []
+        for zone_id, geometry in zones:
+            for polygon in _polygons(geometry):
+                rings = [ring for ring in map(_closed_ring, polygon) if ring is not None]
+                if rings:
+                    part_zone.append(zone_id)
+                    part_rings.append(rings)
+        self.part_count = len(part_rings)
+        if not self.part_count:
+            return
+
+        self.part_zone = np.asarray(part_zone, dtype=np.int64)
+        exteriors = [rings[0] for rings in part_rings]
+        self.part_bbox = np.array([
+            (ring[:, 0].min(), ring[:, 1].min(), ring[:, 0].max(), ring[:, 1].max()) for ring in exteriors
+        ])
+        # Shoelace area of the exterior ring: the smallest containing zone wins
+        self.part_area = np.array([
+            abs(np.dot(ring[:-1, 0], ring[1:, 1]) - np.dot(ring[1:, 0], ring[:-1, 1])) / 2 for ring in exteriors
+        ])
+
+        # Edges of all rings (holes included: the even-odd rule handles them)
+        segments = [
+            (part, ring[:-1], ring[1:])
+            for part, rings in enumerate(part_rings) for ring in rings
+        ]
+        edge_part = np.concatenate([np.full(len(start), part) for part, start, _ in segments])
+        start = np.concatenate([start for _, start, _ in segments])
+        end = np.concatenate([end for _, _, end in segments])
+        self.edges = np.column_stack([start, end])  # x1, y1, x2, y2
+        self._build_bands(edge_part)
+        self._build_tree()
+
+        # Plain lists for single point lookups (NumPy per-call overhead
+        # dominates when locating one point)
+        self._levels = [(bbox.tolist(), starts.tolist(), ends.tolist()) for bbox, starts, ends in self.levels]
+        self._leaf_parts = self.leaf_parts.tolist()
+        self._part_bbox = self.part_bbox.tolist()
+        self._part_zone = self.part_zone.tolist()
+        self._part_area = self.part_area.tolist()
+        self._band_count = self.band_count.tolist()
+        self._band_height = self.band_height.tolist()
+        self._band_start = self.band_start.tolist()
+
+    def _build_bands(self, edge_part: np.ndarray) -> None:
+        edges_per_part = np.bincount(edge_part, minlength=self.part_count)
+        self.band_count = np.maximum(1, edges_per_part // BAND_EDGES)
+        height = self.part_bbox[:, 3] - self.part_bbox[:, 1]
+        self.band_height = np.where(height > 0, height / self.band_count, 1.0)
+        self.band_start = np.cumsum(self.band_count) - self.band_count
+
+        # Every band an edge's latitude range overlaps
+        low = self._band_of(edge_part, np.minimum(self.edges[:, 1], self.edges[:, 3]))
+        high = self._band_of(edge_part, np.maximum(self.edges[:, 1], self.edges[:, 3]))
+        span = high - low + 1
+        edge = np.repeat(np.arange(len(edge_part)), span)
+        band = self.band_start[edge_part[edge]] + low[edge] + _ragged_arange(span)
+        order = np.argsort(band, kind="stable")
+        self.band_edges = edge[order]
+        self.band_ptr = np.concatenate([
+            [0], np.cumsum(np.bincount(band, minlength=int(self.band_count.sum())))
+        ])
+
+    def _band_of(self, parts: np.ndarray, y: np.ndarray) -> np.ndarray:
+        band = np.floor((y - self.part_bbox[parts, 1]) / self.band_height[parts]).astype(np.int64)
+        return np.clip(band, 0, self.band_count[parts] - 1)
+
+    def _build_tree(self) -> None:
+        # Leaves group consecutive parts in STR order; every level above
+        # groups consecutive nodes of the level below (re-sorted by STR)
+        self.leaf_parts = _str_order(self.part_bbox, NODE_CAPACITY)
+        child_bbox = self.part_bbox[self.leaf_parts]
+        self.levels = []
+        while True:
+            starts = np.arange(0, len(child_bbox), NODE_CAPACITY)
+            ends = np.minimum(starts + NODE_CAPACITY, len(child_bbox))
+            bbox = np.stack([
+                np.minimum.reduceat(child_bbox[:, 0], starts),
+                np.minimum.reduceat(child_bbox[:, 1], starts),
+                np.maximum.reduceat(child_bbox[:, 2], starts),
+                np.maximum.reduceat(child_bbox[:, 3], starts),
+            ], axis=1)
+            if len(bbox) <= NODE_CAPACITY:
+                self.levels.append((bbox, starts, ends))
+                break
+            order = _str_order(bbox, NODE_CAPACITY)
+            self.levels.append((bbox[order], starts[order], ends[order]))
+            child_bbox = bbox[order]
+
+    def locate(self, longitudes, latitudes) -> np.ndarray:
+        """Zone id per point, -1 where no zone contains it"""
+        x = np.asarray(longitudes, dtype=np.float64)
+        y = np.asarray(latitudes, dtype=np.float64)
+        result = np.full(len(x), -1, dtype=np.int64)
+        if not self.part_count:
+            return result
+        for start in range(0, len(x), LOCATE_CHUNK_SIZE):
+            chunk = slice(start, start + LOCATE_CHUNK_SIZE)
+            result[chunk] = self._locate(x[chunk], y[chunk])
+        return result
+
+    def locate_point(self, longitude: float, latitude: float) -> int:
+        """Zone id containing one point, -1 if none (same result as locate)"""
+        if not self.part_count:
+            return -1
+        x, y = float(longitude), float(latitude)
+        nodes = range(len(self._levels[-1][0]))
+        for bbox, starts, ends in reversed(self._levels):
+            children = []
+            for node in nodes:
+                min_x, min_y, max_x, max_y = bbox[node]
+                if min_x <= x <= max_x and min_y <= y <= max_y:
+                    children.extend(range(starts[node], ends[node]))
+            nodes = children
+
+        best_zone, best_area = -1, None
+        for position in nodes:
+            part = self._leaf_parts[position]
+            min_x, min_y, max_x, max_y = self._part_bbox[part]
+            if not (min_x <= x <= max_x and min_y <= y <= max_y):
+                continue
+            band = min(max(int((y - min_y) / self._band_height[part]), 0), self._band_count[part] - 1)
+            band += self._band_start[part]
+            edges = self.band_edges[self.band_ptr[band]:self.band_ptr[band + 1]]
+            inside = False
+            for x1, y1, x2, y2 in self.edges[edges].tolist():
+                if (y1 > y) != (y2 > y) and x < (x2 - x1) * (y - y1) / (y2 - y1) + x1:
+                    inside = not inside
+            if inside and (best_area is None or self._part_area[part] < best_area):
+                best_zone, best_area = self._part_zone[part], self._part_area[part]
+        return best_zone
+
+    def _locate(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        result = np.full(len(x), -1, dtype=np.int64)
+
+        # Descend the tree with (point, node) candidate pairs
+        top = len(self.levels[-1][0])
+        points = np.repeat(np.arange(len(x)), top)
+        nodes = np.tile(np.arange(top), len(x))
+        for bbox, starts, ends in reversed(self.levels):
+            hit = _contains(bbox[nodes], x[points], y[points])
+            points, nodes = points[hit], nodes[hit]
+            counts = ends[nodes] - starts[nodes]
+            points = np.repeat(points, counts)
+            nodes = np.repeat(starts[nodes], counts) + _ragged_arange(counts)
+        parts = self.leaf_parts[nodes]
+        hit = _contains(self.part_bbox[parts], x[points], y[points])
+        points, parts = points[hit], parts[hit]
+        if not len(points):
+            return result
+
+        # Even-odd ray test against the edges in each point's latitude band
+        px, py = x[points], y[points]
+        bands = self.band_start[parts] + self._band_of(parts, py)
+        counts = self.band_ptr[bands + 1] - self.band_ptr[bands]
+        pair = np.repeat(np.arange(len(points)), counts)
+        edges = self.band_edges[np.repeat(self.band_ptr[bands], counts) + _ragged_arange(counts)]
+        ey, ex = py[pair], px[pair]
+        x1, y1, x2, y2 = self.edges[edges].T
+        with np.errstate(divide="ignore", invalid="ignore"):
+            crossing = ((y1 > ey) != (y2 > ey)) & (ex < (x2 - x1) * (ey - y1) / (y2 - y1) + x1)
+        inside = np.bincount(pair, weights=crossing, minlength=len(points)).astype(np.int64) % 2 == 1
+        points, parts = points[inside], parts[inside]
+
+        # Smallest containing part per point
+        order = np.lexsort((self.part_area[parts], points))
+        points, parts = points[order], parts[order]
+        first = np.ones(len(points), dtype=bool)
+        first[1:] = points[1:] != points[:-1]
+        result[points[first]] = self.part_zone[parts[first]]
+        return result
+
+
+class _ZoneIndexCache:
+    """Per-worker index, rebuilt when the zones table changes"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = None
+        self._version = None
+        self._next_check = 0.0
+
+    def get(self, db: Session) -> ZoneIndex:
+        now = time.monotonic()
+        if self._index is not None and now < self._next_check:
+            return self._index
+        version = tuple(db.execute(select(func.count(Zone.id), func.max(Zone.updated_at))).one())
+        with self._lock:
+            if self._index is None or version != self._version:
+                self._index = ZoneIndex(db.execute(select(Zone.id, Zone.geometry)).all())
+                self._version = version
+            self._next_check = now + ZONE_INDEX_CHECK_SECONDS
+            return self._index
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._index = None
+
+
+zone_index = _ZoneIndexCache()
+
+
+def locate_zones(db: Session, latitudes: Sequence[float], longitudes: Sequence[float]) -> List[Optional[int]]:
+    """Zone id (or None) for each point"""
+    if not len(latitudes):
+        return []
+    index = zone_index.get(db)
+    if len(latitudes) == 1:
+        zone_id = index.locate_point(longitudes[0], latitudes[0])
+        return [zone_id if zone_id >= 0 else None]
+    zone_ids = index.locate(longitudes, latitudes)
+    return [int(zone_id) if zone_id >= 0 else None for zone_id in zone_ids]
+
+
+def locate_zone(db: Session, latitude: float, longitude: float) -> Optional[int]:
+    """Zone id containing a point, None if outside all zones"""
+    return locate_zones(db, [latitude], [longitude])[0]
+
+
+def import_zones(
+    db: Session,
+    geojson: dict,
+    id_property: Optional[str] = None,
+    name_property: str = "name",
+    replace: bool = False
+) -> Tuple[int, int]:
+    """
+    Insert or update zones from a GeoJSON FeatureCollection (commits)
+
+    A feature's code is its "id" member, or the id_property property if given.
+    With replace=True zones missing from the collection are deleted.
+
+    Returns:
+        (zones imported, zones deleted)
+    """
+    if geojson.get("type") != "FeatureCollection":
+        raise ValueError("A GeoJSON FeatureCollection is expected")
+    now = datetime.now(timezone.utc)
+    existing = {zone.code: zone for zone in db.query(Zone)}
+    imported = set()
+    for number, feature in enumerate(geojson.get("features", []), start=1):
+        properties = feature.get("properties") or {}
+        code = properties.get(id_property) if id_property else feature.get("id")
+        if code is None:
+            raise ValueError(f"Feature {number} has no {id_property or 'id'}")
+        code = str(code)
+        geometry = feature.get("geometry")
+        min_lon, min_lat, max_lon, max_lat = geometry_bounds(geometry)
+        zone = existing.get(code)
+        if zone is None:
+            zone = Zone(code=code)
+            db.add(zone)
+            existing[code] = zone
+        zone.name = str(properties.get(name_property) or code)
+        zone.geometry = geometry
+        zone.min_lon, zone.min_lat, zone.max_lon, zone.max_lat = min_lon, min_lat, max_lon, max_lat
+        zone.updated_at = now
+        imported.add(code)
+
+    removed = [zone for code, zone in existing.items() if code not in imported] if replace else []
+    if removed:
+        removed_ids = [zone.id for zone in removed]
+        db.execute(
+            update(Issue.__table__)
+            .where(Issue.__table__.c.zone_id.in_(removed_ids))
+            .values(zone_id=None, updated_at=Issue.__table__.c.updated_at)
+        )
+        for zone in removed:
+            db.delete(zone)
+    db.commit()
+    zone_index.invalidate()
+    return len(imported), len(removed)
+
+
+def assign_zones(
+    db: Session,
+    only_missing: bool = False,
+    chunk_size: int = 20000,
+    zones_db: Optional[Session] = None
+) -> Tuple[int, int]:
+    """
+    (Re)compute zone_id of existing issues, one vectorized lookup per chunk
+    (commits per chunk)
+
+    zones_db: session holding the zones when db is a shard (the primary)
+
+    Returns:
+        (issues checked, issues whose zone changed)
+    """
+    from app.sync import track_issue_changes
+
+    table = Issue.__table__
+    # updated_at is kept: a zone assignment is not an edit of the issue
+    assign = (
+        update(table)
+        .where(table.c.id == bindparam("issue_id"))
+        .values(zone_id=bindparam("new_zone_id"), updated_at=table.c.updated_at)
+    )
+    index = zone_index.get(zones_db or db)
+    checked = changed = 0
+    last_id = 0
+    while True:
+        query = select(
+            Issue.id, Issue.latitude, Issue.longitude, Issue.zone_id, Issue.category, Issue.status
+        ).where(Issue.id > last_id)
+        if only_missing:
+            query = query.where(Issue.zone_id.is_(None))
+        rows = db.execute(query.order_by(Issue.id).limit(chunk_size)).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        zone_ids = index.locate([row.longitude for row in rows], [row.latitude for row in rows])
+        moved = [
+            (row, int(zone_id) if zone_id >= 0 else None)
+            for row, zone_id in zip(rows, zone_ids)
+            if (int(zone_id) if zone_id >= 0 else None) != row.zone_id
+        ]
+        if moved:
+            db.execute(assign, [dict(issue_id=row.id, new_zone_id=zone_id) for row, zone_id in moved])
+            # Replicas (GET /api/issues/changes) pick up the new zone_id
+            track_issue_changes(db, [row for row, _ in moved])
+        db.commit()
+        checked += len(rows)
+        changed += len(moved)
+    return checked, changed
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    from app import models  # noqa: F401
+    from app.database import SessionLocal, init_engine
+    from app.sharding import for_each_shard, init_shard_schemas
+
+    parser = argparse.ArgumentParser(description="Manage administrative zones")
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_parser = commands.add_parser("import", help="import zones from GeoJSON and assign issues")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--id-property", help="feature property holding the zone code (default: feature id)")
+    import_parser.add_argument("--name-property", default="name")
+    import_parser.add_argument("--replace", action="store_true", help="delete zones missing from the file")
+    assign_parser = commands.add_parser("assign", help="recompute zone_id of existing issues")
+    assign_parser.add_argument("--only-missing", action="store_true")
+    args = parser.parse_args()
+
+    init_engine()
+    init_shard_schemas()
+    db = SessionLocal()
+    try:
+        if args.command == "import":
+            with open(args.path) as f:
+                imported, deleted = import_zones(
+                    db, json.load(f), args.id_property, args.name_property, args.replace
+                )
+            print(f"Imported {imported} zones, deleted {deleted}")
+        started = time.perf_counter()
+        only_missing = getattr(args, "only_missing", False)
+        results = for_each_shard(
+            lambda shard_db: assign_zones(shard_db, only_missing=only_missing, zones_db=db), primary=db
+        )
+        checked, changed = (sum(values) for values in zip(*results))
+        print(f"Checked {checked} issues in {time.perf_counter() - started:.1f}s, {changed} changed zone")
+    finally:
+        db.close()
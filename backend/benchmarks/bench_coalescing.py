@@ -0,0 +1,108 @@
+"""
+Benchmark: a request stampede with and without request coalescing
+
+Fires bursts of concurrent identical reads (half GET /api/issues/?category=
+safety, half GET /api/issues/{id}) in-process at rising concurrency and
+counts the SQL statements executed per burst. With coalescing the database
+load stays flat as concurrency rises; without it, it grows linearly until
+admission control starts shedding requests with 503.
+
+    python benchmarks/bench_coalescing.py --concurrency 1 10 100 1000
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def seed(issues: int) -> None:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from seed_data import seed as seed_data
+
+    seed_data(users=50, issues=issues, notifications=0)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def burst(client, concurrency: int, issue_id: int):
+    async def one(index):
+        started = time.perf_counter()
+        if index % 2:
+            response = await client.get(f"/api/issues/{issue_id}")
+        else:
+            response = await client.get("/api/issues/", params={"category": "safety", "limit": 100})
+        return time.perf_counter() - started, response.status_code, response.headers.get("x-coalesced") == "1"
+
+    return await asyncio.gather(*(one(index) for index in range(concurrency)))
+
+
+async def main(args):
+    import httpx
+    from sqlalchemy import event
+    from app import coalescing
+    from app.database import init_engine
+    from app.main import app
+
+    seed(args.issues)
+    await app.router.startup()
+    statements = 0
+
+    def count(*_):
+        nonlocal statements
+        statements += 1
+
+    event.listen(init_engine(), "before_cursor_execute", count)
+    transport = httpx.ASGITransport(app=app)
+    results = {"bursts": args.bursts, "runs": []}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        issue_id = (await client.get("/api/issues/", params={"limit": 1})).json()[0]["id"]
+        for enabled in (False, True):
+            coalescing.COALESCING_ENABLED = enabled
+            for concurrency in args.concurrency:
+                await burst(client, concurrency, issue_id)  # warm up
+                statements = 0
+                latencies, coalesced, shed = [], 0, 0
+                started = time.perf_counter()
+                for _ in range(args.bursts):
+                    for latency, status_code, shared in await burst(client, concurrency, issue_id):
+                        latencies.append(latency)
+                        coalesced += shared
+                        # Admission control rejects what it can't serve in time
+                        shed += status_code == 503
+                elapsed = time.perf_counter() - started
+                results["runs"].append({
+                    "coalescing": enabled,
+                    "concurrency": concurrency,
+                    "sql_statements_per_burst": round(statements / args.bursts, 1),
+                    "coalesced_share": round(coalesced / len(latencies), 3),
+                    "shed_503": shed,
+                    "requests_per_second": round(len(latencies) / elapsed),
+                    "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+                    "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+                })
+    await app.router.shutdown()
+    results["stats"] = coalescing.coalescing_stats.snapshot()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50, 200, 1000])
+    parser.add_argument("--bursts", type=int, default=5)
+    parser.add_argument("--issues", type=int, default=5000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{workdir}/bench.db")
+    os.environ.setdefault("UPLOAD_DIR", f"{workdir}/uploads")
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    sys.path.insert(0, BACKEND_DIR)
+    asyncio.run(main(args))
@@ -0,0 +1,84 @@
+"""
+Benchmark: bytes on the wire and CPU per response for a 100-issue page
+
+Requests GET /api/issues/?limit=100 in-process with each Accept-Encoding
+and reports the transferred size and the CPU time per response (including
+compression). Also compares the JSON encoding step alone: stdlib json
+(JSONResponse) vs orjson (ORJSONResponse).
+
+    python benchmarks/bench_compression.py --requests 500
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def seed(issues: int) -> None:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from seed_data import seed as seed_data
+
+    seed_data(users=50, issues=issues, notifications=0)
+
+
+def encoder_cost(body, rounds: int) -> dict:
+    from fastapi.responses import JSONResponse, ORJSONResponse
+
+    results = {}
+    for name, response_class in (("json", JSONResponse), ("orjson", ORJSONResponse)):
+        started = time.process_time()
+        for _ in range(rounds):
+            content = response_class(body).body
+        results[name] = {
+            "cpu_us_per_response": round((time.process_time() - started) / rounds * 1e6, 1),
+            "bytes": len(content),
+        }
+    return results
+
+
+async def main(args):
+    import httpx
+    from app.main import app
+    from app.compression import available_encoders
+
+    seed(args.issues)
+    await app.router.startup()
+    transport = httpx.ASGITransport(app=app)
+    results = {"page_size": 100, "encodings": {}}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        body = (await client.get("/api/issues/", params={"limit": 100})).json()
+        results["json_encoding"] = encoder_cost(body, args.requests)
+
+        for encoding in ["identity"] + list(available_encoders()):
+            headers = {"Accept-Encoding": encoding}
+            wire_bytes = 0
+            started = time.process_time()
+            for _ in range(args.requests):
+                response = await client.get("/api/issues/", params={"limit": 100}, headers=headers)
+                wire_bytes = response.num_bytes_downloaded
+            cpu = time.process_time() - started
+            results["encodings"][encoding] = {
+                "content_encoding": response.headers.get("content-encoding", "identity"),
+                "wire_bytes": wire_bytes,
+                "cpu_ms_per_response": round(cpu / args.requests * 1000, 3),
+            }
+    await app.router.shutdown()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--issues", type=int, default=1000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{workdir}/bench.db")
+    os.environ.setdefault("UPLOAD_DIR", f"{workdir}/uploads")
+    sys.path.insert(0, BACKEND_DIR)
+    asyncio.run(main(args))
@@ -0,0 +1,122 @@
+"""
+Benchmark: issue creation latency and DB connection hold time
+
+Runs POST /api/issues/ (with a small image) concurrently against the app
+in-process and records, through pool checkout/checkin events, how long
+each request keeps a database connection.
+
+    python benchmarks/bench_create_issue.py --requests 500 --concurrency 32
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0.0
+
+
+def summarize(values):
+    return {
+        "p50_ms": round(percentile(values, 50) * 1000, 2),
+        "p95_ms": round(percentile(values, 95) * 1000, 2),
+        "p99_ms": round(percentile(values, 99) * 1000, 2),
+        "mean_ms": round(statistics.fmean(values) * 1000, 2) if values else 0.0,
+    }
+
+
+async def main(args):
+    import httpx
+    from PIL import Image
+    from sqlalchemy import event
+    from app.main import app
+    from app import database
+
+    await app.router.startup()
+    engine = database.init_engine()
+
+    hold_times = []
+    checkout_at = {}
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_conn, record, proxy):
+        checkout_at[id(record)] = time.perf_counter()
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(dbapi_conn, record):
+        started = checkout_at.pop(id(record), None)
+        if started is not None:
+            hold_times.append(time.perf_counter() - started)
+
+    buf = io.BytesIO()
+    Image.new("RGB", (640, 480), (200, 30, 30)).save(buf, "JPEG")
+    image_bytes = buf.getvalue()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.post("/api/auth/register", json={
+            "name": "Bench", "email": "bench@example.com", "password": "bench-password"
+        })
+        r = await client.post("/api/auth/login", data={
+            "username": "bench@example.com", "password": "bench-password"
+        })
+        headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+        latencies = []
+        queue = asyncio.Queue()
+        for i in range(args.requests):
+            queue.put_nowait(i)
+
+        async def worker():
+            while not queue.empty():
+                i = queue.get_nowait()
+                started = time.perf_counter()
+                r = await client.post(
+                    "/api/issues/",
+                    params={
+                        "title": f"Bench issue {i}", "description": "Benchmark",
+                        "category": "infrastructure", "latitude": 9.0, "longitude": 38.7,
+                    },
+                    files={"image": ("photo.jpg", image_bytes, "image/jpeg")},
+                    headers=headers,
+                )
+                latencies.append(time.perf_counter() - started)
+                if r.status_code != 201:
+                    raise RuntimeError(f"{r.status_code}: {r.text}")
+
+        hold_times.clear()
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    await app.router.shutdown()
+    print(json.dumps({
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "rps": round(args.requests / elapsed, 1),
+        "latency": summarize(latencies),
+        "connection_hold": summarize(hold_times),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{workdir}/bench.db")
+    os.environ.setdefault("UPLOAD_DIR", f"{workdir}/uploads")
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    sys.path.insert(0, BACKEND_DIR)
+    asyncio.run(main(args))
@@ -0,0 +1,136 @@
+"""
+Benchmark: export throughput (rows/s) and peak memory per format
+
+Seeds N issues into a scratch SQLite database, then streams
+GET /api/issues/export in every format through the app in-process.
+Peak Python memory is tracked with tracemalloc and should not grow
+with --rows.
+
+    python benchmarks/bench_export.py --rows 200000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def seed(rows: int) -> None:
+    from sqlalchemy import insert
+    from app import database
+    from app.models import Issue, IssueCategory, IssueStatus, User, UserRole
+
+    engine = database.init_engine()
+    database.Base.metadata.create_all(bind=engine)
+    rng = random.Random(42)
+    categories = list(IssueCategory)
+    statuses = list(IssueStatus)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [dict(
+            name="Seed", email="seed@example.com", password_hash="x", role=UserRole.USER
+        )])
+        batch = []
+        for i in range(rows):
+            batch.append(dict(
+                title=f"Issue {i}",
+                description="Seeded issue " * 8,
+                category=rng.choice(categories),
+                status=rng.choice(statuses),
+                latitude=rng.uniform(8.8, 9.2),
+                longitude=rng.uniform(38.6, 39.0),
+                reporter_id=1,
+            ))
+            if len(batch) == 10000:
+                conn.execute(insert(Issue), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(Issue), batch)
+
+
+async def stream_asgi(app, path: str, query: str) -> int:
+    """
+    Call the ASGI app directly and discard body chunks as they arrive
+    (httpx's ASGITransport would buffer the whole response in memory)
+    """
+    size = 0
+    status = None
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": query.encode(), "headers": [(b"host", b"bench")],
+        "server": ("bench", 80), "client": ("127.0.0.1", 1234), "root_path": "",
+    }
+
+    request_sent = False
+    disconnected = asyncio.Event()
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # The client never disconnects while the response streams
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal size, status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            size += len(message.get("body", b""))
+
+    await app(scope, receive, send)
+    if status != 200:
+        raise RuntimeError(f"export returned {status}")
+    return size
+
+
+async def measure(app, export_format: str, rows: int) -> dict:
+    tracemalloc.start()
+    started = time.perf_counter()
+    size = await stream_asgi(app, "/api/issues/export", f"format={export_format}")
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "format": export_format,
+        "rows_per_second": round(rows / elapsed),
+        "seconds": round(elapsed, 2),
+        "bytes": size,
+        "peak_memory_mb": round(peak / 1024 / 1024, 1),
+    }
+
+
+async def main(args):
+    from app.main import app
+    from app.export import EXPORT_FORMATS
+
+    seed(args.rows)
+    await app.router.startup()
+    results = []
+    for export_format in args.formats or list(EXPORT_FORMATS):
+        result = await measure(app, export_format, args.rows)
+        print(json.dumps(result))
+        results.append(result)
+    await app.router.shutdown()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--formats", nargs="*")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{workdir}/bench.db")
+    os.environ.setdefault("UPLOAD_DIR", f"{workdir}/uploads")
+    sys.path.insert(0, BACKEND_DIR)
+    asyncio.run(main(args))
@@ -0,0 +1,131 @@
+"""
+Benchmark: sustained report ingestion, direct inserts vs the ingest buffer
+
+Concurrent clients POST /api/issues/ in-process for a fixed time, first
+with a database commit per report (INGEST_MODE=direct), then acknowledged
+from the write-ahead log (INGEST_MODE=buffered). For the buffered run the
+time until the flusher has inserted every report is included as well, so
+"issues_per_second" compares end-to-end throughput; "flush_issues_per_second"
+is the database write rate of the flusher alone.
+
+    python benchmarks/bench_ingest.py --clients 64 --duration 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def seed(users: int) -> None:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from seed_data import seed as seed_data
+
+    seed_data(users=users, issues=1000, notifications=0)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def run(client, tokens, clients: int, duration: float):
+    latencies, statuses = [], {}
+    deadline = time.perf_counter() + duration
+
+    async def reporter(number):
+        headers = {"Authorization": f"Bearer {tokens[number % len(tokens)]}"}
+        sent = 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            response = await client.post("/api/issues/", params=dict(
+                title=f"Flooded street {number}-{sent}",
+                description="Water is rising quickly near the market",
+                category="safety",
+                latitude=9.0 + number * 1e-3,
+                longitude=38.7 + sent * 1e-4
+            ), headers=headers)
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            sent += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(reporter(number) for number in range(clients)))
+    return latencies, statuses, time.perf_counter() - started
+
+
+async def main(args):
+    import httpx
+    from starlette.concurrency import run_in_threadpool
+    from app import database
+    from app.ingest import ingest_log, run_ingest_flush
+    from app.main import app
+    from app.models import Issue
+    from app.routers import issues
+    from seed_data import PASSWORD, user_email
+
+    seed(args.users)
+    await app.router.startup()
+    transport = httpx.ASGITransport(app=app)
+    results = {"clients": args.clients, "duration_s": args.duration, "runs": {}}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        tokens = []
+        for index in range(args.users):
+            response = await client.post("/api/auth/login/json", json={"email": user_email(index), "password": PASSWORD})
+            tokens.append(response.json()["access_token"])
+
+        for mode in ("direct", "buffered"):
+            issues.INGEST_MODE = mode
+            if mode == "buffered":
+                ingest_log.open()
+            db = database.SessionLocal()
+            before = db.query(Issue).count()
+            latencies, statuses, elapsed = await run(client, tokens, args.clients, args.duration)
+            acknowledged = sum(count for code, count in statuses.items() if code in (201, 202))
+            total = elapsed
+            flush_seconds = None
+            if mode == "buffered":
+                started = time.perf_counter()
+                await run_in_threadpool(run_ingest_flush)
+                flush_seconds = time.perf_counter() - started
+                total += flush_seconds
+            created = db.query(Issue).count() - before
+            db.close()
+            results["runs"][mode] = {
+                "statuses": statuses,
+                "acknowledged_per_second": round(acknowledged / elapsed),
+                "issues_created": created,
+                "issues_per_second": round(created / total),
+                "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+                "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+            }
+            if mode == "buffered":
+                results["runs"][mode].update(
+                    records_per_fsync=round(ingest_log.appended / max(ingest_log.fsyncs, 1), 1),
+                    # Database side alone: bulk inserts by the flusher
+                    flush_issues_per_second=round(created / flush_seconds)
+                )
+    await app.router.shutdown()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--users", type=int, default=50)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{workdir}/bench.db")
+    os.environ.setdefault("UPLOAD_DIR", f"{workdir}/uploads")
+    os.environ.setdefault("INGEST_DIR", f"{workdir}/ingest")
+    # Only the final flush inserts, so the runs don't overlap
+    os.environ.setdefault("INGEST_FLUSH_INTERVAL_SECONDS", "3600")
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    sys.path.insert(0, BACKEND_DIR)
+    asyncio.run(main(args))
@@ -0,0 +1,184 @@
+"""
+Benchmark: merged reads over regional shards vs. one database
+
+Seeds a SQLite database with benchmarks/seed_data.py and keeps a copy of it
+as the single-database reference. The seeded database then becomes the
+primary of --shards SQLite files, and the planned rebalance moves regions
+onto the empty shards. Every merged read (latest issues, a deep page,
+heatmap, trends, SLA, zone stats, the change feed) is compared with the same
+query on the reference and timed on both.
+
+    python benchmarks/bench_sharding.py --issues 50000 --shards 4
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def timed(func, repeat: int):
+    """(result of the last call, best time in ms)"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return result, round(best, 2)
+
+
+def by_key(rows, key: str) -> dict:
+    return {row[key]: {k: v for k, v in row.items() if k != key} for row in rows}
+
+
+def zone_totals(rows) -> list:
+    """Sorted [zone_id, status, category, count] (merged rows may repeat a combination)"""
+    totals = {}
+    for zone_id, issue_status, category, count in rows:
+        key = (zone_id if zone_id is not None else -1, issue_status.value, category.value)
+        totals[key] = totals.get(key, 0) + count
+    return [[*key, count] for key, count in sorted(totals.items())]
+
+
+def all_changes(read) -> list:
+    """Every issue id of the change feed, following its tokens"""
+    ids, token = [], None
+    while True:
+        issues, deleted, token, has_more = read(token)
+        ids.extend(issue.id for issue in issues)
+        ids.extend(deleted)
+        if not has_more:
+            return sorted(ids)
+
+
+def main(args):
+    from sqlalchemy import func, select
+    from sqlalchemy.orm import sessionmaker
+    from app import database, sharding
+    from app.analytics import heatmap, trends
+    from app.issue_events import sla_report
+    from app.models import Issue
+    from app.shard_queries import (
+        issue_changes,
+        latest_issues,
+        merged_heatmap,
+        merged_sla_report,
+        merged_trends,
+        zone_issue_counts
+    )
+    from app.sync import backfill_issue_changes, changes_since, decode_sync_token, encode_sync_token
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from seed_data import seed
+
+    print(json.dumps({"seeded": seed(200, args.issues, 0, days=args.days)}))
+    primary = database.SessionLocal()
+    backfill_issue_changes(primary)
+    primary.close()
+    shutil.copy(args.primary_path, args.reference_path)
+    reference = sessionmaker(bind=database.create_db_engine(f"sqlite:///{args.reference_path}"))()
+
+    sharding.init_shard_schemas()
+    primary = database.SessionLocal()
+    plan = sharding.plan_rebalance(sharding.region_loads(primary))
+    started = time.perf_counter()
+    moved = 0
+    for region, _, target, _ in plan:
+        # Nothing else runs: no need to wait for workers to reload the map
+        sharding.pin_region(primary, region, target)
+        moved += sharding.move_region(primary, region, target)
+    print(json.dumps({
+        "moved_regions": len(plan),
+        "moved_issues": moved,
+        "move_seconds": round(time.perf_counter() - started, 2),
+        "issues_per_shard": [row["issues"] for row in sharding.shard_status(primary)],
+    }))
+
+    def reference_page(skip: int, limit: int):
+        return reference.scalars(
+            select(Issue).order_by(Issue.created_at.desc(), Issue.id.desc()).offset(skip).limit(limit)
+        ).all()
+
+    def reference_changes(token):
+        issues, deleted, last_seq, has_more = changes_since(reference, decode_sync_token(token), args.page_size)
+        return issues, deleted, encode_sync_token(last_seq), has_more
+
+    cases = [
+        (
+            "latest",
+            lambda: [issue.id for issue in latest_issues(primary, 0, args.page_size)],
+            lambda: [issue.id for issue in reference_page(0, args.page_size)],
+        ),
+        (
+            "deep_page",
+            lambda: [issue.id for issue in latest_issues(primary, args.deep_skip, args.page_size)],
+            lambda: [issue.id for issue in reference_page(args.deep_skip, args.page_size)],
+        ),
+        (
+            "heatmap",
+            lambda: by_key(merged_heatmap(primary, 5), "geohash"),
+            lambda: by_key(heatmap(reference, 5), "geohash"),
+        ),
+        (
+            "trends",
+            lambda: by_key(merged_trends(primary, 5, 30, 7, None, 1000), "geohash"),
+            lambda: by_key(trends(reference, 5, 30, 7, None, 1000), "geohash"),
+        ),
+        (
+            "sla",
+            lambda: merged_sla_report(primary),
+            lambda: sla_report(reference),
+        ),
+        (
+            "zone_stats",
+            lambda: zone_totals(zone_issue_counts(primary)),
+            lambda: zone_totals(reference.execute(
+                select(Issue.zone_id, Issue.status, Issue.category, func.count(Issue.id))
+                .group_by(Issue.zone_id, Issue.status, Issue.category)
+            ).all()),
+        ),
+        (
+            "changes",
+            lambda: all_changes(lambda token: issue_changes(primary, token, args.page_size)),
+            lambda: all_changes(reference_changes),
+        ),
+    ]
+    failures = 0
+    for name, sharded, single in cases:
+        sharded_result, sharded_ms = timed(sharded, args.repeat)
+        single_result, single_ms = timed(single, args.repeat)
+        same = json.dumps(sharded_result, default=str, sort_keys=True) == json.dumps(single_result, default=str, sort_keys=True)
+        failures += not same
+        print(json.dumps({"query": name, "sharded_ms": sharded_ms, "single_ms": single_ms, "same_result": same}))
+
+    primary.close()
+    reference.close()
+    sharding.dispose_shard_engines()
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--issues", type=int, default=20000)
+    parser.add_argument("--shards", type=int, default=3, help="databases besides the primary")
+    parser.add_argument("--days", type=int, default=60, help="spread of issue creation dates")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--deep-skip", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    args.primary_path = f"{workdir}/primary.db"
+    args.reference_path = f"{workdir}/single.db"
+    # Read when app.sharding is imported
+    os.environ["DATABASE_URL"] = f"sqlite:///{args.primary_path}"
+    os.environ["SHARD_URLS"] = ",".join(f"sqlite:///{workdir}/shard{k}.db" for k in range(1, args.shards + 1))
+    # The seeded hotspots are a few kilometres apart
+    os.environ.setdefault("SHARD_GEOHASH_PRECISION", "5")
+    os.environ.setdefault("UPLOAD_DIR", f"{workdir}/uploads")
+    sys.path.insert(0, BACKEND_DIR)
+    sys.exit(1 if main(args) else 0)
@@ -0,0 +1,107 @@
+"""
+Benchmark: unread count via COUNT(*) vs. the per-user counter row
+
+Seeds --notifications rows (default 10^6) spread over --users users, builds
+the counters with the reconciliation job, then times both lookups for
+random users.
+
+    python benchmarks/bench_unread_count.py --notifications 1000000 --users 1000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def seed(engine, notifications: int, users: int) -> None:
+    from sqlalchemy import insert
+    from app.models import Notification, User, UserRole
+
+    rng = random.Random(7)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            dict(name=f"User {i}", email=f"user{i}@example.com", password_hash="x", role=UserRole.USER)
+            for i in range(users)
+        ])
+        batch = []
+        for _ in range(notifications):
+            batch.append(dict(
+                user_id=rng.randint(1, users),
+                title="Issue Status Update",
+                message="Your issue is now in progress.",
+                is_read=rng.random() < 0.7,
+            ))
+            if len(batch) == 50000:
+                conn.execute(insert(Notification), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(Notification), batch)
+
+
+def timed(func, user_ids):
+    durations = []
+    for user_id in user_ids:
+        started = time.perf_counter()
+        func(user_id)
+        durations.append(time.perf_counter() - started)
+    durations.sort()
+    return {
+        "p50_us": round(durations[len(durations) // 2] * 1e6, 1),
+        "p99_us": round(durations[int(len(durations) * 0.99)] * 1e6, 1),
+        "mean_us": round(statistics.fmean(durations) * 1e6, 1),
+    }
+
+
+def main(args):
+    from sqlalchemy import func, select
+    from app import database
+    from app.models import Notification
+    from app.notification_service import reconcile_unread_counts, unread_count_for_user
+
+    engine = database.init_engine()
+    database.Base.metadata.create_all(bind=engine)
+    seed(engine, args.notifications, args.users)
+
+    db = database.SessionLocal()
+    reconcile_unread_counts(db)
+
+    def count_query(user_id):
+        return db.scalar(
+            select(func.count(Notification.id)).where(
+                Notification.user_id == user_id, Notification.is_read == False
+            )
+        )
+
+    def counter_lookup(user_id):
+        return unread_count_for_user(db, user_id)
+
+    rng = random.Random(1)
+    user_ids = [rng.randint(1, args.users) for _ in range(args.lookups)]
+    assert all(count_query(u) == counter_lookup(u) for u in user_ids[:50])
+    print(json.dumps({
+        "notifications": args.notifications,
+        "users": args.users,
+        "count_query": timed(count_query, user_ids),
+        "counter_lookup": timed(counter_lookup, user_ids),
+    }, indent=2))
+    db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--notifications", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{workdir}/bench.db")
+    os.environ.setdefault("UPLOAD_DIR", f"{workdir}/uploads")
+    sys.path.insert(0, BACKEND_DIR)
+    main(args)
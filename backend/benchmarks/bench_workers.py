@@ -0,0 +1,98 @@
+"""
+Benchmark: requests per second vs. number of worker processes
+
+Starts the production launcher (serve.py) with 1, 2, 4 ... workers on a
+scratch SQLite database and hammers a route with concurrent keep-alive
+clients. RPS should grow roughly linearly until the CPU count is reached.
+
+    python benchmarks/bench_workers.py --workers 1 2 4 --duration 10
+    python benchmarks/bench_workers.py --path /api/issues/?limit=20
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_server(workers: int, port: int, db_dir: str) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        WEB_CONCURRENCY=str(workers),
+        PORT=str(port),
+        HOST="127.0.0.1",
+        DATABASE_URL=f"sqlite:///{db_dir}/bench.db",
+        UPLOAD_DIR=f"{db_dir}/uploads",
+        ACCESS_LOG="",
+        LOG_LEVEL="warning",
+    )
+    return subprocess.Popen([sys.executable, "serve.py"], cwd=BACKEND_DIR, env=env)
+
+
+def wait_ready(url: str, timeout: float = 30.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(url + "/health").status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+async def load(url: str, path: str, concurrency: int, duration: float) -> int:
+    done = 0
+    stop = time.perf_counter() + duration
+
+    async def client():
+        nonlocal done
+        async with httpx.AsyncClient(base_url=url) as c:
+            while time.perf_counter() < stop:
+                r = await c.get(path)
+                r.raise_for_status()
+                done += 1
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return done
+
+
+def run(workers: int, port: int, path: str, concurrency: int, duration: float) -> float:
+    url = f"http://127.0.0.1:{port}"
+    with tempfile.TemporaryDirectory() as db_dir:
+        proc = start_server(workers, port, db_dir)
+        try:
+            wait_ready(url)
+            asyncio.run(load(url, path, concurrency, 1.0))  # warm-up
+            count = asyncio.run(load(url, path, concurrency, duration))
+            return count / duration
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    cpus = multiprocessing.cpu_count()
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=sorted({1, 2, 4, cpus} & set(range(1, cpus + 1))))
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--path", default="/health")
+    args = parser.parse_args()
+
+    results = {}
+    for n in args.workers:
+        rps = run(n, args.port, args.path, args.concurrency, args.duration)
+        results[n] = round(rps, 1)
+        print(f"workers={n:<3} rps={rps:,.0f}")
+    print(json.dumps({"path": args.path, "cpus": cpus, "rps_by_workers": results}))
@@ -0,0 +1,126 @@
+"""
+Benchmark: point -> zone assignment with many complex polygons
+
+Builds a grid of districts whose shared borders wiggle (so every polygon
+has thousands of vertices and the grid still tiles without gaps or
+overlaps), then times the index build, batch assignment (as used by the
+backfill and batch uploads) and single lookups (issue creation), and checks
+the results against a brute-force even-odd test over every edge.
+
+    python benchmarks/bench_zones.py --grid 50 --vertices-per-side 250
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# City-sized area (degrees)
+MIN_LON, MIN_LAT, SPAN = -0.5, 51.3, 0.4
+
+
+def border(fixed: float, start: float, count: int, horizontal: bool, wiggle: float) -> np.ndarray:
+    """Points along a cell side; the offset depends only on the side, so neighbours share it"""
+    t = np.linspace(0.0, 1.0, count, endpoint=False)
+    along = start + t
+    offset = wiggle * np.sin(np.pi * t) * np.sin(7.3 * along + 3.1 * fixed)
+    if horizontal:
+        return np.column_stack([along, fixed + offset])
+    return np.column_stack([fixed + offset, along])
+
+
+def district(i: int, j: int, count: int, wiggle: float) -> dict:
+    """Cell (i, j) of the unit grid with wiggly borders, as GeoJSON (lon/lat)"""
+    bottom = border(j, i, count, True, wiggle)
+    right = border(i + 1, j, count, False, wiggle)
+    top = border(j + 1, i, count, True, wiggle)
+    left = border(i, j, count, False, wiggle)
+    ring = np.vstack([
+        bottom,
+        right,
+        np.vstack([top, [[i + 1, j + 1]]])[:0:-1],
+        np.vstack([left, [[i, j + 1]]])[:0:-1],
+    ])
+    ring = np.vstack([ring, ring[:1]])
+    return {"type": "Polygon", "coordinates": [ring.tolist()]}
+
+
+def scale(geometry: dict, grid: int) -> dict:
+    ring = np.asarray(geometry["coordinates"][0])
+    ring = np.column_stack([MIN_LON + ring[:, 0] / grid * SPAN, MIN_LAT + ring[:, 1] / grid * SPAN])
+    return {"type": "Polygon", "coordinates": [ring.tolist()]}
+
+
+def brute_force(rings, lon: float, lat: float) -> int:
+    """Every edge of every polygon, no index"""
+    found = -1
+    for zone_id, ring in rings:
+        x1, y1, x2, y2 = ring[:-1, 0], ring[:-1, 1], ring[1:, 0], ring[1:, 1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            crossing = ((y1 > lat) != (y2 > lat)) & (lon < (x2 - x1) * (lat - y1) / (y2 - y1) + x1)
+        if crossing.sum() % 2:
+            found = zone_id
+    return found
+
+
+def main(args):
+    from app.zones import ZoneIndex
+
+    rng = np.random.default_rng(args.seed)
+    zones = [
+        (j * args.grid + i + 1, scale(district(i, j, args.vertices_per_side, 0.2), args.grid))
+        for j in range(args.grid) for i in range(args.grid)
+    ]
+    vertices = sum(len(geometry["coordinates"][0]) - 1 for _, geometry in zones)
+
+    started = time.perf_counter()
+    index = ZoneIndex(zones)
+    build_seconds = time.perf_counter() - started
+
+    lons = MIN_LON + rng.random(args.points) * SPAN
+    lats = MIN_LAT + rng.random(args.points) * SPAN
+    index.locate(lons[:1000], lats[:1000])  # warm up
+    started = time.perf_counter()
+    batch = index.locate(lons, lats)
+    batch_seconds = time.perf_counter() - started
+
+    singles = min(args.points, 2000)
+    started = time.perf_counter()
+    single = [index.locate_point(lons[k], lats[k]) for k in range(singles)]
+    single_seconds = time.perf_counter() - started
+
+    rings = [(zone_id, np.asarray(geometry["coordinates"][0])) for zone_id, geometry in zones]
+    checked = min(args.points, args.verify)
+    started = time.perf_counter()
+    mismatches = sum(batch[k] != brute_force(rings, lons[k], lats[k]) for k in range(checked))
+    brute_seconds = (time.perf_counter() - started) / max(checked, 1)
+
+    print(json.dumps({
+        "zones": len(zones),
+        "vertices": vertices,
+        "index_build_ms": round(build_seconds * 1000, 1),
+        "batch_points": args.points,
+        "batch_us_per_point": round(batch_seconds / args.points * 1e6, 2),
+        "single_us_per_lookup": round(single_seconds / singles * 1e6, 1),
+        "brute_force_us_per_point": round(brute_seconds * 1e6, 1),
+        "assigned": int((batch >= 0).sum()),
+        "verified": checked,
+        "mismatches": int(mismatches),
+        "single_vs_batch_mismatches": int(sum(single[k] != batch[k] for k in range(singles))),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--grid", type=int, default=50, help="districts per side")
+    parser.add_argument("--vertices-per-side", type=int, default=250)
+    parser.add_argument("--points", type=int, default=200000)
+    parser.add_argument("--verify", type=int, default=200, help="points checked against brute force")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    sys.path.insert(0, BACKEND_DIR)
+    main(args)
@@ -0,0 +1,277 @@
+"""
+Load test: replay a mix of user journeys and report per-route latency
+
+Runs the scenarios in benchmarks/scenarios.py (map browsing, dashboard load,
+report submission, admin triage, notification polling) with N concurrent
+virtual users, either in-process against app.main:app through the ASGI
+transport or over HTTP against a running server. Reports throughput and
+p50/p95/p99 per route and writes the results as JSON so runs can be
+compared across commits.
+
+In-process (seeds a scratch SQLite database unless --skip-seed):
+    python benchmarks/load_test.py run --duration 30 --virtual-users 32
+
+Against a server (seed its database first with seed_data.py and start it
+with RATE_LIMIT_ENABLED=false):
+    python benchmarks/load_test.py run --base-url http://localhost:8000 --issues 20000
+
+Compare two runs (exit code 1 when a route regressed by more than --threshold):
+    python benchmarks/load_test.py compare results/old.json results/new.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0.0
+
+
+def route_stats(latencies, errors, elapsed):
+    return {
+        "count": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+        "max_ms": round(max(latencies) * 1000, 2) if latencies else 0.0,
+    }
+
+
+def parse_mix(value: str) -> dict:
+    """"map=40,report=10" -> {"map": 40, "report": 10}"""
+    from scenarios import SCENARIOS
+
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"unknown scenario '{name}' (choose from {', '.join(SCENARIOS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def git_revision() -> dict:
+    def git(*args):
+        try:
+            return subprocess.run(
+                ["git", *args], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    return {"commit": git("rev-parse", "--short", "HEAD"), "dirty": bool(git("status", "--porcelain", "--", "."))}
+
+
+async def login(client, email: str, password: str) -> str:
+    response = await client.post("/api/auth/login/json", json={"email": email, "password": password})
+    if response.status_code != 200:
+        raise RuntimeError(f"login as {email} failed: {response.status_code} {response.text}")
+    return response.json()["access_token"]
+
+
+async def run_phase(users, mix, seconds, recorder, iterations):
+    """Every virtual user loops over randomly drawn scenarios for `seconds`"""
+    from scenarios import SCENARIOS
+
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    deadline = time.perf_counter() + seconds
+
+    async def loop(user):
+        user.recorder = recorder
+        while time.perf_counter() < deadline:
+            name = user.rng.choices(names, weights)[0]
+            await SCENARIOS[name](user)
+            iterations[name] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(loop(user) for user in users))
+    return time.perf_counter() - started
+
+
+async def run(args) -> dict:
+    import httpx
+    from collections import Counter
+    from scenarios import Recorder, VirtualUser, sample_image
+    from seed_data import PASSWORD, seed, user_email
+
+    data = {"issues": args.issues}
+    app = None
+    if args.base_url:
+        transport = httpx.AsyncHTTPTransport(limits=httpx.Limits(max_connections=args.virtual_users))
+        base_url = args.base_url
+    else:
+        if not args.skip_seed:
+            data = seed(args.users, args.issues, args.notifications, args.admins, args.seed)
+        from app.main import app
+        await app.router.startup()
+        transport = httpx.ASGITransport(app=app)
+        base_url = "http://bench"
+
+    rng = random.Random(args.seed)
+    image = sample_image()
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=args.timeout) as client:
+        # user0 is an admin, regular users start after the admins
+        admin_token = await login(client, user_email(0), PASSWORD)
+        regular = list(range(args.admins, args.users)) or [0]
+        tokens = [
+            await login(client, user_email(index), PASSWORD)
+            for index in rng.sample(regular, min(args.virtual_users, len(regular)))
+        ]
+        users = [
+            VirtualUser(
+                client, Recorder(), random.Random(rng.random()), tokens[i % len(tokens)],
+                admin_token, args.issues, image
+            )
+            for i in range(args.virtual_users)
+        ]
+
+        if args.warmup:
+            await run_phase(users, args.mix, args.warmup, Recorder(), Counter())
+        recorder, iterations = Recorder(), Counter()
+        elapsed = await run_phase(users, args.mix, args.duration, recorder, iterations)
+
+    if app is not None:
+        await app.router.shutdown()
+
+    all_latencies = [value for values in recorder.latencies.values() for value in values]
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "mode": "http" if args.base_url else "asgi",
+            "target": args.base_url or os.environ.get("DATABASE_URL"),
+            "data": data,
+            "virtual_users": args.virtual_users,
+            "duration_seconds": round(elapsed, 2),
+            "warmup_seconds": args.warmup,
+            "mix": args.mix,
+            "seed": args.seed,
+        },
+        "totals": route_stats(all_latencies, sum(recorder.errors.values()), elapsed),
+        "scenarios": dict(iterations),
+        "routes": {
+            route: route_stats(recorder.latencies[route], recorder.errors.get(route, 0), elapsed)
+            for route in sorted(recorder.latencies)
+        },
+    }
+
+
+def print_report(results: dict) -> None:
+    print(f"{'route':44} {'count':>7} {'err':>5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    rows = list(results["routes"].items()) + [("TOTAL", results["totals"])]
+    for route, stats in rows:
+        print(
+            f"{route:44} {stats['count']:>7} {stats['errors']:>5} {stats['rps']:>8} "
+            f"{stats['p50_ms']:>8} {stats['p95_ms']:>8} {stats['p99_ms']:>8}"
+        )
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list:
+    """
+    Print per-route changes and return the routes whose p95 grew or whose
+    throughput dropped by more than `threshold` (a fraction)
+    """
+    regressions = []
+    print(f"{'route':44} {'p95 base':>9} {'p95 now':>9} {'change':>8} {'rps change':>11}")
+    for route, now in current["routes"].items():
+        base = baseline["routes"].get(route)
+        if not base or not base["count"] or not now["count"]:
+            continue
+        p95_change = (now["p95_ms"] - base["p95_ms"]) / base["p95_ms"] if base["p95_ms"] else 0.0
+        rps_change = (now["rps"] - base["rps"]) / base["rps"] if base["rps"] else 0.0
+        flag = ""
+        if p95_change > threshold or rps_change < -threshold:
+            regressions.append(route)
+            flag = "  REGRESSION"
+        print(
+            f"{route:44} {base['p95_ms']:>9} {now['p95_ms']:>9} {p95_change:>+8.1%} {rps_change:>+11.1%}{flag}"
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the load test")
+    run_parser.add_argument("--base-url", help="test a running server instead of the app in-process")
+    run_parser.add_argument("--database-url", help="in-process only, defaults to a scratch SQLite file")
+    run_parser.add_argument("--skip-seed", action="store_true", help="use the already seeded --database-url")
+    run_parser.add_argument("--users", type=int, default=1000)
+    run_parser.add_argument("--admins", type=int, default=5)
+    run_parser.add_argument("--issues", type=int, default=20000)
+    run_parser.add_argument("--notifications", type=int, default=100000)
+    run_parser.add_argument("--virtual-users", type=int, default=32)
+    run_parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    run_parser.add_argument("--warmup", type=float, default=3, help="unmeasured seconds before the run")
+    run_parser.add_argument("--mix", type=parse_mix, default=None, help="e.g. map=40,dashboard=15,report=10")
+    run_parser.add_argument("--timeout", type=float, default=30)
+    run_parser.add_argument("--seed", type=int, default=42)
+    run_parser.add_argument("--output", help="results file (default: benchmarks/results/<time>-<commit>.json)")
+    run_parser.add_argument("--baseline", help="compare against an earlier results file")
+    run_parser.add_argument("--threshold", type=float, default=0.1, help="regression threshold (fraction)")
+
+    compare_parser = commands.add_parser("compare", help="compare two results files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.1)
+
+    args = parser.parse_args()
+    sys.path.insert(0, BACKEND_DIR)
+
+    if args.command == "compare":
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        sys.exit(1 if compare(baseline, current, args.threshold) else 0)
+
+    from scenarios import DEFAULT_MIX
+    args.mix = args.mix or DEFAULT_MIX
+    if not args.base_url:
+        workdir = tempfile.mkdtemp()
+        os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{workdir}/bench.db"
+        os.environ.setdefault("UPLOAD_DIR", f"{workdir}/uploads")
+        os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+    results = asyncio.run(run(args))
+    print_report(results)
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{results['meta']['git']['commit'] or 'nogit'}.json")
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        sys.exit(1 if compare(baseline, results, args.threshold) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+User journeys replayed by load_test.py
+
+Each scenario is an async function taking a VirtualUser and issuing the
+requests of one iteration of the journey. Requests are recorded under a
+route label (method + path template) so latencies aggregate per route.
+"""
+import io
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List
+
+from seed_data import HOTSPOTS
+
+
+class Recorder:
+    """Latencies and errors per route label"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def record(self, route: str, seconds: float, ok: bool) -> None:
+        self.latencies[route].append(seconds)
+        if not ok:
+            self.errors[route] += 1
+
+
+class VirtualUser:
+    """A logged-in client plus the state a scenario needs"""
+
+    def __init__(self, client, recorder: Recorder, rng, token: str, admin_token: str,
+                 issue_count: int, image: bytes):
+        self.client = client
+        self.recorder = recorder
+        self.rng = rng
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.admin_headers = {"Authorization": f"Bearer {admin_token}"}
+        self.issue_count = issue_count
+        self.image = image
+
+    async def request(self, route: str, method: str, url: str, expect=(200,), **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            ok = response.status_code in expect
+        except Exception:
+            response, ok = None, False
+        self.recorder.record(route, time.perf_counter() - started, ok)
+        return response
+
+    def random_issue_id(self) -> int:
+        return self.rng.randint(1, max(self.issue_count, 1))
+
+    def random_bbox(self) -> str:
+        lat, lon = self.rng.choice(HOTSPOTS)
+        span = self.rng.uniform(0.02, 0.1)
+        return f"{lon - span},{lat - span},{lon + span},{lat + span}"
+
+
+async def map_browsing(user: VirtualUser) -> None:
+    """Open the map, page through markers, open a few issues"""
+    await user.request("GET /api/issues/", "GET", "/api/issues/", params={"limit": 100})
+    await user.request(
+        "GET /api/issues/analytics/heatmap", "GET", "/api/issues/analytics/heatmap",
+        params={"precision": 5, "bbox": user.random_bbox()}
+    )
+    for _ in range(3):
+        issue_id = user.random_issue_id()
+        await user.request("GET /api/issues/{id}", "GET", f"/api/issues/{issue_id}", expect=(200, 404))
+
+
+async def dashboard_load(user: VirtualUser) -> None:
+    """Everything the dashboard requests on page load"""
+    await user.request("GET /api/auth/me", "GET", "/api/auth/me", headers=user.headers)
+    await user.request(
+        "GET /api/issues/", "GET", "/api/issues/",
+        params={"limit": 20, "status": user.rng.choice(["pending", "in_progress"])}
+    )
+    await user.request("GET /api/issues/analytics/trends", "GET", "/api/issues/analytics/trends")
+    await user.request("GET /api/issues/analytics/sla", "GET", "/api/issues/analytics/sla")
+    await user.request(
+        "GET /api/notifications/unread/count", "GET", "/api/notifications/unread/count",
+        headers=user.headers
+    )
+
+
+async def report_submission(user: VirtualUser) -> None:
+    """Submit a report with a photo, then look at it"""
+    lat, lon = user.rng.choice(HOTSPOTS)
+    response = await user.request(
+        "POST /api/issues/", "POST", "/api/issues/", expect=(201,),
+        params={
+            "title": "Load test report",
+            "description": "Submitted by the load test",
+            "category": user.rng.choice(["infrastructure", "safety", "environment", "health", "other"]),
+            "latitude": user.rng.gauss(lat, 0.01),
+            "longitude": user.rng.gauss(lon, 0.01),
+        },
+        files={"image": ("photo.jpg", user.image, "image/jpeg")},
+        headers=user.headers
+    )
+    if response is not None and response.status_code == 201:
+        await user.request("GET /api/issues/{id}", "GET", f"/api/issues/{response.json()['id']}")
+
+
+async def admin_triage(user: VirtualUser) -> None:
+    """Claim issues from the triage queue, read their history, move them along"""
+    for _ in range(2):
+        response = await user.request(
+            "POST /api/issues/triage/claim", "POST", "/api/issues/triage/claim", expect=(200, 204),
+            headers=user.admin_headers
+        )
+        if response is None or response.status_code != 200:
+            return
+        issue = response.json()["issue"]
+        await user.request("GET /api/issues/{id}/timeline", "GET", f"/api/issues/{issue['id']}/timeline")
+        await user.request(
+            "PUT /api/issues/{id}/status", "PUT", f"/api/issues/{issue['id']}/status",
+            params={"new_status": "in_progress"}, headers=user.admin_headers
+        )
+
+
+async def notification_polling(user: VirtualUser) -> None:
+    """Badge poll; fetch the list when there is something unread"""
+    response = await user.request(
+        "GET /api/notifications/unread/count", "GET", "/api/notifications/unread/count",
+        headers=user.headers
+    )
+    if response is not None and response.status_code == 200 and response.json()["unread_count"]:
+        await user.request(
+            "GET /api/notifications/", "GET", "/api/notifications/",
+            params={"unread_only": True, "limit": 20}, headers=user.headers
+        )
+
+
+SCENARIOS: Dict[str, Callable] = {
+    "map": map_browsing,
+    "dashboard": dashboard_load,
+    "report": report_submission,
+    "triage": admin_triage,
+    "notifications": notification_polling,
+}
+
+# Default traffic mix (relative weights)
+DEFAULT_MIX = {"map": 40, "dashboard": 15, "report": 10, "triage": 5, "notifications": 30}
+
+
+def sample_image(size=(640, 480)) -> bytes:
+    """A small JPEG used for report submissions"""
+    from PIL import Image
+
+    buf = io.BytesIO()
+    Image.new("RGB", size, (200, 30, 30)).save(buf, "JPEG")
+    return buf.getvalue()
@@ -0,0 +1,166 @@
+"""
+Deterministic data generator for benchmarks
+
+Seeds users, issues (with created events, rollups and SLA metrics) and
+notifications (with unread counters) into the empty database given by
+--database-url / DATABASE_URL. Works with SQLite and PostgreSQL; the same
+--seed always produces the same data.
+
+All users share the password "bench-password". The first --admins users are
+admins, emails are user{n}@example.com (n starting at 0).
+
+    python benchmarks/seed_data.py --database-url sqlite:///./bench.db \\
+        --users 1000 --issues 100000 --notifications 500000
+"""
+import argparse
+import os
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PASSWORD = "bench-password"
+BATCH_SIZE = 10000
+
+# Issues are scattered around a few hotspots (Addis Ababa area)
+HOTSPOTS = [(9.03, 38.74), (9.01, 38.76), (8.98, 38.79), (9.06, 38.70), (8.55, 39.27)]
+
+
+def user_email(index: int) -> str:
+    return f"user{index}@example.com"
+
+
+def _batched(rows, size=BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def seed(users: int, issues: int, notifications: int, admins: int = 5, seed_value: int = 42, days: int = 60) -> dict:
+    """
+    Create tables and insert the data set
+
+    Returns:
+        Counts of inserted rows
+    """
+    from sqlalchemy import insert
+    from app import database
+    from app.analytics import rebuild_rollups
+    from app.issue_events import rebuild_sla_metrics
+    from app.models import (
+        Issue,
+        IssueCategory,
+        IssueEvent,
+        IssueEventType,
+        IssueStatus,
+        Notification,
+        User,
+        UserRole
+    )
+    from app.notification_service import reconcile_unread_counts
+    from app.triage import rebuild_triage_queue
+    from app.utils import get_password_hash
+
+    engine = database.init_engine()
+    database.Base.metadata.create_all(bind=engine)
+    rng = random.Random(seed_value)
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    password_hash = get_password_hash(PASSWORD)  # bcrypt is slow, hash once
+    categories = list(IssueCategory)
+    statuses = list(IssueStatus)
+
+    with engine.begin() as conn:
+        for batch in _batched(
+            dict(
+                name=f"Bench User {i}",
+                email=user_email(i),
+                password_hash=password_hash,
+                role=UserRole.ADMIN if i < admins else UserRole.USER
+            )
+            for i in range(users)
+        ):
+            conn.execute(insert(User), batch)
+
+        def issue_rows():
+            for i in range(issues):
+                lat, lon = rng.choice(HOTSPOTS)
+                created = now - timedelta(seconds=rng.randint(0, days * 86400))
+                yield dict(
+                    title=f"Bench issue {i}",
+                    description="Generated for benchmarking. " * 4,
+                    category=rng.choice(categories),
+                    status=rng.choices(statuses, weights=[5, 3, 2, 1])[0],
+                    latitude=rng.gauss(lat, 0.02),
+                    longitude=rng.gauss(lon, 0.02),
+                    reporter_id=rng.randint(1, users),
+                    created_at=created
+                )
+
+        issue_id = 0
+        for batch in _batched(issue_rows()):
+            conn.execute(insert(Issue), batch)
+            events = []
+            for row in batch:
+                issue_id += 1
+                events.append(dict(
+                    issue_id=issue_id, actor_id=row["reporter_id"],
+                    event_type=IssueEventType.CREATED, to_status=IssueStatus.PENDING,
+                    created_at=row["created_at"]
+                ))
+                if row["status"] != IssueStatus.PENDING:
+                    events.append(dict(
+                        issue_id=issue_id, actor_id=1,
+                        event_type=IssueEventType.STATUS_CHANGED,
+                        from_status=IssueStatus.PENDING, to_status=row["status"],
+                        created_at=min(row["created_at"] + timedelta(hours=rng.randint(1, 96)), now)
+                    ))
+            conn.execute(insert(IssueEvent), events)
+
+        for batch in _batched(
+            dict(
+                user_id=rng.randint(1, users),
+                issue_id=rng.randint(1, issues) if issues else None,
+                title="Issue Status Update",
+                message="An issue you follow is now in progress.",
+                is_read=rng.random() < 0.7
+            )
+            for _ in range(notifications)
+        ):
+            conn.execute(insert(Notification), batch)
+
+    db = database.SessionLocal()
+    try:
+        rebuild_rollups(db)
+        rebuild_sla_metrics(db)
+        reconcile_unread_counts(db)
+        rebuild_triage_queue(db)
+    finally:
+        db.close()
+    return {"users": users, "issues": issues, "notifications": notifications}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--database-url", help="defaults to DATABASE_URL")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--admins", type=int, default=5)
+    parser.add_argument("--issues", type=int, default=20000)
+    parser.add_argument("--notifications", type=int, default=100000)
+    parser.add_argument("--days", type=int, default=60, help="spread of issue creation dates")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    sys.path.insert(0, BACKEND_DIR)
+    print(seed(args.users, args.issues, args.notifications, args.admins, args.seed, args.days))
+
+
+if __name__ == "__main__":
+    main()
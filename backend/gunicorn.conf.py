@@ -0,0 +1,40 @@
+"""
+Gunicorn configuration for production deployments
+
+Usage:
+    gunicorn app.main:app -c gunicorn.conf.py
+
+All values can be overridden through environment variables (see env.example).
+Send SIGHUP to the master process for a graceful reload: new workers are
+started with fresh code and old workers finish their in-flight requests.
+"""
+import multiprocessing
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Socket
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '8000')}"
+backlog = int(os.getenv("BACKLOG", "2048"))
+
+# Workers (uvicorn worker = uvloop + httptools when available)
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Recycle workers after N requests to bound memory growth (0 disables)
+max_requests = int(os.getenv("MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", "1000"))
+
+# Timeouts
+keepalive = int(os.getenv("KEEPALIVE", "5"))
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+
+# Never import the app in the master: engine, pools and caches are created
+# per worker after fork (see app.main startup).
+preload_app = False
+
+accesslog = os.getenv("ACCESS_LOG", "-") or None
+errorlog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info")
@@ -0,0 +1,86 @@
+"""
+Production server entry point
+
+Runs the API with several worker processes. Uses gunicorn (graceful reload on
+SIGHUP, worker recycling) when it is installed, and falls back to uvicorn's
+own process manager otherwise.
+
+    python serve.py                 # workers = CPU count
+    WEB_CONCURRENCY=4 python serve.py
+
+For local development keep using run.py (auto-reload, single process).
+"""
+import multiprocessing
+import os
+import sys
+from dotenv import load_dotenv
+
+load_dotenv()
+
+APP = "app.main:app"
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+WORKERS = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+BACKLOG = int(os.getenv("BACKLOG", "2048"))
+KEEPALIVE = int(os.getenv("KEEPALIVE", "5"))
+GRACEFUL_TIMEOUT = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+
+
+def _loop() -> str:
+    try:
+        import uvloop  # noqa: F401
+        return "uvloop"
+    except ImportError:
+        return "asyncio"
+
+
+def _http() -> str:
+    try:
+        import httptools  # noqa: F401
+        return "httptools"
+    except ImportError:
+        return "h11"
+
+
+def run_gunicorn() -> None:
+    """Run under gunicorn using gunicorn.conf.py"""
+    from gunicorn.app.wsgiapp import run
+
+    config = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gunicorn.conf.py")
+    sys.argv = [sys.argv[0], APP, "-c", config]
+    run()
+
+
+def run_uvicorn() -> None:
+    """
+    Run with uvicorn's multiprocess supervisor
+
+    No worker recycling here: the supervisor doesn't restart workers that
+    exit, so MAX_REQUESTS only applies under gunicorn.
+    """
+    import uvicorn
+
+    uvicorn.run(
+        APP,
+        host=HOST,
+        port=PORT,
+        workers=WORKERS,
+        loop=_loop(),
+        http=_http(),
+        backlog=BACKLOG,
+        timeout_keep_alive=KEEPALIVE,
+        timeout_graceful_shutdown=GRACEFUL_TIMEOUT,
+        proxy_headers=True,
+    )
+
+
+if __name__ == "__main__":
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        run_uvicorn()
+    else:
+        if sys.platform == "win32":
+            run_uvicorn()
+        else:
+            run_gunicorn()
@@ -0,0 +1,202 @@
+"""
+Regional sharding: merged reads over SQLite shards vs. one database
+
+A seeded database is copied as the single-database reference, then becomes
+the primary of two more SQLite shards and the planned rebalance moves
+regions onto them. Every merged read must return what the same query
+returns on the reference, and every issue must stay reachable by its id.
+
+    python -m pytest tests/test_sharding.py
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKDIR = tempfile.mkdtemp()
+
+# Read when app.sharding is imported
+os.environ["DATABASE_URL"] = f"sqlite:///{WORKDIR}/primary.db"
+os.environ["SHARD_URLS"] = f"sqlite:///{WORKDIR}/shard1.db,sqlite:///{WORKDIR}/shard2.db"
+# The seeded hotspots are a few kilometres apart
+os.environ["SHARD_GEOHASH_PRECISION"] = "5"
+os.environ["SHARD_MAP_CHECK_SECONDS"] = "0"
+os.environ["UPLOAD_DIR"] = f"{WORKDIR}/uploads"
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, "benchmarks"))
+
+import pytest  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from app import database, sharding  # noqa: E402
+from app.analytics import heatmap, trends  # noqa: E402
+from app.issue_events import sla_report  # noqa: E402
+from app.models import Issue  # noqa: E402
+from app.shard_queries import (  # noqa: E402
+    issue_changes,
+    latest_issues,
+    merged_heatmap,
+    merged_sla_report,
+    merged_trends
+)
+from app.sync import backfill_issue_changes, changes_since  # noqa: E402
+from seed_data import seed  # noqa: E402
+
+PAGE_SIZE = 50
+
+
+@pytest.fixture(scope="module")
+def sessions():
+    """(primary of the sharded setup, single-database reference)"""
+    seed(users=20, issues=1500, notifications=0, admins=1, seed_value=7)
+    primary = database.SessionLocal()
+    backfill_issue_changes(primary)
+    primary.close()
+    shutil.copy(f"{WORKDIR}/primary.db", f"{WORKDIR}/reference.db")
+    reference = sessionmaker(bind=database.create_db_engine(f"sqlite:///{WORKDIR}/reference.db"))()
+
+    sharding.init_shard_schemas()
+    primary = database.SessionLocal()
+    for region, _, target, _ in sharding.plan_rebalance(sharding.region_loads(primary)):
+        sharding.pin_region(primary, region, target)
+        sharding.move_region(primary, region, target)
+
+    yield primary, reference
+
+    primary.close()
+    reference.close()
+    sharding.dispose_shard_engines()
+    database.dispose_engine()
+    shutil.rmtree(WORKDIR, ignore_errors=True)
+
+
+def _reference_page(reference, skip: int, limit: int):
+    return reference.scalars(
+        select(Issue).order_by(Issue.created_at.desc(), Issue.id.desc()).offset(skip).limit(limit)
+    ).all()
+
+
+def _by_key(rows, key: str) -> dict:
+    return {row[key]: {k: v for k, v in row.items() if k != key} for row in rows}
+
+
+def _shard_issue_ids() -> dict:
+    """Issue id -> shard holding it"""
+    located = {}
+    for shard, ids in enumerate(sharding.for_each_shard(lambda db: db.scalars(select(Issue.id)).all())):
+        located.update((issue_id, shard) for issue_id in ids)
+    return located
+
+
+def _assert_routable(primary, reference):
+    located = _shard_issue_ids()
+    assert sorted(located) == sorted(reference.scalars(select(Issue.id)))
+    for issue_id, shard in located.items():
+        assert sharding.issue_shard(primary, issue_id) == shard
+
+
+def test_rebalance_uses_every_shard(sessions):
+    primary, _ = sessions
+    assert all(row["issues"] for row in sharding.shard_status(primary))
+
+
+@pytest.mark.parametrize("skip", [0, 700])
+def test_latest_issues_match_single_database(sessions, skip):
+    primary, reference = sessions
+    merged = [issue.id for issue in latest_issues(primary, skip, PAGE_SIZE)]
+    assert merged == [issue.id for issue in _reference_page(reference, skip, PAGE_SIZE)]
+
+
+def test_heatmap_matches_single_database(sessions):
+    primary, reference = sessions
+    assert _by_key(merged_heatmap(primary, 5), "geohash") == _by_key(heatmap(reference, 5), "geohash")
+
+
+def test_trends_match_single_database(sessions):
+    primary, reference = sessions
+    merged = merged_trends(primary, 5, 30, 7, None, 1000)
+    assert _by_key(merged, "geohash") == _by_key(trends(reference, 5, 30, 7, None, 1000), "geohash")
+
+
+def test_sla_report_matches_single_database(sessions):
+    primary, reference = sessions
+    assert merged_sla_report(primary) == sla_report(reference)
+
+
+def test_change_feed_returns_every_issue(sessions):
+    primary, reference = sessions
+    merged, token = [], None
+    while True:
+        issues, deleted, token, has_more = issue_changes(primary, token, PAGE_SIZE)
+        merged.extend(issue.id for issue in issues)
+        assert not deleted
+        if not has_more:
+            break
+    single, seq = [], 0
+    while True:
+        issues, _, seq, has_more = changes_since(reference, seq, PAGE_SIZE)
+        single.extend(issue.id for issue in issues)
+        if not has_more:
+            break
+    assert sorted(merged) == sorted(single)
+
+    # Nothing changed since: the final token returns nothing
+    issues, deleted, _, has_more = issue_changes(primary, token, PAGE_SIZE)
+    assert (issues, deleted, has_more) == ([], [], False)
+
+
+def test_moved_issues_stay_routable(sessions):
+    primary, reference = sessions
+    _assert_routable(primary, reference)
+
+
+def test_moving_a_region_back_keeps_ids(sessions):
+    primary, reference = sessions
+    pinned = sharding.region_map.get(primary)
+    region = min(pinned)
+    sharding.pin_region(primary, region, 0)
+    assert sharding.move_region(primary, region, 0)
+
+    assert sharding.shard_for_region(primary, region) == 0
+    _assert_routable(primary, reference)
+    merged = [issue.id for issue in latest_issues(primary, 0, PAGE_SIZE)]
+    assert merged == [issue.id for issue in _reference_page(reference, 0, PAGE_SIZE)]
+
+
+def test_buffered_reports_are_flushed_to_their_shard(sessions):
+    from app.ingest import insert_reports, new_provisional_id
+    from app.models import IngestReceipt, User
+
+    primary, _ = sessions
+    reporter_id = primary.scalar(select(User.id).limit(1))
+    # Regions on other databases than the primary (whose receipts commit
+    # with the issues)
+    pinned = sorted((region, shard) for region, shard in sharding.region_map.get(primary).items() if shard)
+    records = []
+    for region, _ in pinned:
+        issue = next(issue for issue in latest_issues(primary, 0, 2000)
+                     if sharding.region_of(issue.latitude, issue.longitude) == region)
+        records.append(dict(
+            provisional_id=new_provisional_id(), reporter_id=reporter_id, title="Buffered report",
+            description="Flushed from the ingest log", category="safety",
+            latitude=issue.latitude, longitude=issue.longitude,
+            received_at="2026-10-19T10:00:00+00:00", image_ext=None, base_url="http://test",
+            idempotency_key=None, fingerprint=None
+        ))
+    insert_reports(primary, records)
+
+    receipts = {
+        receipt.provisional_id: receipt.issue_id
+        for receipt in primary.scalars(select(IngestReceipt))
+    }
+    located = _shard_issue_ids()
+    for record, (_, shard) in zip(records, pinned):
+        assert located[receipts[record["provisional_id"]]] == shard
+
+    # The primary's commit was lost: the replay finds the issues on the shards
+    primary.query(IngestReceipt).delete()
+    primary.commit()
+    insert_reports(primary, records)
+    assert len(_shard_issue_ids()) == len(located)
+    assert {receipt.issue_id for receipt in primary.scalars(select(IngestReceipt))} == set(receipts.values())
@@ -0,0 +1,104 @@
+"""
+Triage queue rebuild while issues leave the queue
+
+An issue whose status changes while the rebuild recomputes keys drops out
+of the queue; the rebuild must not fail on it and the keys it writes must
+match the cell levels it recorded.
+
+    python -m pytest tests/test_triage.py
+"""
+import os
+import shutil
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import pytest  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from app import triage  # noqa: E402
+from app.database import Base, create_db_engine  # noqa: E402
+from app.models import (  # noqa: E402
+    Issue,
+    IssueCategory,
+    IssueRollup,
+    IssueStatus,
+    TriageCell,
+    TriageQueueEntry,
+    User
+)
+
+DENSITY = 5
+# Two hotspots a few kilometres apart
+LOCATIONS = [(52.52, 13.40), (52.48, 13.45)]
+
+
+@pytest.fixture
+def session_factory():
+    workdir = tempfile.mkdtemp()
+    engine = create_db_engine(f"sqlite:///{workdir}/triage.db")
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    db = factory()
+    reporter = User(name="Reporter", email="reporter@example.com", password_hash="x")
+    db.add(reporter)
+    db.flush()
+    created_at = datetime.now(timezone.utc) - timedelta(hours=3)
+    categories = list(IssueCategory)
+    db.add_all(
+        Issue(
+            title=f"Issue {i}", description="Queued for triage", category=categories[i % len(categories)],
+            status=IssueStatus.PENDING, latitude=LOCATIONS[i % 2][0], longitude=LOCATIONS[i % 2][1],
+            created_at=created_at + timedelta(minutes=i), reporter_id=reporter.id
+        )
+        for i in range(40)
+    )
+    db.commit()
+    db.close()
+
+    yield factory
+
+    engine.dispose()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_rebuild_skips_entries_removed_meanwhile(session_factory, monkeypatch):
+    db = session_factory()
+    assert triage.rebuild_triage_queue(db, chunk_size=10) == 40
+
+    # Reports in the density window of both cells
+    cells = set(db.scalars(select(TriageQueueEntry.geohash)))
+    today = datetime.now(timezone.utc).date()
+    db.add_all(IssueRollup(geohash=cell, day=today, category=IssueCategory.OTHER, count=DENSITY) for cell in cells)
+    db.commit()
+
+    # An admin resolves an issue once the rebuild has read the queue
+    removed = []
+    priority_key = triage.priority_key
+
+    def resolve_one(category, density, created_at):
+        if not removed:
+            other = session_factory()
+            entry = other.scalars(select(TriageQueueEntry).order_by(TriageQueueEntry.issue_id.desc())).first()
+            other.get(Issue, entry.issue_id).status = IssueStatus.RESOLVED
+            other.delete(entry)
+            other.commit()
+            other.close()
+            removed.append(entry.issue_id)
+        return priority_key(category, density, created_at)
+
+    monkeypatch.setattr(triage, "priority_key", resolve_one)
+    triage.rebuild_triage_queue(db, chunk_size=10)
+    monkeypatch.undo()
+
+    entries = db.scalars(select(TriageQueueEntry)).all()
+    assert len(entries) == 39
+    assert removed[0] not in {entry.issue_id for entry in entries}
+    levels = dict(db.execute(select(TriageCell.geohash, TriageCell.density_level)).all())
+    assert levels == {cell: triage.density_level(DENSITY) for cell in cells}
+    for entry in entries:
+        assert entry.priority_key == pytest.approx(triage.priority_key(entry.category, DENSITY, entry.created_at))
+    db.close()